@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+bench_startup.py — Cold-start cost of the LLM routing stack
+Measures, in fresh interpreters, how long `import services.llm_router` takes
+and what the first shared-key encrypt/decrypt costs (PBKDF2 derivation),
+then compares cold vs cached decryption of a batch of shared keys.
+
+Usage:  python bench_startup.py [--runs 5] [--keys 50]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Runs inside a fresh interpreter so module caches don't hide import cost
+_CHILD = r"""
+import time
+t0 = time.perf_counter()
+import services.llm_router as r
+t1 = time.perf_counter()
+km = r.key_manager
+enc = km.encrypt_key("bench-key")
+t2 = time.perf_counter()
+rows = [{"id": i, "provider": "bench", "encrypted_key": km.fernet.encrypt(f"k{i}".encode()).decode()}
+        for i in range(N_KEYS)]
+t3 = time.perf_counter()
+km.add_db_keys(rows)
+t4 = time.perf_counter()
+km.keys["bench"] = []
+km.add_db_keys(rows)
+t5 = time.perf_counter()
+print(f"{t1 - t0:.6f} {t2 - t1:.6f} {t4 - t3:.6f} {t5 - t4:.6f}")
+"""
+
+
+def run_once(n_keys: int) -> list[float]:
+    code = _CHILD.replace("N_KEYS", str(n_keys))
+    out = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=BACKEND_DIR, capture_output=True, text=True, check=True,
+    ).stdout.strip().splitlines()[-1]
+    return [float(x) for x in out.split()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--keys", type=int, default=50, help="shared keys to decrypt")
+    args = parser.parse_args()
+
+    labels = [
+        "import services.llm_router",
+        "first encrypt (PBKDF2 derive)",
+        f"add_db_keys x{args.keys} (cold)",
+        f"add_db_keys x{args.keys} (cached)",
+    ]
+    samples: list[list[float]] = [[] for _ in labels]
+    started = time.perf_counter()
+    for _ in range(args.runs):
+        for i, value in enumerate(run_once(args.keys)):
+            samples[i].append(value)
+
+    print(f"⏱️  Startup benchmark — {args.runs} fresh interpreters ({time.perf_counter() - started:.1f}s total)")
+    for label, values in zip(labels, samples):
+        print(f"  {label:<34} median {statistics.median(values) * 1000:8.2f} ms   "
+              f"min {min(values) * 1000:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
 import os
+import tempfile
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -14,6 +15,8 @@ CLOUDFLARE_API_KEYS = [k.strip() for k in os.getenv("CLOUDFLARE_API_KEYS", "").s
 NVIDIA_API_KEYS = [k.strip() for k in os.getenv("NVIDIA_API_KEYS", "").split(",") if k.strip()]
 SAMBANOVA_API_KEYS = [k.strip() for k in os.getenv("SAMBANOVA_API_KEYS", "").split(",") if k.strip()]
 CEREBRAS_API_KEYS = [k.strip() for k in os.getenv("CEREBRAS_API_KEYS", "").split(",") if k.strip()]
+# Offline benchmarking: any value here enables the in-process mock provider
+MOCK_API_KEYS = [k.strip() for k in os.getenv("MOCK_API_KEYS", "").split(",") if k.strip()]
 
 # --- JWT Configuration ---
 JWT_SECRET = os.getenv("JWT_SECRET", "change-this-secret-key")
@@ -36,3 +39,109 @@ USER_NAME = os.getenv("USER_NAME", "User")
 SUPABASE_URL = os.getenv("SUPABASE_URL", "")
 SUPABASE_SERVICE_ROLE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY", "")
 SUPABASE_ANON_KEY = os.getenv("SUPABASE_ANON_KEY", "")
+
+# --- Key Rotation State ---
+# Key health (exhaustion, daily counts) is checkpointed here and rehydrated on cold start.
+# The temp dir is the only writable location on Vercel.
+KEY_STATE_PATH = os.getenv("KEY_STATE_PATH", os.path.join(tempfile.gettempdir(), "jexi_key_state.json"))  # local tempdir does not survive serverless cold starts
+KEY_STATE_MAX_AGE = int(os.getenv("KEY_STATE_MAX_AGE", "21600"))  # ignore snapshots older than 6h
+KEY_STATE_CHECKPOINT_INTERVAL = int(os.getenv("KEY_STATE_CHECKPOINT_INTERVAL", "30"))  # seconds
+SHARED_KEY_POLL_INTERVAL = int(os.getenv("SHARED_KEY_POLL_INTERVAL", "300"))  # seconds between shared_keys polls
+
+# --- Prompt Assembly ---
+PROMPT_MAX_TOKENS = int(os.getenv("PROMPT_MAX_TOKENS", "16000"))  # hard cap on prompt size, whatever the model allows
+
+# --- LLM Admission Control ---
+# Max simultaneous requests per provider, e.g. "groq=4,gemini=2"; others use the default.
+PROVIDER_CONCURRENCY_DEFAULT = int(os.getenv("PROVIDER_CONCURRENCY_DEFAULT", "4"))
+PROVIDER_CONCURRENCY = {
+    name.strip(): int(limit)
+    for name, _, limit in (p.partition("=") for p in os.getenv("PROVIDER_CONCURRENCY", "").split(","))
+    if name.strip() and limit.strip().isdigit()
+}
+# Daily token allowance per key, e.g. "groq=500000,cerebras=1000000"; unlisted providers are unmetered.
+PROVIDER_TOKEN_QUOTA = {
+    name.strip(): int(limit)
+    for name, _, limit in (p.partition("=") for p in os.getenv("PROVIDER_TOKEN_QUOTA", "").split(","))
+    if name.strip() and limit.strip().isdigit()
+}
+CHAT_DEADLINE = float(os.getenv("CHAT_DEADLINE", "40"))  # seconds; stays under the bot's 45s HTTP timeout
+CHAT_DEADLINE_MIN = float(os.getenv("CHAT_DEADLINE_MIN", "1"))     # client-supplied deadlines are clamped
+CHAT_DEADLINE_MAX = float(os.getenv("CHAT_DEADLINE_MAX", "120"))   # to this range
+
+# --- Mock Provider (offline benchmarks; active only when MOCK_API_KEYS is set) ---
+MOCK_LATENCY_DISTRIBUTION = os.getenv("MOCK_LATENCY_DISTRIBUTION", "lognormal")  # fixed | uniform | lognormal
+MOCK_LATENCY = float(os.getenv("MOCK_LATENCY", "0.8"))                # seconds; median for lognormal
+MOCK_LATENCY_SPREAD = float(os.getenv("MOCK_LATENCY_SPREAD", "0.4"))  # ± range (uniform) or sigma (lognormal)
+MOCK_ERROR_RATE = float(os.getenv("MOCK_ERROR_RATE", "0.0"))
+MOCK_RATE_LIMIT_RATE = float(os.getenv("MOCK_RATE_LIMIT_RATE", "0.0"))
+MOCK_SEED = int(os.getenv("MOCK_SEED", "42"))
+
+# --- Structured Output Batching ---
+STRUCTURED_BATCH_WINDOW = float(os.getenv("STRUCTURED_BATCH_WINDOW", "0.05"))      # seconds to collect a batch
+STRUCTURED_BATCH_MAX_ITEMS = int(os.getenv("STRUCTURED_BATCH_MAX_ITEMS", "8"))     # items per provider call
+STRUCTURED_BATCH_MAX_CHARS = int(os.getenv("STRUCTURED_BATCH_MAX_CHARS", "12000"))  # input text per provider call
+
+# --- Provider Probing (optional background health checks / connection warm-up) ---
+PROVIDER_PROBE_ENABLED = os.getenv("PROVIDER_PROBE_ENABLED", "false").lower() in ("1", "true", "yes")
+PROVIDER_PROBE_INTERVAL = int(os.getenv("PROVIDER_PROBE_INTERVAL", "120"))  # seconds between probes per provider
+PROVIDER_PROBE_TIMEOUT = float(os.getenv("PROVIDER_PROBE_TIMEOUT", "5"))
+
+# --- Tool API Cache (weather, news, wiki, quotes...) ---
+TOOL_CACHE_MAX_ENTRIES = int(os.getenv("TOOL_CACHE_MAX_ENTRIES", "512"))
+TOOL_CACHE_STALE_TTL = int(os.getenv("TOOL_CACHE_STALE_TTL", "21600"))  # most seconds past ttl a value may still be served
+TOOL_CACHE_STALE_FACTOR = float(os.getenv("TOOL_CACHE_STALE_FACTOR", "1"))  # stale window = ttl × this, up to the max
+TOOL_CACHE_NEGATIVE_TTL = int(os.getenv("TOOL_CACHE_NEGATIVE_TTL", "60"))  # seconds a failed fetch is remembered
+
+# --- Briefing Prefetch (weather/news/quotes refreshed in the background) ---
+BRIEFING_PREFETCH_ENABLED = os.getenv("BRIEFING_PREFETCH_ENABLED", "false").lower() in ("1", "true", "yes")
+BRIEFING_PREFETCH_INTERVAL = int(os.getenv("BRIEFING_PREFETCH_INTERVAL", "900"))  # seconds between refresh passes
+BRIEFING_CITIES = [c.strip() for c in os.getenv("BRIEFING_CITIES", "London").split(",") if c.strip()]
+BRIEFING_NEWS_TOPICS = [t.strip() for t in os.getenv("BRIEFING_NEWS_TOPICS", "technology").split(",") if t.strip()]
+BRIEFING_SNAPSHOT_PATH = os.getenv("BRIEFING_SNAPSHOT_PATH", os.path.join(tempfile.gettempdir(), "jexi_briefing_snapshot.json"))
+BRIEFING_SNAPSHOT_MAX_AGE = int(os.getenv("BRIEFING_SNAPSHOT_MAX_AGE", "21600"))  # never serve data older than 6h
+
+# --- Scheduled Briefings (morning briefing / evening review generated ahead of time) ---
+BRIEFING_SCHEDULE_ENABLED = os.getenv("BRIEFING_SCHEDULE_ENABLED", "false").lower() in ("1", "true", "yes")
+BRIEFING_SCHEDULE_TICK = int(os.getenv("BRIEFING_SCHEDULE_TICK", "300"))     # seconds between due-user scans
+BRIEFING_MORNING_HOUR = int(os.getenv("BRIEFING_MORNING_HOUR", "7"))         # user's local time
+BRIEFING_EVENING_HOUR = int(os.getenv("BRIEFING_EVENING_HOUR", "21"))
+BRIEFING_LEAD_MINUTES = int(os.getenv("BRIEFING_LEAD_MINUTES", "60"))        # generation is spread over this window
+BRIEFING_CONCURRENCY = int(os.getenv("BRIEFING_CONCURRENCY", "2"))           # briefings generated at once
+BRIEFING_ACTIVE_DAYS = int(os.getenv("BRIEFING_ACTIVE_DAYS", "7"))           # users who chatted within this many days
+BRIEFING_DEFAULT_TIMEZONE = os.getenv("BRIEFING_DEFAULT_TIMEZONE", "UTC")    # when user settings have no "timezone"
+BRIEFING_STORE_PATH = os.getenv("BRIEFING_STORE_PATH", os.path.join(tempfile.gettempdir(), "jexi_briefings.json"))
+
+# --- Conversation Context Cache (facts per user, recent history per session) ---
+CONTEXT_CACHE_TTL = int(os.getenv("CONTEXT_CACHE_TTL", "1800"))  # seconds; bounds staleness from other instances
+CONTEXT_CACHE_MAX_SESSIONS = int(os.getenv("CONTEXT_CACHE_MAX_SESSIONS", "2000"))
+CONTEXT_CACHE_MAX_USERS = int(os.getenv("CONTEXT_CACHE_MAX_USERS", "1000"))
+
+# --- Conversation Write-Behind (chat turns are bulk-inserted off the request path) ---
+CONVERSATION_FLUSH_INTERVAL = float(os.getenv("CONVERSATION_FLUSH_INTERVAL", "0.5"))  # seconds between flushes
+CONVERSATION_BATCH_SIZE = int(os.getenv("CONVERSATION_BATCH_SIZE", "100"))            # rows per bulk insert
+CONVERSATION_MAX_BACKOFF = float(os.getenv("CONVERSATION_MAX_BACKOFF", "60"))        # seconds between retries at most
+# Write-behind holds rows in process memory until the next flush; serverless instances (Vercel) can
+# be frozen or recycled before that and never replay a per-instance /tmp spill, so there rows are
+# written before the response returns.
+CONVERSATION_WRITE_BEHIND = os.getenv("CONVERSATION_WRITE_BEHIND", "false" if os.getenv("VERCEL") else "true").lower() == "true"
+CONVERSATION_SPILL_PATH = os.getenv("CONVERSATION_SPILL_PATH", os.path.join(tempfile.gettempdir(), "jexi_conversation_spill.jsonl"))  # replayed only by this instance
+
+# --- Background Fact Extraction (debounced per user, one LLM call per batch of turns) ---
+FACT_EXTRACT_DEBOUNCE = float(os.getenv("FACT_EXTRACT_DEBOUNCE", "30"))    # seconds of quiet before extracting
+FACT_EXTRACT_MAX_DELAY = float(os.getenv("FACT_EXTRACT_MAX_DELAY", "120"))  # extract at most this long after the first turn
+FACT_EXTRACT_MAX_TURNS = int(os.getenv("FACT_EXTRACT_MAX_TURNS", "5"))      # or as soon as this many turns are queued
+FACT_EXTRACT_MIN_WORDS = int(os.getenv("FACT_EXTRACT_MIN_WORDS", "3"))      # shorter messages are skipped
+
+# --- Memory Fact Retrieval (only the facts relevant to the message go into the prompt) ---
+FACT_TOP_K = int(os.getenv("FACT_TOP_K", "8"))
+FACT_PINNED_KEYS = [k.strip() for k in os.getenv("FACT_PINNED_KEYS", "name").split(",") if k.strip()]  # always included
+
+# --- Conversation Recall (relevant exchanges from past sessions, local vector index per user) ---
+RECALL_ENABLED = os.getenv("RECALL_ENABLED", "false").lower() in ("1", "true", "yes")
+RECALL_TOP_K = int(os.getenv("RECALL_TOP_K", "3"))                        # past exchanges added to the prompt
+RECALL_MIN_SCORE = float(os.getenv("RECALL_MIN_SCORE", "0.1"))            # idf-weighted cosine similarity
+RECALL_MAX_USERS = int(os.getenv("RECALL_MAX_USERS", "200"))              # indexes kept in memory
+RECALL_BACKFILL = os.getenv("RECALL_BACKFILL", "true").lower() in ("1", "true", "yes")
+RECALL_BACKFILL_MAX = int(os.getenv("RECALL_BACKFILL_MAX", "5000"))       # most recent messages indexed on first use
+RECALL_INDEX_DIR = os.getenv("RECALL_INDEX_DIR", os.path.join(tempfile.gettempdir(), "jexi_recall"))  # holds chat text; created 0700
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+load_test.py — Offline load test for the LLM router
+Drives LLMRouter.route() in-process against the mock provider (no network,
+no real keys), or POSTs to a running server's /api/v1/ai/chat, at one or
+more concurrency levels. Reports throughput, p50/p95/p99 latency, errors,
+fallbacks (requests that needed more than one provider call), cache hit rate
+and, in route mode, requests coalesced onto an identical in-flight call.
+
+Usage:
+  python load_test.py --concurrency 1,8,32 --requests 200
+  python load_test.py --latency 0.5 --spread 0.6 --error-rate 0.05 --rate-limit-rate 0.01
+  python load_test.py --mode http --url http://localhost:8000 --token <JWT>
+  (start the server with MOCK_API_KEYS set for an offline end-to-end run)
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+_REAL_KEY_VARS = [
+    "GROQ_API_KEYS", "GEMINI_API_KEYS", "COHERE_API_KEYS", "OPENROUTER_API_KEYS", "HF_API_KEYS",
+    "CLOUDFLARE_API_KEYS", "NVIDIA_API_KEYS", "SAMBANOVA_API_KEYS", "CEREBRAS_API_KEYS",
+]
+
+
+def _isolate_router_env(n_keys: int):
+    """Route-mode environment: mock keys only and a scratch key-state file.
+    Must run before config is imported (load_dotenv never overrides set variables)."""
+    for var in _REAL_KEY_VARS:
+        os.environ[var] = ""
+    os.environ["MOCK_API_KEYS"] = ",".join(f"mock-key-{i}" for i in range(n_keys))
+    os.environ["KEY_STATE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="jexi_load_"), "key_state.json")
+
+
+def _percentile(samples: list[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(pct * len(ordered)))]
+
+
+def _prompts(n: int, repeat_ratio: float, seed: int) -> list[str]:
+    """`repeat_ratio` of prompts come from a small hot set so the cache gets hits."""
+    rng = random.Random(seed)
+    hot = [f"What is a good habit to start, idea #{i}?" for i in range(10)]
+    return [
+        rng.choice(hot) if rng.random() < repeat_ratio else f"Unique question {i}: plan my day around {rng.random():.6f}"
+        for i in range(n)
+    ]
+
+
+# ------------------------------------------------------------------
+async def _run_level(call, prompts: list[str], concurrency: int) -> dict:
+    """Fire `prompts` through `call` with at most `concurrency` in flight."""
+    sem = asyncio.Semaphore(concurrency)
+    outcomes = []
+
+    async def one(prompt: str):
+        async with sem:
+            t0 = time.perf_counter()
+            try:
+                ok, attempts, cached, coalesced = await call(prompt)
+            except Exception:
+                ok, attempts, cached, coalesced = False, 0, False, False
+            outcomes.append((time.perf_counter() - t0, ok, attempts, cached, coalesced))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(p) for p in prompts))
+    wall = time.perf_counter() - started
+
+    latencies = [o[0] for o in outcomes if o[1]]
+    return {
+        "concurrency": concurrency,
+        "requests": len(outcomes),
+        "throughput": len(outcomes) / wall if wall else 0.0,
+        "p50": _percentile(latencies, 0.50),
+        "p95": _percentile(latencies, 0.95),
+        "p99": _percentile(latencies, 0.99),
+        "errors": sum(1 for o in outcomes if not o[1]),
+        "fallbacks": sum(1 for o in outcomes if (o[2] or 0) > 1),
+        "cache_hit_rate": sum(1 for o in outcomes if o[3]) / len(outcomes) if outcomes else 0.0,
+        "coalesced": sum(1 for o in outcomes if o[4]),
+    }
+
+
+def _route_caller(args):
+    sys.path.insert(0, BACKEND_DIR)
+    from providers import mock_provider
+    from services.llm_router import get_llm_router
+    from services.telemetry_service import UsageTelemetry
+
+    mock_provider.configure(
+        seed=args.seed,
+        distribution=args.distribution,
+        latency=args.latency,
+        spread=args.spread,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+    )
+    router = get_llm_router()
+    router.telemetry = UsageTelemetry(writer=len)  # keep usage rows in-process
+    router._last_key_refresh = time.time()          # no shared_keys polling mid-run
+
+    async def call(prompt: str):
+        result = await router.route(
+            [{"role": "user", "content": prompt}],
+            cache_ttl=args.cache_ttl,
+            task=args.task,
+            deadline=args.deadline,
+            feature="load_test",
+        )
+        return (result.get("status") == "success", result.get("attempts"),
+                result.get("cached", False), result.get("coalesced", False))
+
+    return call, router
+
+
+def _http_caller(args):
+    import httpx
+
+    client = httpx.AsyncClient(
+        base_url=args.url.rstrip("/"),
+        headers={"Authorization": f"Bearer {args.token}"} if args.token else {},
+        timeout=args.deadline or 60.0,
+        limits=httpx.Limits(max_connections=max(args.concurrency_levels)),
+    )
+
+    async def call(prompt: str):
+        body = {"message": prompt}
+        if args.deadline:
+            body["deadline"] = args.deadline
+        resp = await client.post("/api/v1/ai/chat", json=body)
+        if resp.status_code != 200:
+            return False, 0, False, False
+        data = resp.json().get("data", {})
+        return True, data.get("attempts"), data.get("cached", False), False
+
+    return call, client
+
+
+async def _main(args):
+    if args.mode == "route":
+        call, router = _route_caller(args)
+    else:
+        call, client = _http_caller(args)
+
+    print(f"🔥 Load test — mode={args.mode} requests/level={args.requests} "
+          f"repeat_ratio={args.repeat_ratio} cache_ttl={args.cache_ttl}")
+    header = f"{'conc':>5} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7} {'fallbk':>7} {'cache%':>7} {'coalsc':>7}"
+    print(header)
+    for level in args.concurrency_levels:
+        stats = await _run_level(call, _prompts(args.requests, args.repeat_ratio, args.seed + level), level)
+        print(f"{stats['concurrency']:>5} {stats['throughput']:>8.2f} {stats['p50'] * 1000:>9.1f} "
+              f"{stats['p95'] * 1000:>9.1f} {stats['p99'] * 1000:>9.1f} {stats['errors']:>7} "
+              f"{stats['fallbacks']:>7} {stats['cache_hit_rate'] * 100:>6.1f}% {stats['coalesced']:>7}")
+
+    if args.mode == "route":
+        print("\nProvider status:")
+        for status in router.get_provider_status():
+            print(f"  {status['name']}: keys={status['available_keys']} "
+                  f"avg={status['avg_response_time']}s admission={status['admission']}")
+    else:
+        await client.aclose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=["route", "http"], default="route")
+    parser.add_argument("--concurrency", default="1,8,32", help="comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=200, help="requests per concurrency level")
+    parser.add_argument("--repeat-ratio", type=float, default=0.3, help="share of prompts from a hot set")
+    parser.add_argument("--cache-ttl", type=int, default=300, help="route mode: cache TTL passed to route()")
+    parser.add_argument("--task", default="chat", help="route mode: task class")
+    parser.add_argument("--deadline", type=float, default=None, help="seconds per request")
+    parser.add_argument("--seed", type=int, default=42)
+    # Mock provider profile (route mode)
+    parser.add_argument("--keys", type=int, default=16, help="mock keys in rotation")
+    parser.add_argument("--distribution", choices=["fixed", "uniform", "lognormal"], default="lognormal")
+    parser.add_argument("--latency", type=float, default=0.3, help="seconds (median for lognormal)")
+    parser.add_argument("--spread", type=float, default=0.4, help="± range (uniform) or sigma (lognormal)")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    # HTTP mode
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--token", default=os.getenv("JEXI_TOKEN", ""), help="JWT for /api/v1/ai/chat")
+    args = parser.parse_args()
+    args.concurrency_levels = [int(c) for c in args.concurrency.split(",") if c.strip()]
+
+    if args.mode == "route":
+        _isolate_router_env(args.keys)
+    asyncio.run(_main(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -106,6 +106,85 @@ except Exception as e:
 
 app = FastAPI(title="JEXI AI Life OS")
 
+@app.on_event("startup")
+async def start_provider_prober():
+    """Warm provider connections and track availability in the background (opt-in)."""
+    from config import PROVIDER_PROBE_ENABLED
+    if not PROVIDER_PROBE_ENABLED:
+        return
+    try:
+        from services.provider_prober import get_provider_prober
+        get_provider_prober().start()
+    except Exception as e:
+        print(f"Warning: provider prober not started: {e}")
+
+@app.on_event("startup")
+async def start_briefing_prefetcher():
+    """Keep weather/news/quotes for configured cities and topics pre-fetched (opt-in)."""
+    from config import BRIEFING_PREFETCH_ENABLED
+    if not BRIEFING_PREFETCH_ENABLED:
+        return
+    try:
+        from services.briefing_prefetcher import get_briefing_prefetcher
+        get_briefing_prefetcher().start()
+    except Exception as e:
+        print(f"Warning: briefing prefetcher not started: {e}")
+
+@app.on_event("startup")
+async def start_briefing_scheduler():
+    """Generate morning briefings / evening reviews ahead of each user's local time (opt-in)."""
+    from config import BRIEFING_SCHEDULE_ENABLED
+    if not BRIEFING_SCHEDULE_ENABLED:
+        return
+    try:
+        from services.briefing_scheduler import get_briefing_scheduler
+        get_briefing_scheduler().start()
+    except Exception as e:
+        print(f"Warning: briefing scheduler not started: {e}")
+
+@app.on_event("startup")
+async def start_conversation_writer():
+    """Start the conversation write-behind loop (replays rows spilled by a previous run)."""
+    try:
+        from services.conversation_writer import get_conversation_writer
+        get_conversation_writer().start()
+    except Exception as e:
+        print(f"Warning: conversation writer not started: {e}")
+
+@app.on_event("shutdown")
+async def flush_telemetry():
+    """Drain buffered API usage records before the process exits."""
+    try:
+        from services.llm_router import get_llm_router
+        await get_llm_router().telemetry.flush()
+    except Exception as e:
+        print(f"Warning: telemetry flush on shutdown failed: {e}")
+    try:
+        from services.fact_extraction import get_fact_extraction_queue
+        await get_fact_extraction_queue().drain()
+    except Exception as e:
+        print(f"Warning: fact extraction drain on shutdown failed: {e}")
+    try:
+        from services.conversation_writer import get_conversation_writer
+        await get_conversation_writer().stop()
+    except Exception as e:
+        print(f"Warning: conversation flush on shutdown failed: {e}")
+    try:
+        from services.provider_prober import get_provider_prober
+        await get_provider_prober().stop()
+    except Exception:
+        pass
+    try:
+        from services.briefing_prefetcher import get_briefing_prefetcher
+        await get_briefing_prefetcher().stop()
+    except Exception:
+        pass
+    try:
+        from services.briefing_scheduler import get_briefing_scheduler
+        await get_briefing_scheduler().stop()
+    except Exception:
+        pass
+
 @app.get("/api/v1/health-check")
 async def health():
     return {"status": "ok", "message": "Backend is alive!"}
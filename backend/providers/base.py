@@ -1,9 +1,79 @@
+import asyncio
+import hashlib
+import time
 from abc import ABC, abstractmethod
 
+import httpx
+
+
+# Seconds a provider call may take when the caller gives no deadline
+DEFAULT_TIMEOUT = 30.0
+
+# scope → (event loop, pooled client). Clients are bound to the loop they were
+# first used on, so a new loop (e.g. a script calling asyncio.run twice) gets a new one.
+_HTTP_CLIENTS: dict[str, tuple] = {}
+
+
+def key_scope(provider: str, api_key: str) -> str:
+    """Cache scope for per-key clients without keeping the raw key as a dict key."""
+    return f"{provider}:{hashlib.sha256(api_key.encode()).hexdigest()[:16]}"
+
+
+def get_http_client(scope: str = "default", headers: dict | None = None) -> httpx.AsyncClient:
+    """Shared keep-alive AsyncClient for `scope` on the running event loop."""
+    loop = asyncio.get_running_loop()
+    cached = _HTTP_CLIENTS.get(scope)
+    if cached is not None and cached[0] is loop and not cached[1].is_closed:
+        return cached[1]
+    client = httpx.AsyncClient(
+        headers=headers,
+        timeout=DEFAULT_TIMEOUT,
+        limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+    )
+    _HTTP_CLIENTS[scope] = (loop, client)
+    return client
+
+
+def _field(obj, name):
+    return obj.get(name) if isinstance(obj, dict) else getattr(obj, name, None)
+
+
+def normalize_usage(raw) -> dict | None:
+    """Provider token accounting → {prompt_tokens, completion_tokens, total_tokens}.
+
+    Understands OpenAI-style `usage` (Groq, Cerebras, OpenRouter, ...), Gemini
+    `usageMetadata` and Cohere's `usage.tokens` / `usage.billed_units`, as
+    dicts or SDK objects. Returns None when nothing usable is present.
+    """
+    if raw is None:
+        return None
+    for source in (raw, _field(raw, "tokens"), _field(raw, "billed_units")):
+        if source is None:
+            continue
+        prompt = next((v for v in (_field(source, k) for k in ("prompt_tokens", "promptTokenCount", "input_tokens"))
+                       if v is not None), None)
+        completion = next((v for v in (_field(source, k) for k in ("completion_tokens", "candidatesTokenCount", "output_tokens"))
+                           if v is not None), None)
+        total = next((v for v in (_field(source, k) for k in ("total_tokens", "totalTokenCount"))
+                      if v is not None), None)
+        if prompt is None and completion is None and total is None:
+            continue
+        prompt, completion = int(prompt or 0), int(completion or 0)
+        return {
+            "prompt_tokens": prompt,
+            "completion_tokens": completion,
+            "total_tokens": int(total) if total is not None else prompt + completion,
+        }
+    return None
+
 
 class BaseProvider(ABC):
     """Abstract base class for all AI providers."""
 
+    # Token-free endpoint (usually a models list) used by probe(); None → not probeable
+    probe_url: str | None = None
+    api_key: str = ""
+
     @property
     @abstractmethod
     def name(self) -> str:
@@ -11,13 +81,15 @@ class BaseProvider(ABC):
         ...
 
     @abstractmethod
-    async def chat(self, messages: list[dict], model: str | None = None) -> dict:
+    async def chat(self, messages: list[dict], model: str | None = None,
+                   timeout: float | None = None) -> dict:
         """
         Send a chat completion request.
 
         Args:
             messages: List of message dicts with 'role' and 'content' keys.
             model: Optional model identifier. Provider uses its default if None.
+            timeout: Seconds allowed for this call. DEFAULT_TIMEOUT if None.
 
         Returns:
             dict with keys:
@@ -26,5 +98,35 @@ class BaseProvider(ABC):
                 - model: str        — model used
                 - status: "success" | "failed"
                 - error: str | None — error message on failure
+                - usage: dict | None — {prompt_tokens, completion_tokens, total_tokens}
+                  on success when the API reports it (see normalize_usage)
         """
         ...
+
+    def _http(self) -> httpx.AsyncClient:
+        """The pooled client chat() uses, so probing also warms its connections."""
+        return get_http_client(self.name)
+
+    def _probe_headers(self) -> dict:
+        return {"Authorization": f"Bearer {self.api_key}"}
+
+    async def probe(self, timeout: float = 5.0) -> dict:
+        """Cheap liveness check that spends no tokens.
+
+        Returns:
+            dict with keys:
+                - ok: bool | None   — None when the provider has no probe endpoint
+                - latency: float    — seconds the probe took
+                - error: str | None
+        """
+        if not self.probe_url:
+            return {"ok": None, "latency": 0.0, "error": None}
+        t0 = time.monotonic()
+        try:
+            response = await self._http().get(self.probe_url, headers=self._probe_headers(), timeout=timeout)
+            response.raise_for_status()
+            return {"ok": True, "latency": round(time.monotonic() - t0, 3), "error": None}
+        except httpx.TimeoutException:
+            return {"ok": False, "latency": round(time.monotonic() - t0, 3), "error": "Timeout"}
+        except Exception as e:
+            return {"ok": False, "latency": round(time.monotonic() - t0, 3), "error": str(e)}
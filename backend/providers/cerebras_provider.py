@@ -1,5 +1,5 @@
 import httpx
-from providers.base import BaseProvider
+from providers.base import BaseProvider, DEFAULT_TIMEOUT, get_http_client, normalize_usage
 
 
 CEREBRAS_MODELS = [
@@ -14,12 +14,14 @@ class CerebrasProvider(BaseProvider):
     def __init__(self, api_key: str):
         self.api_key = api_key
         self.endpoint = "https://api.cerebras.ai/v1/chat/completions"
+        self.probe_url = "https://api.cerebras.ai/v1/models"
 
     @property
     def name(self) -> str:
         return "cerebras"
 
-    async def chat(self, messages: list[dict], model: str | None = None) -> dict:
+    async def chat(self, messages: list[dict], model: str | None = None,
+                   timeout: float | None = None) -> dict:
         used_model = model or CEREBRAS_MODELS[0]
         try:
             headers = {
@@ -32,11 +34,13 @@ class CerebrasProvider(BaseProvider):
                 "max_tokens": 1024,
             }
 
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.post(self.endpoint, headers=headers, json=body)
-                response.raise_for_status()
-                data = response.json()
-                text = data["choices"][0]["message"]["content"] if "choices" in data and data["choices"] else None
+            response = await get_http_client(self.name).post(
+                self.endpoint, headers=headers, json=body,
+                timeout=timeout or DEFAULT_TIMEOUT,
+            )
+            response.raise_for_status()
+            data = response.json()
+            text = data["choices"][0]["message"]["content"] if "choices" in data and data["choices"] else None
 
             return {
                 "text": text,
@@ -44,6 +48,7 @@ class CerebrasProvider(BaseProvider):
                 "model": used_model,
                 "status": "success",
                 "error": None,
+                "usage": normalize_usage(data.get("usage")),
             }
         except httpx.TimeoutException:
             return {
@@ -1,5 +1,6 @@
 import httpx
-from providers.base import BaseProvider
+from providers.base import BaseProvider, DEFAULT_TIMEOUT, get_http_client, normalize_usage
+from config import CLOUDFLARE_ACCOUNT_ID
 
 
 CF_MODELS = [
@@ -11,15 +12,20 @@ CF_MODELS = [
 class CloudflareProvider(BaseProvider):
     """Provider for Cloudflare Workers AI."""
 
-    def __init__(self, api_key: str, account_id: str):
+    def __init__(self, api_key: str, account_id: str | None = None):
         self.api_key = api_key
-        self.account_id = account_id
+        # The router only passes api_key; the account comes from config
+        self.account_id = account_id or CLOUDFLARE_ACCOUNT_ID
+        self.probe_url = (
+            f"https://api.cloudflare.com/client/v4/accounts/{self.account_id}/ai/models/search?per_page=1"
+        )
 
     @property
     def name(self) -> str:
         return "cloudflare"
 
-    async def chat(self, messages: list[dict], model: str | None = None) -> dict:
+    async def chat(self, messages: list[dict], model: str | None = None,
+                   timeout: float | None = None) -> dict:
         used_model = model or CF_MODELS[0]
         endpoint = f"https://api.cloudflare.com/client/v4/accounts/{self.account_id}/ai/run/{used_model}"
         
@@ -32,15 +38,17 @@ class CloudflareProvider(BaseProvider):
                 "messages": messages
             }
 
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.post(endpoint, headers=headers, json=body)
-                response.raise_for_status()
-                data = response.json()
-                text = None
-                
-                # Cloudflare AI response structure
-                if data.get("success") and "result" in data:
-                    text = data["result"].get("response")
+            response = await get_http_client(self.name).post(
+                endpoint, headers=headers, json=body,
+                timeout=timeout or DEFAULT_TIMEOUT,
+            )
+            response.raise_for_status()
+            data = response.json()
+            text = None
+
+            # Cloudflare AI response structure
+            if data.get("success") and "result" in data:
+                text = data["result"].get("response")
 
             return {
                 "text": text,
@@ -48,6 +56,7 @@ class CloudflareProvider(BaseProvider):
                 "model": used_model,
                 "status": "success",
                 "error": None,
+                "usage": normalize_usage((data.get("result") or {}).get("usage")),
             }
         except httpx.TimeoutException:
             return {
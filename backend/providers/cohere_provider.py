@@ -1,5 +1,6 @@
 import asyncio
-from providers.base import BaseProvider
+import time
+from providers.base import BaseProvider, DEFAULT_TIMEOUT, key_scope, normalize_usage
 
 
 COHERE_MODELS = [
@@ -8,22 +9,51 @@ COHERE_MODELS = [
     "command-a-03-2025"
 ]
 
+# key scope → (event loop, AsyncClientV2); the SDK client pools connections
+# internally, so one per key is reused across router attempts.
+_CLIENTS: dict[str, tuple] = {}
+
+
+def _client_for(api_key: str):
+    loop = asyncio.get_running_loop()
+    scope = key_scope("cohere", api_key)
+    cached = _CLIENTS.get(scope)
+    if cached is not None and cached[0] is loop:
+        return cached[1]
+    import cohere
+    client = cohere.AsyncClientV2(api_key=api_key, timeout=DEFAULT_TIMEOUT)
+    _CLIENTS[scope] = (loop, client)
+    return client
+
+
 class CohereProvider(BaseProvider):
     """Provider for Cohere API (v2 client)."""
 
     def __init__(self, api_key: str):
         self.api_key = api_key
+
+    @property
+    def client(self):
+        """Cached per-key SDK client for the running loop."""
+        return _client_for(self.api_key)
+
+    async def probe(self, timeout: float = 5.0) -> dict:
+        """List one model through the SDK client (warms its connection pool)."""
+        t0 = time.monotonic()
         try:
-            import cohere
-            self.client = cohere.AsyncClientV2(api_key=api_key, timeout=30.0)
-        except ImportError:
-            self.client = None
+            await asyncio.wait_for(self.client.models.list(page_size=1), timeout=timeout)
+            return {"ok": True, "latency": round(time.monotonic() - t0, 3), "error": None}
+        except asyncio.TimeoutError:
+            return {"ok": False, "latency": round(time.monotonic() - t0, 3), "error": "Timeout"}
+        except Exception as e:
+            return {"ok": False, "latency": round(time.monotonic() - t0, 3), "error": str(e)}
 
     @property
     def name(self) -> str:
         return "cohere"
 
-    async def chat(self, messages: list[dict], model: str | None = None) -> dict:
+    async def chat(self, messages: list[dict], model: str | None = None,
+                   timeout: float | None = None) -> dict:
         used_model = model or COHERE_MODELS[0]
         try:
             # v2 chat uses messages format naturally aligned mostly with OpenAI format.
@@ -35,7 +65,7 @@ class CohereProvider(BaseProvider):
                     messages=messages
                 )
                 
-            response = await asyncio.wait_for(_chat(), timeout=30.0)
+            response = await asyncio.wait_for(_chat(), timeout=timeout or DEFAULT_TIMEOUT)
             
             text = response.message.content[0].text if response.message.content else None
 
@@ -45,6 +75,7 @@ class CohereProvider(BaseProvider):
                 "model": used_model,
                 "status": "success",
                 "error": None,
+                "usage": normalize_usage(getattr(response, "usage", None)),
             }
         except asyncio.TimeoutError:
             return {
@@ -1,5 +1,5 @@
-import asyncio
-from providers.base import BaseProvider
+import httpx
+from providers.base import BaseProvider, DEFAULT_TIMEOUT, get_http_client, key_scope, normalize_usage
 
 
 GEMINI_MODELS = [
@@ -9,72 +9,76 @@ GEMINI_MODELS = [
 
 
 class GeminiProvider(BaseProvider):
-    """Provider for Google Gemini API using the official SDK."""
+    """Provider for Google Gemini via the generateContent REST API.
+
+    The google-generativeai SDK only takes credentials through the module-global
+    genai.configure(), so concurrent requests with different keys would race.
+    Here each key gets its own pooled client with the key in its default
+    headers — no global state, and no per-call client construction.
+    """
 
     def __init__(self, api_key: str):
         self.api_key = api_key
-        # We configure it right away, but if we have multiple instances we might just
-        # need to configure it per call, or pass it to individual calls.
-        # Since google-generativeai is module-level configured by genai.configure, 
-        # it might be tricky to have multiple concurrent keys unless handled via 
-        # GenerativeModel initialization or passing `api_key` parameter (if supported).
-        # We will use `genai.configure(api_key=...)` in a thread or directly, 
-        # but to be thread-safe we can pass credentials/api_key if the SDK allows.
-        # However, the SDK might not expose it easily. Instead, if we only have one or we change it:
-        # For simplicity in this prompt, we'll set it here.
-        # If rotation is needed, we'll need to set it before using, but it's module-global.
+        self.base_url = "https://generativelanguage.googleapis.com/v1beta/models"
+        self.probe_url = f"{self.base_url}?pageSize=1"
 
     @property
     def name(self) -> str:
         return "gemini"
 
-    async def chat(self, messages: list[dict], model: str | None = None) -> dict:
-        used_model = model or GEMINI_MODELS[0]
-        try:
-            import google.generativeai as genai
-            # We must configure it before the call, in case another instance changed it
-            genai.configure(api_key=self.api_key)
-            
-            # Extract system instruction
-            system_instruction = None
-            history = []
-            last_message = ""
+    def _http(self) -> httpx.AsyncClient:
+        return get_http_client(
+            key_scope(self.name, self.api_key),
+            headers={"x-goog-api-key": self.api_key, "Content-Type": "application/json"},
+        )
 
-            for msg in messages:
-                if msg["role"] == "system":
-                    system_instruction = msg["content"]
-                elif msg["role"] == "user":
-                    history.append({"role": "user", "parts": [msg["content"]]})
-                elif msg["role"] == "assistant":
-                    history.append({"role": "model", "parts": [msg["content"]]})
+    def _probe_headers(self) -> dict:
+        return {}  # the key is already in the per-key client's default headers
 
-            # The last message typically is from user and we don't put it in history
-            # if we are doing a standard generate_content, but if using chat session:
-            if history and history[-1]["role"] == "user":
-                last_message = history[-1]["parts"][0]
-                history = history[:-1]
+    @staticmethod
+    def _build_body(messages: list[dict]) -> dict:
+        """OpenAI-style messages → Gemini contents + system_instruction."""
+        system_parts = []
+        contents = []
+        for msg in messages:
+            if msg["role"] == "system":
+                system_parts.append({"text": msg["content"]})
+            else:
+                role = "model" if msg["role"] == "assistant" else "user"
+                contents.append({"role": role, "parts": [{"text": msg["content"]}]})
 
-            g_model = genai.GenerativeModel(
-                model_name=used_model,
-                system_instruction=system_instruction
+        body = {"contents": contents, "generationConfig": {"maxOutputTokens": 1024}}
+        if system_parts:
+            body["system_instruction"] = {"parts": system_parts}
+        return body
+
+    async def chat(self, messages: list[dict], model: str | None = None,
+                   timeout: float | None = None) -> dict:
+        used_model = model or GEMINI_MODELS[0]
+        try:
+            response = await self._http().post(
+                f"{self.base_url}/{used_model}:generateContent",
+                json=self._build_body(messages),
+                timeout=timeout or DEFAULT_TIMEOUT,
             )
-            
-            chat_session = g_model.start_chat(history=history)
+            response.raise_for_status()
+            data = response.json()
 
-            # Create sending coroutine
-            response_coro = chat_session.send_message_async(content=last_message)
-            # Apply 30s timeout manually using asyncio
-            response = await asyncio.wait_for(response_coro, timeout=30.0)
+            text = None
+            candidates = data.get("candidates") or []
+            if candidates:
+                parts = candidates[0].get("content", {}).get("parts", [])
+                text = "".join(p.get("text", "") for p in parts) or None
 
-            text = response.text
             return {
                 "text": text,
                 "provider": self.name,
                 "model": used_model,
                 "status": "success",
                 "error": None,
+                "usage": normalize_usage(data.get("usageMetadata")),
             }
-        except asyncio.TimeoutError:
+        except httpx.TimeoutException:
             return {
                 "text": None,
                 "provider": self.name,
@@ -1,5 +1,5 @@
 import httpx
-from providers.base import BaseProvider
+from providers.base import BaseProvider, DEFAULT_TIMEOUT, get_http_client
 
 
 HF_MODELS = {
@@ -14,6 +14,7 @@ class HuggingFaceProvider(BaseProvider):
 
     def __init__(self, api_key: str):
         self.api_key = api_key
+        self.probe_url = f"https://api-inference.huggingface.co/status/{HF_MODELS['mistral']}"
 
     @property
     def name(self) -> str:
@@ -43,7 +44,8 @@ class HuggingFaceProvider(BaseProvider):
              
         return prompt
 
-    async def chat(self, messages: list[dict], model: str | None = None) -> dict:
+    async def chat(self, messages: list[dict], model: str | None = None,
+                   timeout: float | None = None) -> dict:
         model_key = model if model in HF_MODELS else "mistral"
         model_id = HF_MODELS.get(model_key, HF_MODELS["mistral"])
         endpoint = f"https://api-inference.huggingface.co/models/{model_id}"
@@ -63,27 +65,29 @@ class HuggingFaceProvider(BaseProvider):
                 }
             }
 
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.post(endpoint, headers=headers, json=body)
-                response.raise_for_status()
-                data = response.json()
-                
-                # Inference API usually returns a list with a dictionary
-                raw_text = None
-                if isinstance(data, list) and len(data) > 0 and "generated_text" in data[0]:
-                    raw_text = data[0]["generated_text"]
-                elif isinstance(data, dict) and "generated_text" in data:
-                    raw_text = data["generated_text"]
-                elif "error" in data:
-                    raise Exception(data["error"])
-                
-                text = None
-                if raw_text is not None:
-                    # Clean response: remove prompt from generated text
-                    if raw_text.startswith(prompt):
-                        text = raw_text[len(prompt):].strip()
-                    else:
-                        text = raw_text.strip()
+            response = await get_http_client(self.name).post(
+                endpoint, headers=headers, json=body,
+                timeout=timeout or DEFAULT_TIMEOUT,
+            )
+            response.raise_for_status()
+            data = response.json()
+
+            # Inference API usually returns a list with a dictionary
+            raw_text = None
+            if isinstance(data, list) and len(data) > 0 and "generated_text" in data[0]:
+                raw_text = data[0]["generated_text"]
+            elif isinstance(data, dict) and "generated_text" in data:
+                raw_text = data["generated_text"]
+            elif "error" in data:
+                raise Exception(data["error"])
+
+            text = None
+            if raw_text is not None:
+                # Clean response: remove prompt from generated text
+                if raw_text.startswith(prompt):
+                    text = raw_text[len(prompt):].strip()
+                else:
+                    text = raw_text.strip()
 
             return {
                 "text": text,
@@ -91,6 +95,7 @@ class HuggingFaceProvider(BaseProvider):
                 "model": model_key,
                 "status": "success",
                 "error": None,
+                "usage": None,
             }
         except httpx.TimeoutException:
             return {
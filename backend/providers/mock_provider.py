@@ -0,0 +1,152 @@
+import asyncio
+import math
+import random
+
+from providers.base import BaseProvider, DEFAULT_TIMEOUT
+from config import (
+    MOCK_LATENCY_DISTRIBUTION, MOCK_LATENCY, MOCK_LATENCY_SPREAD,
+    MOCK_ERROR_RATE, MOCK_RATE_LIMIT_RATE, MOCK_SEED,
+)
+
+
+MOCK_MODELS = [
+    "mock-small",
+    "mock-large",
+]
+
+# Behaviour shared by every MockProvider instance (the router builds one per attempt).
+# Adjust at runtime with configure(); the RNG is seeded so runs are repeatable.
+PROFILE = {
+    "distribution": MOCK_LATENCY_DISTRIBUTION,
+    "latency": MOCK_LATENCY,
+    "spread": MOCK_LATENCY_SPREAD,
+    "error_rate": MOCK_ERROR_RATE,
+    "rate_limit_rate": MOCK_RATE_LIMIT_RATE,
+    "first_token_share": 0.3,  # fraction of the latency spent before the first stream chunk
+}
+_rng = random.Random(MOCK_SEED)
+
+
+def configure(seed: int | None = None, **overrides) -> dict:
+    """Update the shared mock profile (and optionally reseed). Returns the profile."""
+    global _rng
+    unknown = set(overrides) - set(PROFILE)
+    if unknown:
+        raise ValueError(f"Unknown mock profile fields: {', '.join(sorted(unknown))}")
+    PROFILE.update(overrides)
+    if seed is not None:
+        _rng = random.Random(seed)
+    return dict(PROFILE)
+
+
+def _sample_latency() -> float:
+    base, spread = PROFILE["latency"], PROFILE["spread"]
+    dist = PROFILE["distribution"]
+    if dist == "fixed":
+        return base
+    if dist == "uniform":
+        return max(0.0, _rng.uniform(base - spread, base + spread))
+    # lognormal: `latency` is the median, `spread` is sigma — long right tail like real APIs
+    return base * math.exp(_rng.gauss(0.0, spread))
+
+
+def _draw_outcome() -> str:
+    roll = _rng.random()
+    if roll < PROFILE["rate_limit_rate"]:
+        return "rate_limited"
+    if roll < PROFILE["rate_limit_rate"] + PROFILE["error_rate"]:
+        return "error"
+    return "success"
+
+
+def _reply_for(messages: list[dict]) -> str:
+    last_user = next((m.get("content", "") for m in reversed(messages) if m.get("role") == "user"), "")
+    return f"Mock reply to: {last_user[:200]}"
+
+
+def _usage_for(messages: list[dict], text: str) -> dict:
+    """Word-count token accounting, shaped like a real provider's usage block."""
+    prompt = sum(len((m.get("content") or "").split()) + 4 for m in messages)
+    completion = len(text.split())
+    return {"prompt_tokens": prompt, "completion_tokens": completion, "total_tokens": prompt + completion}
+
+
+class MockProvider(BaseProvider):
+    """In-process provider with configurable latency, error and 429 rates.
+
+    Enabled by setting MOCK_API_KEYS; lets the router be load-tested with no
+    network access. Failures are reported exactly like the real providers do.
+    """
+
+    def __init__(self, api_key: str):
+        self.api_key = api_key
+
+    @property
+    def name(self) -> str:
+        return "mock"
+
+    async def chat(self, messages: list[dict], model: str | None = None,
+                   timeout: float | None = None) -> dict:
+        used_model = model or MOCK_MODELS[0]
+        latency = _sample_latency()
+        outcome = _draw_outcome()
+        timeout = timeout or DEFAULT_TIMEOUT
+
+        if latency > timeout:
+            await asyncio.sleep(timeout)
+            return {
+                "text": None,
+                "provider": self.name,
+                "model": used_model,
+                "status": "failed",
+                "error": "Timeout",
+            }
+
+        await asyncio.sleep(latency)
+        if outcome == "rate_limited":
+            error = "Client error '429 Too Many Requests'"
+        elif outcome == "error":
+            error = "Server error '500 Internal Server Error'"
+        else:
+            error = None
+
+        text = None if error else _reply_for(messages)
+        return {
+            "text": text,
+            "provider": self.name,
+            "model": used_model,
+            "status": "failed" if error else "success",
+            "error": error,
+            "usage": None if error else _usage_for(messages, text),
+        }
+
+    async def probe(self, timeout: float = 5.0) -> dict:
+        """Simulated models-list call: a fraction of the chat latency, same error rate."""
+        latency = min(_sample_latency() * 0.2, timeout)
+        await asyncio.sleep(latency)
+        ok = _rng.random() >= PROFILE["error_rate"]
+        return {"ok": ok, "latency": round(latency, 3), "error": None if ok else "Server error '500 Internal Server Error'"}
+
+    async def stream(self, messages: list[dict], model: str | None = None,
+                     timeout: float | None = None):
+        """Yield the reply word by word. Errors are raised before the first chunk."""
+        latency = _sample_latency()
+        outcome = _draw_outcome()
+        timeout = timeout or DEFAULT_TIMEOUT
+
+        first_token = latency * PROFILE["first_token_share"]
+        if first_token > timeout:
+            await asyncio.sleep(timeout)
+            raise asyncio.TimeoutError()
+        await asyncio.sleep(first_token)
+        if outcome == "rate_limited":
+            raise RuntimeError("Client error '429 Too Many Requests'")
+        if outcome == "error":
+            raise RuntimeError("Server error '500 Internal Server Error'")
+
+        words = _reply_for(messages).split(" ")
+        per_word = (latency - first_token) / max(1, len(words))
+        for i, word in enumerate(words):
+            if i:
+                await asyncio.sleep(per_word)
+            yield word if i == len(words) - 1 else word + " "
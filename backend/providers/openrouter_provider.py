@@ -1,6 +1,6 @@
 import httpx
 import asyncio
-from providers.base import BaseProvider
+from providers.base import BaseProvider, DEFAULT_TIMEOUT, get_http_client, normalize_usage
 
 
 OPENROUTER_MODELS = [
@@ -16,12 +16,14 @@ class OpenRouterProvider(BaseProvider):
     def __init__(self, api_key: str):
         self.api_key = api_key
         self.endpoint = "https://openrouter.ai/api/v1/chat/completions"
+        self.probe_url = "https://openrouter.ai/api/v1/models"
 
     @property
     def name(self) -> str:
         return "openrouter"
 
-    async def chat(self, messages: list[dict], model: str | None = None) -> dict:
+    async def chat(self, messages: list[dict], model: str | None = None,
+                   timeout: float | None = None) -> dict:
         used_model = model or OPENROUTER_MODELS[0]
         try:
             headers = {
@@ -34,11 +36,13 @@ class OpenRouterProvider(BaseProvider):
                 "max_tokens": 1024,
             }
 
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.post(self.endpoint, headers=headers, json=body)
-                response.raise_for_status()
-                data = response.json()
-                text = data["choices"][0]["message"]["content"] if "choices" in data and data["choices"] else None
+            response = await get_http_client(self.name).post(
+                self.endpoint, headers=headers, json=body,
+                timeout=timeout or DEFAULT_TIMEOUT,
+            )
+            response.raise_for_status()
+            data = response.json()
+            text = data["choices"][0]["message"]["content"] if "choices" in data and data["choices"] else None
 
             return {
                 "text": text,
@@ -46,6 +50,7 @@ class OpenRouterProvider(BaseProvider):
                 "model": used_model,
                 "status": "success",
                 "error": None,
+                "usage": normalize_usage(data.get("usage")),
             }
         except httpx.TimeoutException:
             return {
@@ -71,6 +71,8 @@ async def delete_suggestion(suggestion_id: int, admin: dict = Depends(check_admi
     from supabase_rest import sb_delete
     try:
         sb_delete("memory_facts", "id", suggestion_id)
+        from services.memory_service import get_context_cache
+        get_context_cache().invalidate_facts(admin["id"])
         return {"status": "success"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -1,5 +1,6 @@
 # ---------- routes/ai_routes.py ----------
 import asyncio
+import re
 import uuid
 import time
 from datetime import datetime, timezone, timedelta
@@ -12,7 +13,7 @@ from typing import Optional, List
 
 from database import get_db
 from auth import get_current_user
-from config import ASSISTANT_NAME, USER_NAME
+from config import ASSISTANT_NAME, USER_NAME, CHAT_DEADLINE, CHAT_DEADLINE_MIN, CHAT_DEADLINE_MAX
 
 router = APIRouter(prefix="/api/v1/ai", tags=["AI"])
 
@@ -23,6 +24,7 @@ class ChatRequest(BaseModel):
     session_id: Optional[str] = None
     provider: Optional[str] = None
     mode: Optional[str] = "general"
+    deadline: Optional[float] = None  # seconds the client will wait; CHAT_DEADLINE if unset, clamped to CHAT_DEADLINE_MIN..MAX
 
 
 class ProviderPriority(BaseModel):
@@ -39,26 +41,72 @@ class ProviderTestRequest(BaseModel):
 
 
 # ── Helper: detect tool triggers ──────────────────────────────────
-TOOL_TRIGGERS = {
-    "weather": "weather",
-    "news": "news",
-    "time": "time",
-    "date": "time",
-    "quote": "quote",
-    "motivat": "quote",
-    "joke": "joke",
-    "funny": "joke",
-    "wiki": "wiki",
-    "who is": "wiki",
-    "what is": "wiki",
-}
+# (tool, pattern, weight). All patterns are compiled into one word-bounded
+# regex, so detection is a single pass however many triggers there are.
+# Negative weights veto look-alikes ("what is my ...", "who are you"); at any
+# position the first listed alternative wins, so order matters.
+TOOL_PATTERNS = [
+    ("weather", r"weather|forecast|temperature|rain(?:ing|y)?|sunny|humidity", 1.0),
+    ("news", r"news|headlines?", 1.0),
+    ("time", r"what time|time is it|current (?:time|date)|today'?s date|"
+             r"what(?:'s| is) the (?:time|date)|what day is (?:it|today)", 1.0),
+    ("quote", r"quotes?|motivat\w*", 1.0),
+    ("joke", r"jokes?|make me laugh|(?:something|anything) funny", 1.0),
+    ("joke", r"funny", 0.5),
+    ("wiki", r"wiki(?:pedia)?", 1.0),
+    # Vetoes sit before the generic question patterns so they win the match
+    ("wiki", r"what(?:'s| is| are) (?:my|your|our|the best|the plan)|who (?:is|was|are) (?:i|you|my)", -1.0),
+    ("wiki", r"who (?:is|was)", 0.7),
+    ("wiki", r"what (?:is|was|are) (?:an? )?", 0.5),
+]
+TOOL_THRESHOLD = 1.0
+SHORT_QUESTION_WORDS = 8   # wiki look-ups are short factual questions
+SHORT_QUESTION_BONUS = 0.5
+
+_TOOL_RE = re.compile(
+    "|".join(rf"(?P<t{i}>\b(?:{pattern})\b)" for i, (_, pattern, _) in enumerate(TOOL_PATTERNS)),
+    re.IGNORECASE,
+)
 
 
 def detect_tool(message: str) -> Optional[str]:
-    lower = message.lower()
-    for trigger, tool_name in TOOL_TRIGGERS.items():
-        if trigger in lower:
-            return tool_name
+    """Best-scoring tool intent for a message, or None below TOOL_THRESHOLD."""
+    scores: dict[str, float] = {}
+    for match in _TOOL_RE.finditer(message):
+        tool, _, weight = TOOL_PATTERNS[int(match.lastgroup[1:])]
+        scores[tool] = scores.get(tool, 0.0) + weight
+    if not scores:
+        return None
+    # The short-question bonus is for bare look-ups; "what is the weather" is a weather question
+    specific = any(t != "wiki" and score > 0 for t, score in scores.items())
+    if "wiki" in scores and not specific and len(message.split()) <= SHORT_QUESTION_WORDS:
+        scores["wiki"] += SHORT_QUESTION_BONUS
+    # Ties go to the specific tool
+    tool, score = max(scores.items(), key=lambda kv: (kv[1], kv[0] != "wiki"))
+    return tool if score >= TOOL_THRESHOLD else None
+
+
+async def run_tool(tool_name: Optional[str], message: str):
+    """Fetch the detected tool's data; None when no tool applies or it fails."""
+    from services.tools_service import ToolsService
+
+    try:
+        if tool_name == "weather":
+            return await ToolsService.get_weather()
+        elif tool_name == "news":
+            return await ToolsService.get_news()
+        elif tool_name == "time":
+            return f"Current date and time: {datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S UTC')}"
+        elif tool_name == "quote":
+            return await ToolsService.get_quote()
+        elif tool_name == "joke":
+            return await ToolsService.get_joke()
+        elif tool_name == "wiki":
+            # Extract search query
+            q = message.lower().replace("who is", "").replace("what is", "").replace("wiki", "").strip()
+            return await ToolsService.get_wiki(q)
+    except Exception:
+        return None
     return None
 
 
@@ -72,40 +120,20 @@ async def chat(
     try:
         from services.llm_router import get_llm_router
         from services.memory_service import MemoryService
-        from services.tools_service import ToolsService
+        from services.prompt_builder import get_prompt_builder
         from models.conversation import Conversation
 
         llm_router = get_llm_router()
         memory_svc = MemoryService()
-        tools_svc = ToolsService()
 
         session_id = body.session_id or str(uuid.uuid4())
         start_time = time.time()
 
-        # Build context from memory
-        context = memory_svc.build_context(user_id, session_id)
-
-        # Check for tool triggers
-        tool_result = None
-        detected_tool = detect_tool(body.message)
-        if detected_tool:
-            try:
-                if detected_tool == "weather":
-                    tool_result = await tools_svc.get_weather()
-                elif detected_tool == "news":
-                    tool_result = await tools_svc.get_news()
-                elif detected_tool == "time":
-                    tool_result = f"Current date and time: {datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S UTC')}"
-                elif detected_tool == "quote":
-                    tool_result = await tools_svc.get_quote()
-                elif detected_tool == "joke":
-                    tool_result = await tools_svc.get_joke()
-                elif detected_tool == "wiki":
-                    # Extract search query
-                    q = body.message.lower().replace("who is", "").replace("what is", "").replace("wiki", "").strip()
-                    tool_result = await tools_svc.get_wiki(q)
-            except Exception:
-                tool_result = None
+        # Memory context (facts + conversation) and any triggered tool, fetched concurrently
+        context, tool_result = await asyncio.gather(
+            memory_svc.build_context_async(user_id, session_id, query=body.message),
+            run_tool(detect_tool(body.message), body.message),
+        )
 
         # Build system prompt
         now_utc = datetime.now(timezone.utc)
@@ -115,48 +143,53 @@ async def chat(
             f"Current India Time (IST): {now_ist.strftime('%A, %B %d, %Y, %H:%M:%S')}.",
             "Be helpful, concise, and proactive. Offer actionable advice.",
         ]
-        if context.get("facts"):
-            system_parts.append(f"User facts: {context['facts']}")
         if tool_result:
             system_parts.append(f"Tool result to incorporate: {tool_result}")
 
         system_prompt = "\n".join(system_parts)
 
-        # Build messages array
-        messages = [{"role": "system", "content": system_prompt}]
-
-        # Add conversation history
-        history = context.get("history", [])
-        for msg in history[-20:]:  # Last 20 messages for context
-            messages.append({"role": msg["role"], "content": msg["content"]})
-
-        messages.append({"role": "user", "content": body.message})
+        # Fit system prompt, history and facts into the token budget
+        messages = get_prompt_builder(llm_router).build(
+            system_prompt=system_prompt,
+            user_message=body.message,
+            history=context.get("history", []),
+            facts=(context.get("facts") or "").splitlines(),
+            model=llm_router.expected_model("chat", body.provider),
+            session_id=session_id,
+            recall=context.get("recall"),
+            user_id=user_id,
+        )
 
-        # Route to LLM
+        # Route to LLM with whatever is left of the client's deadline
+        deadline = body.deadline or CHAT_DEADLINE
+        deadline = min(max(deadline, CHAT_DEADLINE_MIN), CHAT_DEADLINE_MAX)
         result = await llm_router.route(
             messages=messages,
             preferred_provider=body.provider,
+            deadline=max(0.0, deadline - (time.time() - start_time)),
+            user_id=user_id,
+            feature="chat",
         )
+        if result.get("error") == "Deadline exceeded":
+            raise HTTPException(status_code=504, detail="Deadline exceeded")
 
         response_time = time.time() - start_time
 
-        # Save conversations using MemoryService via REST
-        memory_svc.save_message(user_id=user_id, session_id=session_id, role="user", content=body.message)
-        memory_svc.save_message(
+        # Queue both turns as one bulk insert; written in the background
+        memory_svc.save_turn(
             user_id=user_id,
             session_id=session_id,
-            role="assistant",
-            content=result["text"],
+            user_content=body.message,
+            assistant_content=result["text"],
             provider=result.get("provider"),
             model=result.get("model"),
             response_time=response_time,
         )
 
-        # Auto-extract facts in background (don't block response)
+        # Queue for debounced, batched fact extraction (don't block response)
         try:
-            asyncio.create_task(
-                _auto_extract_facts(user_id, body.message, memory_svc)
-            )
+            from services.fact_extraction import get_fact_extraction_queue
+            get_fact_extraction_queue().submit(user_id, body.message)
         except Exception:
             pass  # Don't fail the response
 
@@ -168,6 +201,8 @@ async def chat(
                 "model": result.get("model"),
                 "response_time": round(response_time, 2),
                 "session_id": session_id,
+                "attempts": result.get("attempts"),
+                "cached": result.get("cached", False),
             },
         }
     except HTTPException:
@@ -176,14 +211,6 @@ async def chat(
         raise HTTPException(status_code=500, detail=str(e))
 
 
-async def _auto_extract_facts(user_id, message, memory_svc):
-    """Background task to extract facts from user messages."""
-    try:
-        await memory_svc.auto_extract_facts(user_id, message)
-    except Exception:
-        pass
-
-
 @router.post("/chat/stream")
 async def chat_stream(
     body: ChatRequest,
@@ -193,6 +220,7 @@ async def chat_stream(
     try:
         from services.llm_router import get_llm_router
         from services.memory_service import MemoryService
+        from services.prompt_builder import get_prompt_builder
         from models.conversation import Conversation
 
         llm_router = get_llm_router()
@@ -201,7 +229,7 @@ async def chat_stream(
         session_id = body.session_id or str(uuid.uuid4())
 
         # Build context
-        context = memory_svc.build_context(user_id, session_id)
+        context = await memory_svc.build_context_async(user_id, session_id, query=body.message)
 
         now = datetime.now(timezone.utc)
         system_prompt = (
@@ -209,24 +237,35 @@ async def chat_stream(
             f"Today is {now.strftime('%A, %B %d, %Y')}.\n"
             "Be helpful, concise, and proactive."
         )
-        if context.get("facts"):
-            system_prompt += f"\nUser facts: {context['facts']}"
 
-        messages = [{"role": "system", "content": system_prompt}]
-        history = context.get("history", [])
-        for msg in history[-20:]:
-            messages.append({"role": msg["role"], "content": msg["content"]})
-        messages.append({"role": "user", "content": body.message})
+        messages = get_prompt_builder(llm_router).build(
+            system_prompt=system_prompt,
+            user_message=body.message,
+            history=context.get("history", []),
+            facts=(context.get("facts") or "").splitlines(),
+            model=llm_router.expected_model("chat", body.provider),
+            session_id=session_id,
+            recall=context.get("recall"),
+            user_id=user_id,
+        )
 
         async def event_generator():
             full_response = ""
             try:
-                async for chunk in llm_router.stream(messages=messages, provider=body.provider):
+                async for chunk in llm_router.stream(
+                    messages=messages, preferred_provider=body.provider,
+                    user_id=user_id, feature="chat_stream",
+                ):
                     full_response += chunk
                     yield f"data: {chunk}\n\n"
             except Exception:
+                if full_response:
+                    raise  # stream broke mid-reply; resending from scratch would duplicate text
                 # Fallback: fake streaming by sending word-by-word
-                result = await llm_router.route(messages=messages, preferred_provider=body.provider)
+                result = await llm_router.route(
+                    messages=messages, preferred_provider=body.provider,
+                    user_id=user_id, feature="chat_stream",
+                )
                 words = result["text"].split(" ")
                 for word in words:
                     full_response += word + " "
@@ -237,8 +276,12 @@ async def chat_stream(
 
             # Save conversation
             try:
-                memory_svc.save_message(user_id=user_id, session_id=session_id, role="user", content=body.message)
-                memory_svc.save_message(user_id=user_id, session_id=session_id, role="assistant", content=full_response.strip())
+                memory_svc.save_turn(
+                    user_id=user_id, session_id=session_id,
+                    user_content=body.message, assistant_content=full_response.strip(),
+                )
+                from services.fact_extraction import get_fact_extraction_queue
+                get_fact_extraction_queue().submit(user_id, body.message)
             except Exception:
                 pass
 
@@ -247,6 +290,25 @@ async def chat_stream(
         return {"status": "error", "message": str(e)}
 
 
+@router.get("/briefing/{kind}")
+async def briefing(kind: str, user_id: int = Depends(get_current_user)):
+    """Today's morning briefing or evening review. Normally pre-computed by the
+    briefing scheduler; generated on demand if it hasn't run yet."""
+    try:
+        from services.briefing_scheduler import get_briefing_scheduler, KIND_HOURS
+        if kind not in KIND_HOURS:
+            return {"status": "error", "message": "kind must be morning or evening"}
+        entry = await get_briefing_scheduler().get(user_id, kind)
+        if entry is None:
+            return {"status": "error", "message": "Briefing unavailable, try again shortly"}
+        return {
+            "status": "success",
+            "data": {**entry["data"], "generated_at": datetime.fromtimestamp(entry["generated_at"], timezone.utc).isoformat()},
+        }
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+
+
 @router.get("/providers")
 async def list_providers(user_id: int = Depends(get_current_user)):
     """List all LLM providers and their status."""
@@ -271,6 +333,37 @@ async def provider_stats(user_id: int = Depends(get_current_user)):
         return {"status": "error", "message": str(e)}
 
 
+@router.get("/providers/tokens")
+async def token_usage(by: str = "feature", limit: int = 20, user_id: int = Depends(get_current_user)):
+    """Token usage since process start, grouped by provider, key or feature.
+    by=user only reports the caller's own usage."""
+    try:
+        from services.llm_router import get_llm_router
+        if by not in ("user", "provider", "key", "feature"):
+            return {"status": "error", "message": "by must be one of user, provider, key, feature"}
+        llm_router = get_llm_router()
+        usage = llm_router.get_token_usage(by=by, limit=None if by == "user" else limit)
+        if by == "user":
+            usage = [row for row in usage if row["user"] == str(user_id)]
+        return {
+            "status": "success",
+            "data": {
+                "by": by,
+                "usage": usage,
+                "keys": {
+                    provider: {
+                        "total_tokens_today": s["total_tokens_today"],
+                        "token_quota_per_key": s["token_quota_per_key"],
+                    }
+                    for provider, s in llm_router.key_manager.get_key_stats().items()
+                    if s["total_keys"]
+                },
+            },
+        }
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+
+
 @router.post("/provider/test")
 async def test_provider(
     body: ProviderTestRequest,
@@ -284,6 +377,7 @@ async def test_provider(
         result = await llm_router.route(
             messages=[{"role": "user", "content": "Hello, respond with one word."}],
             preferred_provider=body.provider,
+            feature="provider_test",
         )
         elapsed = time.time() - start
         return {
@@ -11,32 +11,8 @@ router = APIRouter(prefix="/api/v1/analytics", tags=["Analytics"])
 @router.get("/life-score")
 async def get_life_score(user_id: int = Depends(get_current_user)):
     try:
-        # Fetch stats from various tables to calculate a composite score
-        tasks = sb_select("tasks", filters={"user_id": user_id})
-        habits = sb_select("habits", filters={"user_id": user_id})
-        habit_logs = sb_select("habit_logs", filters={"user_id": user_id})
-        health_logs = sb_select("health_logs", filters={"user_id": user_id})
-        goals = sb_select("goals", filters={"user_id": user_id})
-        
-        # Simple weighted scoring logic
-        task_score = min(20, len([t for t in tasks if t.get("status") == "done"]) * 2) if tasks else 10
-        habit_score = min(20, len(habit_logs) * 2) if habit_logs else 10
-        health_score = 15 # Stub
-        goal_score = min(20, len([g for g in goals if g.get("status") == "completed"]) * 5) if goals else 10
-        coding_score = 15 # Stub
-        
-        total = task_score + habit_score + health_score + goal_score + coding_score
-        
-        return {
-            "total": total,
-            "breakdown": {
-                "tasks": task_score,
-                "habits": habit_score,
-                "health": health_score,
-                "goals": goal_score,
-                "coding": coding_score
-            }
-        }
+        from services.analytics_service import AnalyticsService
+        return AnalyticsService.calculate_life_score_rest(user_id)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
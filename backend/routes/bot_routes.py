@@ -70,10 +70,13 @@ def jexi_ai_chat(message: str, session_id: str, token: str):
         with httpx.Client(timeout=45) as client:
             resp = client.post(f"{JEXI_BASE_URL}/ai/chat", json={
                 "message": message,
-                "session_id": session_id
+                "session_id": session_id,
+                "deadline": 40
             }, headers=headers)
             if resp.status_code == 401:
                 return None, "expired"
+            if resp.status_code == 504:
+                return "⏱️ The AI is thinking too hard! Try again in a moment.", None
             resp.raise_for_status()
             data = resp.json()
             if data.get("status") == "success":
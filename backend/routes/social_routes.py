@@ -1,11 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException, Body, UploadFile, File
+import asyncio
 import uuid
 import os
 
 from auth import get_current_user
 from supabase_rest import sb_select, sb_insert
 from services.key_manager import KeyManager
-from services.llm_router import key_manager 
+from services.llm_router import key_manager, get_llm_router
 
 router = APIRouter(prefix="/api/v1/social", tags=["social"])
 
@@ -79,8 +80,8 @@ async def add_shared_key(
     if not provider or not key:
         raise HTTPException(status_code=400, detail="Provider and Key are required")
     
-    # Encrypt the key
-    encrypted_key = key_manager.encrypt_key(key)
+    # Encrypt the key (first use derives the PBKDF2 key, so keep it off the event loop)
+    encrypted_key = await asyncio.to_thread(key_manager.encrypt_key, key)
     
     # Store in DB
     new_entry = sb_insert("shared_keys", {
@@ -89,12 +90,12 @@ async def add_shared_key(
         "added_by_id": current_user_id
     })
     
-    # Immediately add to the live key_manager pool
-    # Mocking for immediate effect
-    new_entry["id"] = new_entry.get("id", 1)
-    # The normal add_db_keys expects SQLAlchemy objects but this is a dict. Let's just return success for now
+    # Immediately add to the live rotation pool (and enable the provider if it was keyless)
+    if not new_entry:
+        new_entry = {"provider": provider.lower(), "encrypted_key": encrypted_key, "is_active": True}
+    await asyncio.to_thread(get_llm_router().refresh_keys, shared_rows=[new_entry])
     
-    return {"message": "Key added successfully to rotation pool", "id": new_entry["id"]}
+    return {"message": "Key added successfully to rotation pool", "id": new_entry.get("id")}
 
 @router.get("/leaderboard")
 async def get_leaderboard():
@@ -173,6 +174,8 @@ async def create_suggestion(
             "value": f"[From User {current_user_id}]: {suggestion.strip()}",
             "auto_extracted": False
         })
+        from services.memory_service import get_context_cache
+        get_context_cache().invalidate_facts(admin_id)
         return {"status": "success", "message": "Suggestion submitted successfully!"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to submit suggestion: {str(e)}")
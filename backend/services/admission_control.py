@@ -0,0 +1,125 @@
+"""
+admission_control.py — Per-Provider Concurrency Limits
+Caps in-flight requests per LLM provider and queues the overflow by priority,
+so interactive chat is admitted before background extraction. Requests whose
+deadline cannot be met by the estimated queue wait are shed immediately.
+"""
+
+import asyncio
+import heapq
+import itertools
+import time
+
+
+# Lower number = admitted first
+PRIORITIES = {
+    "interactive": 0,
+    "normal": 1,
+    "background": 2,
+}
+
+
+class ProviderGate:
+    """Concurrency limiter for one provider with a priority wait queue."""
+
+    def __init__(self, name: str, limit: int):
+        self.name = name
+        self.limit = max(1, limit)
+        self.active = 0
+        self._waiters: list = []  # heap of (priority, seq, future)
+        self._seq = itertools.count()
+
+        # Metrics
+        self._waits: dict[str, dict] = {}
+        self.shed = 0
+
+    # ------------------------------------------------------------------
+    def queue_depth(self, priority: int | None = None) -> int:
+        """Live waiters, optionally only those admitted at or before `priority`."""
+        return sum(
+            1 for p, _, fut in self._waiters
+            if not fut.done() and (priority is None or p <= priority)
+        )
+
+    def estimated_wait(self, priority: int, avg_service_time: float) -> float:
+        """Rough seconds until a new request at `priority` would be admitted."""
+        ahead = self.queue_depth(priority)
+        if self.active < self.limit and ahead == 0:
+            return 0.0
+        return (ahead + 1) / self.limit * max(avg_service_time, 0.1)
+
+    # ------------------------------------------------------------------
+    async def acquire(self, priority: str = "normal", deadline: float | None = None,
+                      avg_service_time: float = 2.0) -> bool:
+        """Wait for a slot. `deadline` is a time.monotonic() instant; returns
+        False (shed) if the slot can't be had before it."""
+        level = PRIORITIES.get(priority, PRIORITIES["normal"])
+        t0 = time.monotonic()
+
+        if self.active < self.limit and self.queue_depth() == 0:
+            self.active += 1
+            self._record_wait(priority, 0.0)
+            return True
+
+        if deadline is not None and t0 + self.estimated_wait(level, avg_service_time) > deadline:
+            self.shed += 1
+            return False
+
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (level, next(self._seq), fut))
+        try:
+            timeout = None if deadline is None else max(0.0, deadline - t0)
+            await asyncio.wait_for(fut, timeout)
+        except asyncio.TimeoutError:
+            if fut.done() and not fut.cancelled():
+                self.release()  # slot was handed over as we timed out; pass it on
+            self.shed += 1
+            return False
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                self.release()  # slot was handed over before the cancellation landed
+            raise
+        finally:
+            self._prune()
+
+        # The releasing request handed its slot straight to us (active unchanged)
+        self._record_wait(priority, time.monotonic() - t0)
+        return True
+
+    def release(self):
+        """Hand the slot to the best waiter, or free it."""
+        while self._waiters:
+            _, _, fut = heapq.heappop(self._waiters)
+            if not fut.done():
+                fut.set_result(True)
+                return
+        self.active = max(0, self.active - 1)
+
+    def _prune(self):
+        """Drop cancelled/timed-out waiters from the heap."""
+        if any(fut.done() for _, _, fut in self._waiters):
+            self._waiters = [w for w in self._waiters if not w[2].done()]
+            heapq.heapify(self._waiters)
+
+    # ------------------------------------------------------------------
+    def _record_wait(self, priority: str, waited: float):
+        m = self._waits.setdefault(priority, {"admitted": 0, "total_wait": 0.0, "max_wait": 0.0})
+        m["admitted"] += 1
+        m["total_wait"] += waited
+        m["max_wait"] = max(m["max_wait"], waited)
+
+    def get_stats(self) -> dict:
+        return {
+            "limit": self.limit,
+            "active": self.active,
+            "queued": self.queue_depth(),
+            "shed": self.shed,
+            "queue_wait": {
+                priority: {
+                    "admitted": m["admitted"],
+                    "avg_wait": round(m["total_wait"] / m["admitted"], 4) if m["admitted"] else 0.0,
+                    "max_wait": round(m["max_wait"], 4),
+                }
+                for priority, m in self._waits.items()
+            },
+        }
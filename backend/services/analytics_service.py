@@ -19,6 +19,7 @@ from models.project import Project
 from models.journal import JournalEntry
 
 from services.health_service import HealthService
+from supabase_rest import sb_select
 
 
 class AnalyticsService:
@@ -82,6 +83,34 @@ class AnalyticsService:
             db.rollback()
             return {"total": 0, "breakdown": {}}
 
+    @staticmethod
+    def calculate_life_score_rest(user_id: int) -> dict:
+        """Life score from the Supabase tables (used by the API and the briefing
+        scheduler, which have no SQLAlchemy session). Raises on REST errors."""
+        tasks = sb_select("tasks", filters={"user_id": user_id})
+        habit_logs = sb_select("habit_logs", filters={"user_id": user_id})
+        goals = sb_select("goals", filters={"user_id": user_id})
+
+        # Simple weighted scoring logic
+        task_score = min(20, len([t for t in tasks if t.get("status") == "done"]) * 2) if tasks else 10
+        habit_score = min(20, len(habit_logs) * 2) if habit_logs else 10
+        health_score = 15 # Stub
+        goal_score = min(20, len([g for g in goals if g.get("status") == "completed"]) * 5) if goals else 10
+        coding_score = 15 # Stub
+
+        total = task_score + habit_score + health_score + goal_score + coding_score
+
+        return {
+            "total": total,
+            "breakdown": {
+                "tasks": task_score,
+                "habits": habit_score,
+                "health": health_score,
+                "goals": goal_score,
+                "coding": coding_score
+            }
+        }
+
     @staticmethod
     def get_dashboard(db: Session, user_id: int) -> dict:
         """Central dashboard bundle: aggregates lightweight counts."""
@@ -0,0 +1,164 @@
+"""
+briefing_prefetcher.py — Background Briefing Inputs
+Refreshes weather for each configured city, headlines for each news topic and
+a pool of quotes on a fixed cadence, so briefings and chat tools read a
+pre-warmed snapshot instead of waiting on third-party APIs (and RSS parsing)
+at request time. The snapshot lives in memory and is mirrored to disk, so a
+restart serves the last good data immediately.
+"""
+
+import asyncio
+import json
+import os
+import time
+
+from config import (
+    BRIEFING_PREFETCH_INTERVAL, BRIEFING_CITIES, BRIEFING_NEWS_TOPICS,
+    BRIEFING_SNAPSHOT_PATH, BRIEFING_SNAPSHOT_MAX_AGE,
+)
+
+NEWS_PER_TOPIC = 10  # get_news() slices what it needs
+QUOTE_POOL_SIZE = 10
+
+
+class BriefingPrefetcher:
+    """Refresh loop plus the snapshot it maintains."""
+
+    def __init__(self, cities: list[str] = BRIEFING_CITIES, topics: list[str] = BRIEFING_NEWS_TOPICS,
+                 interval: float = BRIEFING_PREFETCH_INTERVAL, snapshot_path: str = BRIEFING_SNAPSHOT_PATH,
+                 max_age: float = BRIEFING_SNAPSHOT_MAX_AGE):
+        self.cities = cities
+        self.topics = topics
+        self.interval = interval
+        self.snapshot_path = snapshot_path
+        self.max_age = max_age
+        # kind → name → {"data", "at"}; "at" is wall-clock time so it survives restarts
+        self.snapshot: dict[str, dict[str, dict]] = {"weather": {}, "news": {}, "quotes": {}}
+        self._task: asyncio.Task | None = None
+
+        # Metrics
+        self.passes = 0
+        self.failures = 0
+
+    # ------------------------------------------------------------------
+    def start(self):
+        """Restore the disk snapshot and start the loop (no-op if already running)."""
+        if self._task is None or self._task.done():
+            self.restore()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.refresh_all()
+            except Exception as e:
+                print(f"Warning: briefing prefetch pass failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    # ------------------------------------------------------------------
+    async def refresh_all(self) -> int:
+        """Refresh every city, topic and the quote pool concurrently.
+        Fetches skip the tool cache, so an entry's "at" is when its data was
+        actually fetched. Failed fetches keep the previous data. Returns how
+        many items updated."""
+        from services.tools_service import ToolsService
+
+        jobs = [("weather", city, ToolsService.load_weather(city, fresh=True)) for city in self.cities]
+        jobs += [("news", topic, ToolsService.load_news(topic, NEWS_PER_TOPIC, fresh=True)) for topic in self.topics]
+        jobs.append(("quotes", "random", ToolsService.load_quotes(QUOTE_POOL_SIZE, fresh=True)))
+
+        results = await asyncio.gather(*(coro for _, _, coro in jobs), return_exceptions=True)
+        now = time.time()
+        updated = 0
+        for (kind, name, _), data in zip(jobs, results):
+            if isinstance(data, Exception) or not data:
+                self.failures += 1
+                continue
+            self.snapshot[kind][self._norm(name)] = {"data": data, "at": now}
+            updated += 1
+        self.passes += 1
+        if updated:
+            await asyncio.to_thread(self.save)
+        return updated
+
+    @staticmethod
+    def _norm(name: str) -> str:
+        return name.strip().lower()
+
+    def lookup(self, kind: str, name: str):
+        """Latest data for (kind, name), or None if missing or older than max_age."""
+        entry = self.snapshot.get(kind, {}).get(self._norm(name))
+        if entry is None or time.time() - entry["at"] > self.max_age:
+            return None
+        return entry["data"]
+
+    # ------------------------------------------------------------------
+    def save(self):
+        try:
+            tmp_path = f"{self.snapshot_path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"saved_at": time.time(), "snapshot": self.snapshot}, f)
+            os.replace(tmp_path, self.snapshot_path)
+        except Exception as e:
+            print(f"Warning: Could not save briefing snapshot: {e}")
+
+    def restore(self) -> int:
+        """Load still-fresh entries from the last snapshot file. Returns how many."""
+        try:
+            if not os.path.exists(self.snapshot_path):
+                return 0
+            with open(self.snapshot_path, "r", encoding="utf-8") as f:
+                saved = json.load(f).get("snapshot", {})
+            now = time.time()
+            restored = 0
+            for kind, entries in saved.items():
+                if kind not in self.snapshot:
+                    continue
+                for name, entry in entries.items():
+                    if now - float(entry.get("at", 0)) <= self.max_age and name not in self.snapshot[kind]:
+                        self.snapshot[kind][name] = entry
+                        restored += 1
+            return restored
+        except Exception as e:
+            print(f"Warning: Could not restore briefing snapshot: {e}")
+            return 0
+
+    # ------------------------------------------------------------------
+    def get_stats(self) -> dict:
+        now = time.time()
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "interval": self.interval,
+            "passes": self.passes,
+            "failures": self.failures,
+            "age_seconds": {
+                kind: {name: round(now - e["at"], 1) for name, e in entries.items()}
+                for kind, entries in self.snapshot.items()
+            },
+        }
+
+
+_prefetcher_instance = None
+
+
+def get_briefing_prefetcher() -> BriefingPrefetcher:
+    global _prefetcher_instance
+    if _prefetcher_instance is None:
+        _prefetcher_instance = BriefingPrefetcher()
+    return _prefetcher_instance
+
+
+def prefetched(kind: str, name: str):
+    """Snapshot lookup that never creates the prefetcher: None unless it was started."""
+    if _prefetcher_instance is None:
+        return None
+    return _prefetcher_instance.lookup(kind, name)
@@ -0,0 +1,292 @@
+"""
+briefing_scheduler.py — Pre-computed Briefings
+Generates each active user's morning briefing and evening review shortly
+before their local morning/evening and keeps the result, so the briefing
+endpoints are a single in-memory read. Users are spread across a lead window
+by a stable per-user offset and generation runs at background priority with
+bounded concurrency, keeping the load off peak chat time. Results are mirrored
+to disk and survive restarts until the user's local day ends.
+"""
+
+import asyncio
+import json
+import os
+import time
+import zlib
+from datetime import datetime, timedelta, timezone, tzinfo
+from zoneinfo import ZoneInfo
+
+from config import (
+    BRIEFING_SCHEDULE_TICK, BRIEFING_MORNING_HOUR, BRIEFING_EVENING_HOUR, BRIEFING_LEAD_MINUTES,
+    BRIEFING_CONCURRENCY, BRIEFING_ACTIVE_DAYS, BRIEFING_DEFAULT_TIMEZONE, BRIEFING_STORE_PATH,
+)
+from supabase_rest import sb_select
+
+KIND_HOURS = {"morning": BRIEFING_MORNING_HOUR, "evening": BRIEFING_EVENING_HOUR}
+CATCH_UP_HOURS = 3  # still generate this long after the target time (late start, restarts)
+ACTIVE_USERS_TTL = 3600  # seconds the active-user list is reused between scans
+_USER_LOOKUP_CHUNK = 200  # ids per users lookup, keeps the URL short
+_ACTIVE_SCAN_PAGE = 1000  # message rows per active-user page (PostgREST's default row cap)
+
+
+def _zone(name: str | None) -> tzinfo:
+    try:
+        return ZoneInfo(name or BRIEFING_DEFAULT_TIMEZONE)
+    except Exception:
+        return timezone.utc
+
+
+def _user_zone(settings) -> tzinfo:
+    """tzinfo from the user's settings JSON ("timezone": IANA name)."""
+    try:
+        prefs = json.loads(settings) if isinstance(settings, str) else (settings or {})
+        return _zone(prefs.get("timezone"))
+    except Exception:
+        return _zone(None)
+
+
+class BriefingScheduler:
+    """Due-user scan loop plus the store of generated briefings."""
+
+    def __init__(self, llm_router=None, tick: float = BRIEFING_SCHEDULE_TICK,
+                 lead_minutes: int = BRIEFING_LEAD_MINUTES, concurrency: int = BRIEFING_CONCURRENCY,
+                 store_path: str = BRIEFING_STORE_PATH):
+        self.llm_router = llm_router
+        self.tick = tick
+        self.lead_minutes = lead_minutes
+        self.store_path = store_path
+        self._semaphore = asyncio.Semaphore(concurrency)
+        # "user_id:kind" → {"data", "generated_at", "valid_until" (epoch seconds), "tz" (IANA name)}
+        self._store: dict[str, dict] = {}
+        self._pending: dict[str, asyncio.Task] = {}  # one generation per key at a time
+        self._task: asyncio.Task | None = None
+        self._active: tuple[float, list[dict]] | None = None  # (monotonic time, users)
+
+        # Metrics
+        self.generated = 0
+        self.failures = 0
+        self.reads = 0
+        self.read_hits = 0
+
+    # ------------------------------------------------------------------
+    def start(self):
+        """Start the scan loop on the running event loop (no-op if already running)."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._task = None
+        if self._pending:
+            await asyncio.gather(*self._pending.values(), return_exceptions=True)
+
+    async def _run(self):
+        while True:
+            try:
+                await self.run_due()
+            except Exception as e:
+                print(f"Warning: briefing scan failed: {e}")
+            await asyncio.sleep(self.tick)
+
+    # ------------------------------------------------------------------
+    # Scheduling
+    # ------------------------------------------------------------------
+    @staticmethod
+    def _active_user_ids() -> list[int]:
+        """Distinct users with a message within BRIEFING_ACTIVE_DAYS. Reads
+        message rows in user_id order a page at a time, each page starting
+        after the last user seen, so a heavy user costs at most one page and
+        no row cap can drop anyone."""
+        cutoff = (datetime.now(timezone.utc) - timedelta(days=BRIEFING_ACTIVE_DAYS)).strftime("%Y-%m-%dT%H:%M:%SZ")
+        ids: list[int] = []
+        while True:
+            after = f"&user_id=gt.{ids[-1]}" if ids else ""
+            rows = sb_select("conversations", columns="user_id",
+                             query_string=f"created_at=gte.{cutoff}&role=eq.user{after}"
+                                          f"&order=user_id.asc&limit={_ACTIVE_SCAN_PAGE}")
+            for row in rows:
+                if row.get("user_id") is not None and (not ids or row["user_id"] != ids[-1]):
+                    ids.append(row["user_id"])
+            if len(rows) < _ACTIVE_SCAN_PAGE:
+                return ids
+
+    def _active_users(self) -> list[dict]:
+        """Active users with their tzinfo, re-scanned at most every ACTIVE_USERS_TTL."""
+        if self._active is not None and time.monotonic() - self._active[0] < ACTIVE_USERS_TTL:
+            return self._active[1]
+        ids = self._active_user_ids()
+        users = []
+        for i in range(0, len(ids), _USER_LOOKUP_CHUNK):
+            chunk = ",".join(map(str, ids[i:i + _USER_LOOKUP_CHUNK]))
+            rows = sb_select("users", columns="id,settings", query_string=f"id=in.({chunk})")
+            users.extend({"id": u["id"], "tz": _user_zone(u.get("settings"))} for u in rows)
+        self._active = (time.monotonic(), users)
+        return users
+
+    def _slot_offset(self, user_id: int, kind: str) -> timedelta:
+        """Stable per-user offset into the lead window, so users don't all generate at once."""
+        minutes = zlib.crc32(f"{user_id}:{kind}".encode()) % max(1, self.lead_minutes)
+        return timedelta(minutes=minutes)
+
+    @staticmethod
+    def _target(kind: str, local: datetime, days_back: int = 0) -> datetime:
+        """The local time `kind` is for, today or `days_back` days earlier."""
+        return local.replace(hour=KIND_HOURS[kind], minute=0, second=0, microsecond=0) - timedelta(days=days_back)
+
+    def _slot_start(self, user_id: int, kind: str, tz, now: datetime | None = None,
+                    days_back: int = 0) -> datetime:
+        """When the scheduled generation of `kind` for the user begins (local
+        time), today's or that of `days_back` days earlier."""
+        local = (now or datetime.now(timezone.utc)).astimezone(tz)
+        target = self._target(kind, local, days_back)
+        return target - timedelta(minutes=self.lead_minutes) + self._slot_offset(user_id, kind)
+
+    def is_due(self, user_id: int, kind: str, tz, now: datetime | None = None) -> bool:
+        """In today's window (or yesterday's, whose catch-up can run past
+        midnight) with nothing generated since the window opened."""
+        local = (now or datetime.now(timezone.utc)).astimezone(tz)
+        for days_back in (0, 1):
+            start = self._slot_start(user_id, kind, tz, local, days_back)
+            if start <= local < self._target(kind, local, days_back) + timedelta(hours=CATCH_UP_HOURS):
+                # Not _entry(): yesterday's briefing has expired at midnight but still covers its window
+                entry = self._store.get(f"{user_id}:{kind}")
+                return entry is None or entry["generated_at"] < start.timestamp()
+        return False
+
+    async def run_due(self, now: datetime | None = None) -> int:
+        """Generate every briefing that is due now. Returns how many were generated."""
+        users = await asyncio.to_thread(self._active_users)
+        jobs = [
+            self._generate(u["id"], kind, u["tz"], priority="background")
+            for u in users for kind in KIND_HOURS
+            if self.is_due(u["id"], kind, u["tz"], now)
+        ]
+        if not jobs:
+            return 0
+        results = await asyncio.gather(*jobs, return_exceptions=True)
+        await asyncio.to_thread(self.save)
+        return sum(1 for r in results if isinstance(r, dict))
+
+    # ------------------------------------------------------------------
+    # Generation / reads
+    # ------------------------------------------------------------------
+    def _entry(self, user_id: int, kind: str, tz=None, now: datetime | None = None) -> dict | None:
+        """The stored briefing, unless it expired or was generated on demand
+        before today's slot opened (a 09:00 "evening review" must not stand in
+        for the one due at night)."""
+        entry = self._store.get(f"{user_id}:{kind}")
+        now = now or datetime.now(timezone.utc)
+        if entry is None or now.timestamp() >= entry["valid_until"]:
+            return None
+        slot_start = self._slot_start(user_id, kind, tz or _zone(entry.get("tz")), now).timestamp()
+        if entry["generated_at"] < slot_start <= now.timestamp():
+            return None
+        return entry
+
+    def _generate(self, user_id: int, kind: str, tz, priority: str | None = None) -> asyncio.Task:
+        key = f"{user_id}:{kind}"
+        task = self._pending.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._produce(user_id, kind, tz, priority))
+            self._pending[key] = task
+            task.add_done_callback(lambda _t: self._pending.pop(key, None))
+        return task
+
+    async def _produce(self, user_id: int, kind: str, tz, priority: str | None) -> dict | None:
+        from services.planner_service import PlannerService
+
+        if self.llm_router is None:
+            from services.llm_router import get_llm_router
+            self.llm_router = get_llm_router()
+        build = PlannerService.morning_briefing if kind == "morning" else PlannerService.evening_review
+        async with self._semaphore:
+            data = await build(None, user_id, self.llm_router, priority=priority)
+
+        # On a failed route the planner falls back to a canned line; don't keep that all day
+        message = data.get("motivational_message") if kind == "morning" else data.get("ai_summary")
+        if data.get("status") != "success" or not message:
+            self.failures += 1
+            return None
+        now = time.time()
+        local = datetime.fromtimestamp(now, tz)
+        end_of_day = (local + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+        entry = {"data": data, "generated_at": now, "valid_until": end_of_day.timestamp(),
+                 "tz": getattr(tz, "key", "UTC")}
+        self._store[f"{user_id}:{kind}"] = entry
+        self.generated += 1
+        return entry
+
+    async def get(self, user_id: int, kind: str) -> dict | None:
+        """Stored briefing for today, generating it on demand if the scheduler
+        hasn't yet. Returns {"data", "generated_at", "valid_until", "tz"} or None."""
+        self.reads += 1
+        entry = self._entry(user_id, kind)
+        if entry is not None:
+            self.read_hits += 1
+            return entry
+        try:
+            rows = await asyncio.to_thread(sb_select, "users", {"id": user_id}, "settings")
+            tz = _user_zone(rows[0].get("settings") if rows else None)
+        except Exception:
+            tz = _zone(None)
+        entry = await asyncio.shield(self._generate(user_id, kind, tz))
+        if entry is not None:
+            await asyncio.to_thread(self.save)
+        return entry
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+    def save(self):
+        try:
+            now = time.time()
+            tmp_path = f"{self.store_path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({k: e for k, e in self._store.items() if e["valid_until"] > now}, f)
+            os.replace(tmp_path, self.store_path)
+        except Exception as e:
+            print(f"Warning: Could not save briefings: {e}")
+
+    def restore(self) -> int:
+        """Load briefings that are still valid from the store file. Returns how many."""
+        try:
+            if not os.path.exists(self.store_path):
+                return 0
+            with open(self.store_path, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+            now = time.time()
+            fresh = {k: e for k, e in saved.items() if float(e.get("valid_until", 0)) > now}
+            for key, entry in fresh.items():
+                self._store.setdefault(key, entry)
+            return len(fresh)
+        except Exception as e:
+            print(f"Warning: Could not restore briefings: {e}")
+            return 0
+
+    # ------------------------------------------------------------------
+    def get_stats(self) -> dict:
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "stored": len(self._store),
+            "generating": len(self._pending),
+            "generated": self.generated,
+            "failures": self.failures,
+            "reads": self.reads,
+            "read_hit_rate": round(self.read_hits / self.reads, 4) if self.reads else 0.0,
+        }
+
+
+_scheduler_instance = None
+
+
+def get_briefing_scheduler(llm_router=None) -> BriefingScheduler:
+    global _scheduler_instance
+    if _scheduler_instance is None:
+        _scheduler_instance = BriefingScheduler(llm_router=llm_router)
+        _scheduler_instance.restore()
+    return _scheduler_instance
@@ -2,11 +2,16 @@
 cache_service.py — LLM Response Caching
 In-memory cache keyed by SHA-256 of (system_prompt + user_message + model).
 Supports TTL-based expiry and hit-rate statistics.
+Also AsyncTTLCache, a bounded LRU cache for async fetchers (third-party tool
+APIs) with stale-while-revalidate, negative caching and refresh de-duplication.
 """
 
+import asyncio
 import hashlib
 import sys
 import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable
 
 
 class ResponseCache:
@@ -93,3 +98,134 @@ class ResponseCache:
             "hit_rate": round(self._hits / total_lookups, 4) if total_lookups else 0.0,
             "estimated_memory_bytes": sys.getsizeof(self._cache),
         }
+
+
+class AsyncTTLCache:
+    """Bounded LRU cache in front of an async fetcher that returns None on failure.
+
+    - Fresh entries (younger than their ttl) are returned directly.
+    - Stale entries (up to `stale_ttl` past their ttl; per call, defaulting to
+      the cache's) are returned immediately while one background task
+      refreshes them.
+    - Failures are remembered for `negative_ttl`, so a dead endpoint is not
+      retried (and waited on) by every caller. A failed refresh keeps serving
+      the stale value.
+    - Concurrent misses/refreshes for one key share a single fetch.
+    """
+
+    def __init__(self, max_entries: int = 256, stale_ttl: float = 0, negative_ttl: float = 60):
+        self.max_entries = max_entries
+        self.stale_ttl = stale_ttl
+        self.negative_ttl = negative_ttl
+        # key → {value, stamp, ttl, stale_ttl, retry_at}; value None marks a cached failure
+        self._entries: OrderedDict[str, dict] = OrderedDict()
+        self._inflight: dict[str, asyncio.Future] = {}
+        self._refreshing: set[asyncio.Task] = set()  # strong refs to background refreshes
+
+        # Metrics
+        self.hits = 0
+        self.stale_hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+
+    # ------------------------------------------------------------------
+    async def get(self, key: str, fetch: Callable[[], Awaitable[Any]], ttl: float,
+                  stale_ttl: float | None = None) -> Any:
+        """Cached value for `key`, calling `fetch()` when missing or expired."""
+        stale_ttl = self.stale_ttl if stale_ttl is None else stale_ttl
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            age = now - entry["stamp"]
+            if entry["value"] is None:
+                if now < entry["retry_at"]:
+                    self.negative_hits += 1
+                    return None
+            elif age < entry["ttl"]:
+                self.hits += 1
+                return entry["value"]
+            elif age < entry["ttl"] + stale_ttl:
+                self.stale_hits += 1
+                if now >= entry["retry_at"]:
+                    self._refresh_in_background(key, fetch, ttl, stale_ttl)
+                return entry["value"]
+
+        self.misses += 1
+        return await asyncio.shield(self._refresh(key, fetch, ttl, stale_ttl))
+
+    def _refresh(self, key: str, fetch: Callable[[], Awaitable[Any]], ttl: float,
+                 stale_ttl: float) -> asyncio.Future:
+        """The in-flight fetch for `key`, starting one if needed."""
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._fetch_and_store(key, fetch, ttl, stale_ttl))
+            self._inflight[key] = future
+            future.add_done_callback(lambda _f: self._inflight.pop(key, None))
+        return future
+
+    def _refresh_in_background(self, key: str, fetch: Callable[[], Awaitable[Any]], ttl: float,
+                               stale_ttl: float):
+        if key in self._inflight:
+            return
+        task = self._refresh(key, fetch, ttl, stale_ttl)
+        self._refreshing.add(task)
+        task.add_done_callback(self._refreshing.discard)
+
+    async def _fetch_and_store(self, key: str, fetch: Callable[[], Awaitable[Any]], ttl: float,
+                               stale_ttl: float) -> Any:
+        try:
+            value = await fetch()
+        except Exception as e:
+            print(f"Warning: cached fetch for {key} failed: {e}")
+            value = None
+
+        now = time.monotonic()
+        previous = self._entries.get(key)
+        if value is None:
+            if previous is not None and previous["value"] is not None \
+                    and now - previous["stamp"] < previous["ttl"] + previous["stale_ttl"]:
+                # Keep serving the stale value; back off before the next refresh
+                previous["retry_at"] = now + self.negative_ttl
+                return previous["value"]
+            if self.negative_ttl <= 0:
+                self._entries.pop(key, None)
+                return None
+        retry_at = now + self.negative_ttl if value is None else now
+        self._entries[key] = {"value": value, "stamp": now, "ttl": ttl, "stale_ttl": stale_ttl, "retry_at": retry_at}
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return value
+
+    async def refresh(self, key: str, fetch: Callable[[], Awaitable[Any]], ttl: float,
+                      stale_ttl: float | None = None) -> Any:
+        """Fetch `key` now, whatever is cached, and store the result. Returns the
+        fresh value, or None if the fetch failed (a stale value stays cached for
+        get() callers, but is not returned here)."""
+        stale_ttl = self.stale_ttl if stale_ttl is None else stale_ttl
+        started = time.monotonic()
+        value = await asyncio.shield(self._refresh(key, fetch, ttl, stale_ttl))
+        entry = self._entries.get(key)
+        return value if entry is not None and entry["stamp"] >= started else None
+
+    # ------------------------------------------------------------------
+    def invalidate(self, key: str | None = None):
+        """Drop one key, or everything."""
+        if key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
+
+    def get_stats(self) -> dict:
+        lookups = self.hits + self.stale_hits + self.negative_hits + self.misses
+        return {
+            "total_entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.hits + self.stale_hits + self.negative_hits) / lookups, 4) if lookups else 0.0,
+            "refreshing": len(self._inflight),
+        }
@@ -0,0 +1,382 @@
+"""
+conversation_recall.py — Long-Term Conversation Recall
+A per-user vector index over past chat exchanges (a user message and the
+reply to it), so a chat turn can recall relevant conversations from earlier
+sessions. Exchanges are embedded with signed feature hashing (no model, CPU
+only) and kept in an inverted file over the embedding dimensions, so a search
+only scores exchanges that share a dimension with the message, skipping
+dimensions so common they carry no signal, instead of rescanning history.
+
+Each user's index is an append-only JSONL file under RECALL_INDEX_DIR, added
+to as turns are saved. The files hold chat text, so the directory is created
+0700 and the files 0600. The first time a user is seen, their existing
+conversations are backfilled from Supabase in a background thread.
+"""
+
+import hashlib
+import json
+import math
+import os
+import threading
+import time
+from collections import Counter, OrderedDict
+from datetime import datetime, timezone
+from functools import lru_cache
+
+from config import (
+    RECALL_INDEX_DIR, RECALL_MAX_USERS, RECALL_MIN_SCORE, RECALL_BACKFILL, RECALL_BACKFILL_MAX,
+)
+from services.fact_index import tokenize
+
+DIM_BITS = 20               # hashed embedding dimensions (2^20, stored sparse)
+COMMON_DF = 0.2             # dimensions in more exchanges than this share don't select candidates
+EXACT_BELOW = 500           # smaller indexes use every dimension
+REPLY_WEIGHT = 0.5          # reply text counts less than what the user said
+BIGRAM_WEIGHT = 0.5
+PREFIX_WEIGHT = 0.5         # "runn*" lets "running" match "runner"
+SNIPPET_CHARS = 400         # stored per side of an exchange
+_BACKFILL_PAGE = 1000
+
+_DIM_MASK = (1 << DIM_BITS) - 1
+
+
+# ------------------------------------------------------------------
+# Embedding
+# ------------------------------------------------------------------
+def _features(text: str, weight: float = 1.0) -> Counter:
+    tokens = tokenize(text)
+    features = Counter()
+    for token in tokens:
+        features[token] += weight
+        if len(token) >= 6:
+            features[f"{token[:4]}*"] += weight * PREFIX_WEIGHT
+    for a, b in zip(tokens, tokens[1:]):
+        features[f"{a} {b}"] += weight * BIGRAM_WEIGHT
+    return features
+
+
+@lru_cache(maxsize=1 << 16)
+def _hash_feature(feature: str) -> tuple[int, float]:
+    h = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "big")
+    return h & _DIM_MASK, (1.0 if h >> 63 else -1.0)
+
+
+def embed(text: str, reply: str = "") -> dict[int, float]:
+    """Unit-length sparse vector {dim: weight} of hashed words and word pairs."""
+    features = _features(text)
+    if reply:
+        features.update(_features(reply, REPLY_WEIGHT))
+    vec: dict[int, float] = {}
+    for feature, tf in features.items():
+        dim, sign = _hash_feature(feature)
+        vec[dim] = vec.get(dim, 0.0) + sign * (1.0 + math.log(tf) if tf >= 1 else tf)
+    norm = math.sqrt(sum(w * w for w in vec.values()))
+    return {d: w / norm for d, w in vec.items() if w} if norm else {}
+
+
+# ------------------------------------------------------------------
+# Per-user index
+# ------------------------------------------------------------------
+def _open_private(path: str, mode: str):
+    """open() for a file only the app's user can read (0600 when created)."""
+    flags = os.O_WRONLY | os.O_CREAT | (os.O_APPEND if mode == "a" else os.O_TRUNC)
+    return os.fdopen(os.open(path, flags, 0o600), mode, encoding="utf-8")
+
+
+def _utc(created_at) -> str:
+    """created_at as a UTC isoformat string. Rows saved by this process and
+    rows read back from Supabase format the same instant differently (offset
+    style, fractional digits), so keys and ordering use this form."""
+    try:
+        moment = datetime.fromisoformat(str(created_at))
+    except ValueError:
+        return str(created_at or "")
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.astimezone(timezone.utc).isoformat()
+
+
+class RecallIndex:
+    """One user's exchanges and an inverted file of their vectors, backed by a JSONL file."""
+
+    def __init__(self, user_id, path: str):
+        self.user_id = user_id
+        self.path = path
+        self.backfilled = False
+        self._entries: list[dict] = []   # {"session_id", "created_at", "user", "assistant"}
+        self._vectors: list[dict] = []
+        self._keys: set = set()          # (session_id, created_at) already indexed
+        self._postings: dict = {}        # dim → [(entry index, weight)]
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    # ------------------------------------------------------------------
+    def _index(self, entry: dict) -> bool:
+        key = (entry["session_id"], _utc(entry["created_at"]))
+        if key in self._keys:
+            return False
+        vec = embed(entry["user"], entry["assistant"])
+        if not vec:
+            return False
+        i = len(self._entries)
+        self._entries.append(entry)
+        self._vectors.append(vec)
+        self._keys.add(key)
+        for dim, weight in vec.items():
+            self._postings.setdefault(dim, []).append((i, weight))
+        return True
+
+    def load(self):
+        """Index the on-disk exchanges; the first line records whether backfill ran."""
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    record = json.loads(line)
+                    if "version" in record:
+                        self.backfilled = self.backfilled or bool(record.get("backfilled"))
+                    else:
+                        self._index(record)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"Warning: Could not load recall index for user {self.user_id}: {e}")
+
+    def add(self, entry: dict):
+        with self._lock:
+            if not self._index(entry):
+                return
+            try:
+                with _open_private(self.path, "a") as f:
+                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            except Exception as e:
+                print(f"Warning: Could not append to recall index for user {self.user_id}: {e}")
+
+    def merge_backfill(self, entries: list[dict]):
+        """Index backfilled exchanges and rewrite the file, oldest first."""
+        with self._lock:
+            for entry in entries:
+                self._index(entry)
+            self.backfilled = True
+            order = sorted(range(len(self._entries)), key=lambda i: _utc(self._entries[i]["created_at"]))
+            tmp_path = f"{self.path}.tmp"
+            try:
+                with _open_private(tmp_path, "w") as f:
+                    f.write(json.dumps({"version": 1, "backfilled": True}) + "\n")
+                    for i in order:
+                        f.write(json.dumps(self._entries[i], ensure_ascii=False) + "\n")
+                os.replace(tmp_path, self.path)
+            except Exception as e:
+                print(f"Warning: Could not write recall index for user {self.user_id}: {e}")
+
+    # ------------------------------------------------------------------
+    def search(self, query: str, k: int, exclude_session: str | None = None,
+               min_score: float = RECALL_MIN_SCORE) -> tuple[list[dict], int]:
+        """Top-k (entry + "score") for `query`, best first, and how many
+        exchanges were scored. Query dimensions are idf-weighted, and
+        exchanges sharing only very common dimensions are not considered."""
+        qvec = embed(query)
+        if not qvec or k <= 0:
+            return [], 0
+        with self._lock:
+            n = len(self._entries)
+            if not n:
+                return [], 0
+            weighted = {}
+            for dim, weight in qvec.items():
+                df = len(self._postings.get(dim, ()))
+                weighted[dim] = (weight * math.log(1 + n / max(df, 1)), df)
+            norm = math.sqrt(sum(w * w for w, _ in weighted.values())) or 1.0
+
+            # Candidates come from the selective dimensions; common ones only add score
+            common = n * COMMON_DF if n > EXACT_BELOW else n
+            scores: dict[int, float] = {}
+            for dim, (weight, df) in weighted.items():
+                if 0 < df <= common:
+                    for i, w in self._postings[dim]:
+                        scores[i] = scores.get(i, 0.0) + weight * w
+            for dim, (weight, df) in weighted.items():
+                if df > common:
+                    for i in scores:
+                        scores[i] += weight * self._vectors[i].get(dim, 0.0)
+
+            ranked = []
+            for i, score in scores.items():
+                score /= norm
+                if score >= min_score and (exclude_session is None or self._entries[i]["session_id"] != exclude_session):
+                    ranked.append((score, i))
+            ranked.sort(key=lambda item: (-item[0], -item[1]))
+            results, seen = [], set()
+            for score, i in ranked:
+                entry = self._entries[i]
+                if entry["user"] in seen:  # the same question asked again
+                    continue
+                seen.add(entry["user"])
+                results.append({**entry, "score": round(score, 3)})
+                if len(results) >= k:
+                    break
+            return results, len(scores)
+
+
+# ------------------------------------------------------------------
+# Store
+# ------------------------------------------------------------------
+def exchanges_from_rows(rows: list[dict]) -> list[dict]:
+    """Pair each user message with the assistant reply that follows it in the
+    same session. Rows must be oldest first."""
+    exchanges = []
+    last_user: dict = {}  # session_id → user row awaiting a reply
+    for row in rows:
+        session_id = row.get("session_id")
+        content = (row.get("content") or "").strip()
+        if not content:
+            continue
+        if row.get("role") == "user":
+            last_user[session_id] = row
+        elif row.get("role") == "assistant" and session_id in last_user:
+            asked = last_user.pop(session_id)
+            exchanges.append({
+                "session_id": session_id,
+                "created_at": _utc(asked.get("created_at") or ""),
+                "user": asked["content"].strip()[:SNIPPET_CHARS],
+                "assistant": content[:SNIPPET_CHARS],
+            })
+    return exchanges
+
+
+def _fetch_history(user_id) -> list[dict]:
+    """Most recent RECALL_BACKFILL_MAX conversation rows, oldest first."""
+    from supabase_rest import sb_select
+    rows = []
+    while len(rows) < RECALL_BACKFILL_MAX:
+        page = sb_select(
+            "conversations", columns="session_id,role,content,created_at",
+            query_string=f"user_id=eq.{user_id}&order=created_at.desc"
+                         f"&limit={min(_BACKFILL_PAGE, RECALL_BACKFILL_MAX - len(rows))}&offset={len(rows)}",
+        )
+        rows.extend(page)
+        if len(page) < _BACKFILL_PAGE:
+            break
+    rows.reverse()
+    return rows
+
+
+class ConversationRecall:
+    """LRU of loaded per-user indexes, with background backfill."""
+
+    def __init__(self, index_dir: str = RECALL_INDEX_DIR, max_users: int = RECALL_MAX_USERS,
+                 backfill: bool = RECALL_BACKFILL, fetch_history=None):
+        self.index_dir = index_dir
+        self.max_users = max_users
+        self.backfill = backfill
+        self._fetch_history = fetch_history or _fetch_history
+        self._indexes: OrderedDict = OrderedDict()  # user_id → RecallIndex
+        self._backfilling: set = set()
+        self._lock = threading.Lock()
+
+        # Metrics
+        self.searches = 0
+        self.scored = 0
+        self.search_ms = 0.0
+        self.added = 0
+        self.backfills = 0
+
+    # ------------------------------------------------------------------
+    def is_loaded(self, user_id) -> bool:
+        with self._lock:
+            return user_id in self._indexes
+
+    def _index_for(self, user_id) -> RecallIndex:
+        """The user's index, loaded from disk on first use (blocking)."""
+        with self._lock:
+            index = self._indexes.get(user_id)
+            if index is not None:
+                self._indexes.move_to_end(user_id)
+                return index
+        os.makedirs(self.index_dir, mode=0o700, exist_ok=True)
+        if os.stat(self.index_dir).st_mode & 0o077:
+            os.chmod(self.index_dir, 0o700)  # makedirs leaves an existing dir's mode alone
+        index = RecallIndex(user_id, os.path.join(self.index_dir, f"{user_id}.jsonl"))
+        index.load()
+        with self._lock:
+            existing = self._indexes.get(user_id)
+            if existing is not None:
+                return existing
+            self._indexes[user_id] = index
+            while len(self._indexes) > self.max_users:
+                self._indexes.popitem(last=False)
+            start_backfill = self.backfill and not index.backfilled and user_id not in self._backfilling
+            if start_backfill:
+                self._backfilling.add(user_id)
+        if start_backfill:
+            threading.Thread(target=self._backfill, args=(index,), daemon=True).start()
+        return index
+
+    def _backfill(self, index: RecallIndex):
+        try:
+            index.merge_backfill(exchanges_from_rows(self._fetch_history(index.user_id)))
+            self.backfills += 1
+        except Exception as e:
+            print(f"Warning: recall backfill failed for user {index.user_id}: {e}")
+        finally:
+            with self._lock:
+                self._backfilling.discard(index.user_id)
+
+    # ------------------------------------------------------------------
+    def add_rows(self, user_id, rows: list[dict]):
+        """Index the exchanges in newly saved conversation rows."""
+        exchanges = exchanges_from_rows(rows)
+        if not exchanges:
+            return
+        try:
+            index = self._index_for(user_id)
+            for exchange in exchanges:
+                index.add(exchange)
+            self.added += len(exchanges)
+        except Exception as e:
+            print(f"Warning: Could not index conversation for user {user_id}: {e}")
+
+    def search(self, user_id, query: str, k: int, exclude_session: str | None = None) -> list[dict]:
+        """Past exchanges most relevant to `query`, best first, each with
+        session_id, created_at, user, assistant and score."""
+        if not query:
+            return []
+        try:
+            started = time.perf_counter()
+            results, scored = self._index_for(user_id).search(query, k, exclude_session)
+            self.searches += 1
+            self.scored += scored
+            self.search_ms += (time.perf_counter() - started) * 1000
+            return results
+        except Exception as e:
+            print(f"Warning: recall search failed for user {user_id}: {e}")
+            return []
+
+    # ------------------------------------------------------------------
+    def get_stats(self) -> dict:
+        with self._lock:
+            loaded = list(self._indexes.values())
+            backfilling = len(self._backfilling)
+        return {
+            "loaded_users": len(loaded),
+            "indexed_exchanges": sum(len(index) for index in loaded),
+            "backfilling": backfilling,
+            "backfills": self.backfills,
+            "added": self.added,
+            "searches": self.searches,
+            "avg_scored": round(self.scored / self.searches, 1) if self.searches else 0,
+            "avg_search_ms": round(self.search_ms / self.searches, 2) if self.searches else 0,
+        }
+
+
+_recall_instance = None
+
+
+def get_conversation_recall() -> ConversationRecall:
+    global _recall_instance
+    if _recall_instance is None:
+        _recall_instance = ConversationRecall()
+    return _recall_instance
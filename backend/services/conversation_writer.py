@@ -0,0 +1,268 @@
+"""
+conversation_writer.py — Write-Behind for Conversation Rows
+Chat turns are queued in memory and bulk-inserted into the conversations
+table by a background task, so responses return without waiting on Supabase.
+A failed insert spills the queued rows to an append-only JSONL file (fsynced)
+which is replayed with exponential backoff, so messages survive Supabase
+outages and process restarts.
+
+Queued rows live only in process memory until the next flush, and the spill
+file is only replayed by a process that finds it. On serverless hosts (Vercel)
+the instance can be frozen or recycled after the response and its /tmp is
+never seen again, so there write-behind is off (CONVERSATION_WRITE_BEHIND) and
+rows are written before the response returns (the background loop is not
+started); a spill made then is still only as durable as CONVERSATION_SPILL_PATH.
+"""
+
+import asyncio
+import json
+import os
+import threading
+import time
+from collections import deque
+
+from config import (
+    CONVERSATION_FLUSH_INTERVAL, CONVERSATION_BATCH_SIZE,
+    CONVERSATION_MAX_BACKOFF, CONVERSATION_SPILL_PATH, CONVERSATION_WRITE_BEHIND,
+)
+
+
+def _default_writer(rows: list[dict]) -> int:
+    from supabase_rest import sb_insert_many
+    return sb_insert_many("conversations", rows)
+
+
+class ConversationWriter:
+    """In-memory row queue with a background bulk writer and a disk spill."""
+
+    def __init__(self, writer=None, batch_size: int = CONVERSATION_BATCH_SIZE,
+                 flush_interval: float = CONVERSATION_FLUSH_INTERVAL,
+                 max_backoff: float = CONVERSATION_MAX_BACKOFF, spill_path: str = CONVERSATION_SPILL_PATH,
+                 write_behind: bool = CONVERSATION_WRITE_BEHIND):
+        self._writer = writer or _default_writer  # blocking; runs in a worker thread
+        self.write_behind = write_behind
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_backoff = max_backoff
+        self.spill_path = spill_path
+        self._queue: deque = deque()
+        self._wake = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self._failures = 0          # consecutive failed writes, drives the backoff
+        self._retry_at = 0.0        # monotonic time before which we don't retry
+        self._spill_lock = threading.Lock()    # every read, append and rewrite of the spill file
+        self._replay_lock = threading.Lock()   # one replay at a time, so no row is inserted twice
+
+        # Metrics
+        self.written = 0
+        self.spilled = 0
+        self.replayed = 0
+        self.failed_writes = 0
+
+    # ------------------------------------------------------------------
+    def enqueue(self, rows: list[dict]):
+        """Queue rows for the next bulk insert. Never blocks with write-behind on.
+        With it off, or without a running event loop (scripts, tests), the rows
+        are written synchronously."""
+        if not rows:
+            return
+        if not self.write_behind:
+            self._write_now(rows)
+            return
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            self._write_now(rows)
+            return
+        self._queue.extend(rows)
+        self.start()
+        if len(self._queue) >= self.batch_size:
+            self._wake.set()
+
+    def _write_now(self, rows: list[dict]):
+        """Write rows in the calling thread, replaying any spill first; spill them on failure."""
+        if os.path.exists(self.spill_path) and time.monotonic() >= self._retry_at:
+            self._replay()
+        try:
+            self._writer(rows)
+            self.written += len(rows)
+            self._failures = 0
+        except Exception as e:
+            self._record_failure(e)
+            self._spill(rows)
+
+    def start(self):
+        """Start the writer loop on the running event loop, once. Not started
+        with write-behind off: enqueue writes (and replays) itself."""
+        if not self.write_behind:
+            return
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Stop the loop and write (or spill) whatever is still queued."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._task = None
+        await self.flush(force=True)
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"Warning: conversation flush failed: {e}")
+
+    # ------------------------------------------------------------------
+    async def flush(self, force: bool = False) -> int:
+        """Replay any spill file, then write queued rows in batches. On failure
+        the remaining rows are spilled to disk and retried after a backoff."""
+        if not force and time.monotonic() < self._retry_at:
+            return 0
+        written = 0
+        if os.path.exists(self.spill_path):
+            replayed = await asyncio.to_thread(self._replay)
+            if replayed is None:
+                self._spill_queue()
+                return 0
+            written += replayed
+
+        while self._queue:
+            batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+            try:
+                await asyncio.to_thread(self._writer, batch)
+            except Exception as e:
+                self._queue.extendleft(reversed(batch))
+                self._record_failure(e)
+                self._spill_queue()
+                return written
+            written += len(batch)
+            self.written += len(batch)
+        self._failures = 0
+        return written
+
+    def _record_failure(self, error):
+        self.failed_writes += 1
+        self._failures += 1
+        backoff = min(self.max_backoff, self.flush_interval * 2 ** self._failures)
+        self._retry_at = time.monotonic() + backoff
+        print(f"Warning: conversation write failed (retry in {backoff:.1f}s): {error}")
+
+    # ------------------------------------------------------------------
+    # Disk spill
+    # ------------------------------------------------------------------
+    def _spill_queue(self):
+        rows = list(self._queue)
+        self._queue.clear()
+        self._spill(rows)
+
+    def _spill(self, rows: list[dict]):
+        """Append rows to the spill file and fsync. Rows stay queued if even that fails."""
+        if not rows:
+            return
+        try:
+            with self._spill_lock:
+                with open(self.spill_path, "a", encoding="utf-8") as f:
+                    for row in rows:
+                        f.write(json.dumps(row, ensure_ascii=False) + "\n")
+                    f.flush()
+                    os.fsync(f.fileno())
+            self.spilled += len(rows)
+        except Exception as e:
+            print(f"Warning: Could not spill {len(rows)} conversation rows: {e}")
+            self._queue.extendleft(reversed(rows))
+
+    def _read_spill(self) -> list[dict]:
+        with open(self.spill_path, "r", encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def _replay(self) -> int | None:
+        """Write spilled rows in batches (runs in a worker thread). Returns rows
+        written, or None if a batch failed; unwritten rows are kept on disk.
+        Rows spilled while the replay runs are kept too. Returns 0 if another
+        replay is already running."""
+        if not self._replay_lock.acquire(blocking=False):
+            return 0
+        try:
+            try:
+                with self._spill_lock:
+                    rows = self._read_spill() if os.path.exists(self.spill_path) else []
+            except Exception as e:
+                print(f"Warning: Could not read conversation spill file: {e}")
+                return None
+
+            done = 0
+            try:
+                for i in range(0, len(rows), self.batch_size):
+                    self._writer(rows[i:i + self.batch_size])
+                    done = i + len(rows[i:i + self.batch_size])
+            except Exception as e:
+                self._record_failure(e)
+                self._finish_replay(len(rows), rows[done:])
+                self.replayed += done
+                self.written += done
+                return None
+            self._finish_replay(len(rows), [])
+            self.replayed += done
+            self.written += done
+            return done
+        finally:
+            self._replay_lock.release()
+
+    def _finish_replay(self, consumed: int, unwritten: list[dict]):
+        """Replace the first `consumed` spilled rows with the unwritten ones,
+        keeping anything appended after the replay read the file."""
+        with self._spill_lock:
+            try:
+                appended = self._read_spill()[consumed:] if os.path.exists(self.spill_path) else []
+            except Exception as e:
+                print(f"Warning: Could not re-read conversation spill file: {e}")
+                return  # leave the file as is; a later replay may insert duplicates, never lose rows
+            self._rewrite_spill(unwritten + appended)
+
+    def _rewrite_spill(self, rows: list[dict]):
+        """Replace the spill file with rows. Caller holds _spill_lock."""
+        try:
+            if not rows:
+                if os.path.exists(self.spill_path):
+                    os.remove(self.spill_path)
+                return
+            tmp_path = f"{self.spill_path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                for row in rows:
+                    f.write(json.dumps(row, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.spill_path)
+        except Exception as e:
+            print(f"Warning: Could not rewrite conversation spill file: {e}")
+
+    # ------------------------------------------------------------------
+    def get_stats(self) -> dict:
+        return {
+            "queued": len(self._queue),
+            "written": self.written,
+            "spilled": self.spilled,
+            "replayed": self.replayed,
+            "failed_writes": self.failed_writes,
+            "spill_pending": os.path.exists(self.spill_path),
+        }
+
+
+_writer_instance = None
+
+
+def get_conversation_writer() -> ConversationWriter:
+    global _writer_instance
+    if _writer_instance is None:
+        _writer_instance = ConversationWriter()
+    return _writer_instance
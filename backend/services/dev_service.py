@@ -55,7 +55,7 @@ class DevService:
             resp = await llm_router.route([
                 {"role": "system", "content": sys_prompt},
                 {"role": "user", "content": user_msg}
-            ], cache_ttl=0)
+            ], cache_ttl=0, feature="dev_service.dev_chat")
 
             # In a real impl, we'd extract concepts via a regex dictionary check of the response text
             return resp
@@ -71,7 +71,8 @@ class DevService:
                 '{"scores": {"security": 8, "performance": 9, "readability": 7}, "issues": ["..."], "suggestions": ["..."]}'
                 f"\n\nCODE:\n{code}"
             )
-            resp = await llm_router.route([{"role": "user", "content": prompt}])
+            resp = await llm_router.route([{"role": "user", "content": prompt}],
+                                          feature="dev_service.code_review")
             text_resp = resp.get("text", "")
             start = text_resp.find("{")
             end = text_resp.rfind("}") + 1
@@ -87,7 +88,8 @@ class DevService:
                 '{"bug_location": "...", "root_cause": "...", "fix_code": "...", "prevention": "..."}'
                 f"\n\nERROR: {error}\nCODE: {code}"
             )
-            resp = await llm_router.route([{"role": "user", "content": prompt}])
+            resp = await llm_router.route([{"role": "user", "content": prompt}],
+                                          feature="dev_service.debug_code")
             text_resp = resp.get("text", "")
             start = text_resp.find("{")
             end = text_resp.rfind("}") + 1
@@ -103,7 +105,8 @@ class DevService:
                 "Return ONLY a JSON object: "
                 '{"tech_stack": ["..."], "folder_structure": "...", "timeline_days": 14, "features": {"P0": ["..."], "P1": ["..."]}, "challenges": ["..."]}'
             )
-            resp = await llm_router.route([{"role": "user", "content": prompt}])
+            resp = await llm_router.route([{"role": "user", "content": prompt}],
+                                          feature="dev_service.kickstart")
             text_resp = resp.get("text", "")
             start = text_resp.find("{")
             end = text_resp.rfind("}") + 1
@@ -175,7 +178,8 @@ class DevService:
                 "Return ONLY a JSON object: "
                 '{"title": "...", "topic": "...", "difficulty": "...", "description": "...", "examples": ["..."], "hints": ["..."]}'
             )
-            resp = await llm_router.route([{"role": "user", "content": prompt}], cache_ttl=0)
+            resp = await llm_router.route([{"role": "user", "content": prompt}],
+                                          cache_ttl=0, feature="dev_service.get_challenge")
             text_resp = resp.get("text", "")
             start = text_resp.find("{")
             end = text_resp.rfind("}") + 1
@@ -210,7 +214,8 @@ class DevService:
                 "Return ONLY JSON: "
                 '{"correctness": true/false, "time_complexity": "O(N)", "space_complexity": "O(1)", "feedback": "...", "compare_to_optimal": "..."}'
             )
-            resp = await llm_router.route([{"role": "user", "content": prompt}], cache_ttl=0)
+            resp = await llm_router.route([{"role": "user", "content": prompt}],
+                                          cache_ttl=0, feature="dev_service.submit_challenge")
             text_resp = resp.get("text", "")
             start = text_resp.find("{")
             end = text_resp.rfind("}") + 1
@@ -0,0 +1,132 @@
+"""
+fact_extraction.py — Debounced Background Fact Extraction
+Collects each user's chat messages and extracts personal facts from several
+turns at once: one LLM call (through the structured batcher) per batch, and
+one bulk upsert for the facts it finds. Short and repeated messages are
+skipped. Extraction runs FACT_EXTRACT_DEBOUNCE seconds after the user goes
+quiet, FACT_EXTRACT_MAX_DELAY after their first queued turn at the latest, or
+as soon as FACT_EXTRACT_MAX_TURNS turns are queued.
+"""
+
+import asyncio
+import hashlib
+import time
+from collections import deque
+
+from config import (
+    FACT_EXTRACT_DEBOUNCE, FACT_EXTRACT_MAX_DELAY, FACT_EXTRACT_MAX_TURNS, FACT_EXTRACT_MIN_WORDS,
+)
+
+_RECENT_PER_USER = 50  # message hashes remembered for duplicate skipping
+
+
+class FactExtractionQueue:
+    """Per-user message buffers with debounce timers."""
+
+    def __init__(self, memory_service=None, debounce: float = FACT_EXTRACT_DEBOUNCE,
+                 max_delay: float = FACT_EXTRACT_MAX_DELAY, max_turns: int = FACT_EXTRACT_MAX_TURNS,
+                 min_words: int = FACT_EXTRACT_MIN_WORDS):
+        self.memory_service = memory_service
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.max_turns = max_turns
+        self.min_words = min_words
+        # user_id → {"messages": [str], "first_at": monotonic, "timer": TimerHandle}
+        self._pending: dict = {}
+        self._recent: dict = {}                  # user_id → deque of message hashes
+        self._running: set[asyncio.Task] = set()  # strong refs to in-progress extractions
+
+        # Metrics
+        self.queued = 0
+        self.skipped = 0
+        self.extractions = 0
+        self.facts_found = 0
+
+    # ------------------------------------------------------------------
+    def _is_trivial(self, message: str) -> bool:
+        return len(message.split()) < self.min_words or not any(c.isalpha() for c in message)
+
+    def _is_duplicate(self, user_id, message: str) -> bool:
+        digest = hashlib.sha1(" ".join(message.lower().split()).encode("utf-8")).hexdigest()
+        recent = self._recent.setdefault(user_id, deque(maxlen=_RECENT_PER_USER))
+        if digest in recent:
+            return True
+        recent.append(digest)
+        return False
+
+    def submit(self, user_id, message: str) -> bool:
+        """Queue a user message for extraction. Never blocks. Returns False if skipped."""
+        message = (message or "").strip()
+        if self._is_trivial(message) or self._is_duplicate(user_id, message):
+            self.skipped += 1
+            return False
+
+        loop = asyncio.get_running_loop()
+        now = time.monotonic()
+        batch = self._pending.get(user_id)
+        if batch is None:
+            batch = {"messages": [], "first_at": now, "timer": None}
+            self._pending[user_id] = batch
+        batch["messages"].append(message)
+        self.queued += 1
+
+        if batch["timer"] is not None:
+            batch["timer"].cancel()
+        if len(batch["messages"]) >= self.max_turns:
+            self._flush(user_id)
+        else:
+            delay = min(self.debounce, max(0.0, batch["first_at"] + self.max_delay - now))
+            batch["timer"] = loop.call_later(delay, self._flush, user_id)
+        return True
+
+    def _flush(self, user_id):
+        """Start extraction for everything queued for `user_id`."""
+        batch = self._pending.pop(user_id, None)
+        if batch is None:
+            return
+        if batch["timer"] is not None:
+            batch["timer"].cancel()
+        task = asyncio.get_running_loop().create_task(self._extract(user_id, batch["messages"]))
+        self._running.add(task)
+        task.add_done_callback(self._running.discard)
+
+    async def _extract(self, user_id, messages: list[str]):
+        try:
+            if self.memory_service is None:
+                from services.memory_service import MemoryService
+                self.memory_service = MemoryService()
+            text = "\n".join(f"- {m}" for m in messages)
+            facts = await self.memory_service.auto_extract_facts(user_id, text)
+            self.extractions += 1
+            self.facts_found += len(facts or [])
+        except Exception as e:
+            print(f"Warning: fact extraction failed for user {user_id}: {e}")
+
+    async def drain(self):
+        """Extract everything still queued and wait for running extractions (shutdown)."""
+        for user_id in list(self._pending):
+            self._flush(user_id)
+        if self._running:
+            await asyncio.gather(*list(self._running), return_exceptions=True)
+
+    # ------------------------------------------------------------------
+    def get_stats(self) -> dict:
+        return {
+            "pending_users": len(self._pending),
+            "pending_messages": sum(len(b["messages"]) for b in self._pending.values()),
+            "running": len(self._running),
+            "queued": self.queued,
+            "skipped": self.skipped,
+            "extractions": self.extractions,
+            "facts_found": self.facts_found,
+        }
+
+
+_queue_instance = None
+
+
+def get_fact_extraction_queue() -> FactExtractionQueue:
+    global _queue_instance
+    if _queue_instance is None:
+        _queue_instance = FactExtractionQueue()
+    return _queue_instance
@@ -0,0 +1,104 @@
+"""
+fact_index.py — Local Relevance Index for Memory Facts
+A small in-process BM25 index over one user's memory facts ("key value"
+text), updated incrementally as facts change. Used to put only the facts
+relevant to the current message into the prompt. CPU-only, no dependencies.
+"""
+
+import math
+import re
+from collections import Counter
+
+# Facts that are stored per user but are not about the user (admin inbox items)
+HIDDEN_FACT_PREFIXES = ("app_suggestion_", "ai_plan_")
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "a an and are as at be but by can could did do does for from had has have how i i'm im in is it its "
+    "me my of on or our so than that the their them then there these they this to was we were what when "
+    "where which who why will with would you your".split()
+)
+
+
+def is_hidden_fact(key: str) -> bool:
+    return str(key).startswith(HIDDEN_FACT_PREFIXES)
+
+
+def tokenize(text: str) -> list[str]:
+    """Lowercase word tokens without stopwords; snake_case keys split into words,
+    and a trailing plural "s" is dropped so "cats" matches "cat"."""
+    tokens = []
+    for token in _TOKEN_RE.findall(str(text).lower().replace("_", " ")):
+        if token in _STOPWORDS:
+            continue
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+class FactIndex:
+    """BM25 over {key: value} facts with O(len(fact)) upserts and removals."""
+
+    def __init__(self, facts: dict | None = None):
+        self._docs: dict[str, tuple[str, Counter, int]] = {}  # key → (value, term counts, length)
+        self._df: Counter = Counter()                          # term → facts containing it
+        self._total_len = 0
+        for key, value in (facts or {}).items():
+            self.upsert(key, value)
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    # ------------------------------------------------------------------
+    def upsert(self, key: str, value: str):
+        if is_hidden_fact(key):
+            return
+        self.remove(key)
+        terms = Counter(tokenize(f"{key} {value}"))
+        length = sum(terms.values())
+        self._docs[key] = (value, terms, length)
+        self._df.update(terms.keys())
+        self._total_len += length
+
+    def remove(self, key: str):
+        doc = self._docs.pop(key, None)
+        if doc is None:
+            return
+        _, terms, length = doc
+        self._df.subtract(terms.keys())
+        for term in terms:
+            if self._df[term] <= 0:
+                del self._df[term]
+        self._total_len -= length
+
+    # ------------------------------------------------------------------
+    def search(self, query: str, k: int) -> list[tuple[str, str, float]]:
+        """Top-k (key, value, score) facts for `query`, best first. Facts that
+        share no terms with the query are not returned."""
+        n = len(self._docs)
+        query_terms = set(tokenize(query))
+        if not n or not query_terms or k <= 0:
+            return []
+        avg_len = self._total_len / n or 1.0
+        idf = {
+            t: math.log(1 + (n - self._df[t] + 0.5) / (self._df[t] + 0.5))
+            for t in query_terms if t in self._df
+        }
+        if not idf:
+            return []
+
+        scored = []
+        for key, (value, terms, length) in self._docs.items():
+            score = 0.0
+            for term, weight in idf.items():
+                tf = terms.get(term)
+                if tf:
+                    score += weight * tf * (BM25_K1 + 1) / (tf + BM25_K1 * (1 - BM25_B + BM25_B * length / avg_len))
+            if score > 0:
+                scored.append((key, value, score))
+        scored.sort(key=lambda item: (-item[2], item[0]))
+        return scored[:k]
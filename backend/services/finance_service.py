@@ -13,6 +13,28 @@ from sqlalchemy import func, extract
 from models.transaction import Transaction
 from models.budget import Budget
 from models.user import User
+from services.structured_output import get_structured_batcher
+
+
+_PARSE_TRANSACTION_INSTRUCTION = (
+    "Parse this into a financial transaction. date is YYYY-MM-DD; description is a short label."
+)
+_PARSE_TRANSACTION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "amount": {"type": "number"},
+        "type": {"type": "string", "enum": ["income", "expense"], "default": "expense"},
+        "category": {
+            "type": "string",
+            "enum": ["food", "rent", "transport", "shopping", "entertainment",
+                     "learning", "salary", "freelance", "other"],
+            "default": "other",
+        },
+        "description": {"type": ["string", "null"], "default": ""},
+        "date": {"type": ["string", "null"], "default": None},
+    },
+    "required": ["amount"],
+}
 
 
 class FinanceService:
@@ -39,22 +61,13 @@ class FinanceService:
             return None
 
     @staticmethod
-    async def ai_parse_transaction(text: str, llm_router) -> dict | None:
+    async def ai_parse_transaction(text: str, llm_router, user_id: int | None = None) -> dict | None:
         """Parse natural language into a Transaction object via LLM."""
         try:
-            prompt = (
-                "Parse this into a financial transaction. Return ONLY valid JSON: "
-                '{"amount": 10.5, "type": "income/expense", "category": "food/rent/transport/shopping/entertainment/learning/salary/freelance/other", '
-                '"description": "coffee", "date": "YYYY-MM-DD"}. Text: '
-                + text
+            return await get_structured_batcher(llm_router).submit(
+                _PARSE_TRANSACTION_INSTRUCTION, text, _PARSE_TRANSACTION_SCHEMA, task="extract",
+                feature="finance_service.ai_parse_transaction", user_id=user_id,
             )
-            resp = await llm_router.route([{"role": "user", "content": prompt}], cache_ttl=0)
-            text_resp = resp.get("text", "")
-            start = text_resp.find("{")
-            end = text_resp.rfind("}") + 1
-            if start == -1 or end == 0:
-                return None
-            return json.loads(text_resp[start:end])
         except Exception:
             return None
 
@@ -191,7 +204,8 @@ class FinanceService:
                 "Based on this monthly finance summary, give me 3 concise lines of personalized money advice "
                 "or actionable insights: " + json.dumps(summary)
             )
-            resp = await llm_router.route([{"role": "user", "content": prompt}])
+            resp = await llm_router.route([{"role": "user", "content": prompt}],
+                                          priority="background", feature="finance_service.ai_insights")
             return resp.get("text", "Track your spending carefully.")
         except Exception:
             return "Unable to fetch insights right now."
@@ -159,7 +159,8 @@ class GoalService:
                 "Suggest 3 new SMART goals based on common self-improvement gaps. "
                 "Return ONLY a valid JSON array of strings. Example: ['Read 10 pages daily', 'Code 1 hr']."
             )
-            resp = await llm_router.route([{"role": "user", "content": prompt}])
+            resp = await llm_router.route([{"role": "user", "content": prompt}],
+                                          feature="goal_service.ai_suggest")
             text_resp = resp.get("text", "")
             try:
                 # Find array
@@ -184,7 +185,8 @@ class GoalService:
                 "Write an encouraging, objective narrative progress report based on these goals:\n"
                 + "\n".join(data) + "\nKeep it strictly under 3 paragraphs."
             )
-            resp = await llm_router.route([{"role": "user", "content": prompt}], cache_ttl=3600)
+            resp = await llm_router.route([{"role": "user", "content": prompt}],
+                                          cache_ttl=3600, feature="goal_service.get_progress_report")
             return resp.get("text", "Error generating report.")
         except Exception:
             return "Could not generate progress report right now."
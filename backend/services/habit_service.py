@@ -196,7 +196,8 @@ class HabitService:
             streaks = HabitService.get_streaks(db, user_id)
             data_str = ", ".join([f"{s['habit']}: {s['streak']} days" for s in streaks])
             prompt = "Analyze these habit streaks and give me 2 short sentences of actionable insights: " + data_str
-            resp = await llm_router.route([{"role": "user", "content": prompt}])
+            resp = await llm_router.route([{"role": "user", "content": prompt}],
+                                          priority="background", feature="habit_service.ai_insights")
             return resp.get("text", "Keep up the good work!")
         except Exception:
             return ""
@@ -116,7 +116,8 @@ class HealthService:
                 "Based on my recent health and mood logs, write 2 concise, supportive pieces of health advice "
                 "or point out a trend:\n" + "\n".join(data_arr)
             )
-            resp = await llm_router.route([{"role": "user", "content": prompt}], cache_ttl=86400)
+            resp = await llm_router.route([{"role": "user", "content": prompt}],
+                                          cache_ttl=86400, priority="background", feature="health_service.ai_insights")
             return resp.get("text", "Get consistent sleep and stay hydrated.")
         except Exception:
             return "Unable to fetch health insights right now."
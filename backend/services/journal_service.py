@@ -11,6 +11,19 @@ from sqlalchemy.orm import Session
 from sqlalchemy import extract
 
 from models.journal import JournalEntry
+from services.structured_output import get_structured_batcher
+
+
+_ANALYSIS_INSTRUCTION = "Analyze this journal entry's sentiment, emotions and themes."
+_ANALYSIS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "sentiment": {"type": "string", "enum": ["positive", "negative", "neutral"]},
+        "emotions": {"type": "array", "items": {"type": "string"}, "default": []},
+        "themes": {"type": "array", "items": {"type": "string"}, "default": []},
+    },
+    "required": ["sentiment"],
+}
 
 
 class JournalService:
@@ -34,23 +47,12 @@ class JournalService:
             
             if llm_router and entry.content:
                 # Run Auto-analysis
-                prompt = (
-                    "Analyze this journal entry. Return ONLY a JSON object: "
-                    '{"sentiment": "positive/negative/neutral", "emotions": ["..."], "themes": ["..."]}. Text: '
-                    + entry.content
+                analysis = await get_structured_batcher(llm_router).submit(
+                    _ANALYSIS_INSTRUCTION, entry.content, _ANALYSIS_SCHEMA, task="classify",
+                    feature="journal_service.create", user_id=user_id,
                 )
-                resp = await llm_router.route([{"role": "user", "content": prompt}])
-                text_resp = resp.get("text", "")
-                
-                # Excerpt and validate JSON
-                try:
-                    start = text_resp.find("{")
-                    end = text_resp.rfind("}") + 1
-                    valid_json = text_resp[start:end]
-                    json.loads(valid_json) # Test it
-                    entry.ai_analysis = valid_json
-                except:
-                    pass
+                if analysis is not None:
+                    entry.ai_analysis = json.dumps(analysis)
 
             entry.updated_at = datetime.now(timezone.utc)
             db.add(entry)
@@ -84,7 +86,8 @@ class JournalService:
                 "Base them on general themes of growth and focus. "
                 "Return ONLY a valid JSON array of strings: ['prompt 1', 'prompt 2', 'prompt 3']."
             )
-            resp = await llm_router.route([{"role": "user", "content": prompt}], cache_ttl=3600)
+            resp = await llm_router.route([{"role": "user", "content": prompt}],
+                                          cache_ttl=3600, feature="journal_service.get_prompts")
             text_resp = resp.get("text", "")
             try:
                 start = text_resp.find("[")
@@ -133,7 +136,8 @@ class JournalService:
                 "Identify themes, patterns, emotional arc, and insights. "
                 "Here are the entries:\n" + combined
             )
-            resp = await llm_router.route([{"role": "user", "content": prompt}], cache_ttl=86400)
+            resp = await llm_router.route([{"role": "user", "content": prompt}],
+                                          cache_ttl=86400, task="long_form", feature="journal_service.ai_summary")
             return resp.get("text", "Error generating summary.")
         except Exception:
             return "Failed to generate AI summary."
@@ -1,11 +1,21 @@
 """
 key_manager.py — API Key Rotation Manager
 Manages multiple API keys per LLM provider with round-robin rotation,
-exhaustion tracking, and automatic daily resets.
+exhaustion tracking, and automatic daily resets. Key health is checkpointed
+to disk (and shared-key exhaustion to the shared_keys table) so a cold start
+does not retry keys that were rate-limited moments ago. Both writes happen in
+background threads. On serverless deployments (Vercel) the local checkpoint
+file does not outlive the instance, so there only shared-key state survives a
+cold start unless KEY_STATE_PATH points at persistent storage.
 """
 
 import base64
+import functools
+import hashlib
+import json
 import os
+import threading
+import time
 from cryptography.fernet import Fernet
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
@@ -14,11 +24,25 @@ from datetime import datetime, timezone, date
 from config import (
     GROQ_API_KEYS, GEMINI_API_KEYS, COHERE_API_KEYS,
     OPENROUTER_API_KEYS, HF_API_KEYS, CLOUDFLARE_API_KEYS,
-    NVIDIA_API_KEYS, SAMBANOVA_API_KEYS, CEREBRAS_API_KEYS,
-    JWT_SECRET
+    NVIDIA_API_KEYS, SAMBANOVA_API_KEYS, CEREBRAS_API_KEYS, MOCK_API_KEYS,
+    JWT_SECRET, KEY_STATE_PATH, KEY_STATE_MAX_AGE, KEY_STATE_CHECKPOINT_INTERVAL,
+    PROVIDER_TOKEN_QUOTA,
 )
 
 
+@functools.lru_cache(maxsize=4)
+def _derive_fernet_key(secret: str) -> bytes:
+    """PBKDF2 is deliberately slow (~100k rounds), so derive once per process."""
+    salt = b'jexi_encryption_salt' # In production, this should ideally be another env var
+    kdf = PBKDF2HMAC(
+        algorithm=hashes.SHA256(),
+        length=32,
+        salt=salt,
+        iterations=100000,
+    )
+    return base64.urlsafe_b64encode(kdf.derive(secret.encode()))
+
+
 class KeyManager:
     """Round-robin API key rotation with exhaustion tracking and DB encryption."""
 
@@ -26,17 +50,18 @@ class KeyManager:
         self._current_index: dict[str, int] = {}
         self._last_reset: date = date.today()
         self.keys: dict[str, list[dict]] = {}
+
+        # Checkpoint bookkeeping
+        self._dirty: bool = False
+        self._last_checkpoint: float = 0.0
+        self._write_lock = threading.Lock()
+        self._written_at: float = 0.0  # saved_at of the snapshot on disk
+        self._restored: dict[str, dict] = {}  # fingerprint → saved state, applied as keys appear
+        self._pending_db_sync: set[int] = set()  # shared_keys ids whose health changed
         
-        # Setup encryption for shared keys from friends
-        salt = b'jexi_encryption_salt' # In production, this should ideally be another env var
-        kdf = PBKDF2HMAC(
-            algorithm=hashes.SHA256(),
-            length=32,
-            salt=salt,
-            iterations=100000,
-        )
-        key = base64.urlsafe_b64encode(kdf.derive(JWT_SECRET.encode()))
-        self.fernet = Fernet(key)
+        # Encryption for shared keys from friends is set up lazily (see `fernet`)
+        self._fernet: Fernet | None = None
+        self._decrypted: dict[str, str] = {}  # ciphertext fingerprint → plain key
 
         provider_key_map = {
             "groq": GROQ_API_KEYS,
@@ -48,6 +73,7 @@ class KeyManager:
             "nvidia": NVIDIA_API_KEYS,
             "sambanova": SAMBANOVA_API_KEYS,
             "cerebras": CEREBRAS_API_KEYS,
+            "mock": MOCK_API_KEYS,
         }
 
         for provider, raw_keys in provider_key_map.items():
@@ -56,6 +82,7 @@ class KeyManager:
                     "key": k,
                     "is_exhausted": False,
                     "requests_today": 0,
+                    "tokens_today": 0,
                     "last_used": None,
                     "exhausted_at": None,
                     "is_shared": False # Keys from .env are not marked as shared
@@ -64,38 +91,243 @@ class KeyManager:
             ]
             self._current_index[provider] = 0
 
+        self.restore_state()
+
+    @property
+    def fernet(self) -> Fernet:
+        """Fernet cipher, built on first encrypt/decrypt rather than at import time."""
+        if self._fernet is None:
+            self._fernet = Fernet(_derive_fernet_key(JWT_SECRET))
+        return self._fernet
+
     def encrypt_key(self, plain_text_key: str) -> str:
         """Encrypts a string for DB storage."""
-        return self.fernet.encrypt(plain_text_key.encode()).decode()
+        encrypted = self.fernet.encrypt(plain_text_key.encode()).decode()
+        self._decrypted[self._fingerprint(encrypted)] = plain_text_key
+        return encrypted
 
     def decrypt_key(self, encrypted_key: str) -> str:
-        """Decrypts a string from the DB."""
-        return self.fernet.decrypt(encrypted_key.encode()).decode()
+        """Decrypts a string from the DB. Results are cached by ciphertext fingerprint,
+        so re-polling shared_keys does not pay for Fernet again."""
+        fp = self._fingerprint(encrypted_key)
+        cached = self._decrypted.get(fp)
+        if cached is None:
+            cached = self.fernet.decrypt(encrypted_key.encode()).decode()
+            self._decrypted[fp] = cached
+        return cached
+
+    @staticmethod
+    def _row_value(row, field: str):
+        """Read a column from either a SharedKey model or a Supabase REST dict."""
+        if isinstance(row, dict):
+            return row.get(field)
+        return getattr(row, field, None)
 
-    def add_db_keys(self, shared_keys_from_db: list):
-        """Merges keys from the database (offered by friends) into the rotation pool."""
+    @staticmethod
+    def _as_datetime(value) -> datetime | None:
+        """REST rows carry ISO strings, ORM rows carry datetimes."""
+        if value is None or isinstance(value, datetime):
+            return value
+        try:
+            return datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+        except ValueError:
+            return None
+
+    def add_db_keys(self, shared_keys_from_db: list) -> int:
+        """Merges keys from the database (offered by friends) into the rotation pool.
+        Accepts SharedKey models or shared_keys rows from the REST API.
+        Returns the number of keys that were new to the pool."""
+        added = 0
+        pooled: dict[str, set[str]] = {}  # provider → key values, built once per call
         for sk in shared_keys_from_db:
-            if not sk.is_active: continue
-            
-            provider = sk.provider.lower()
-            if provider not in self.keys:
-                self.keys[provider] = []
-                self._current_index[provider] = 0
-            
-            # Check if key already in pool to avoid duplicates
-            decrypted = self.decrypt_key(sk.encrypted_key)
-            if any(k["key"] == decrypted for k in self.keys[provider]):
-                continue
-
-            self.keys[provider].append({
-                "key": decrypted,
-                "is_exhausted": sk.is_exhausted,
-                "requests_today": 0,
-                "last_used": sk.last_used.isoformat() if sk.last_used else None,
-                "exhausted_at": sk.exhausted_at.isoformat() if sk.exhausted_at else None,
-                "is_shared": True,
-                "db_id": sk.id
+            try:
+                if self._row_value(sk, "is_active") is False:
+                    continue
+
+                provider = str(self._row_value(sk, "provider") or "").lower()
+                encrypted = self._row_value(sk, "encrypted_key")
+                if not provider or not encrypted:
+                    continue
+                if provider not in self.keys:
+                    self.keys[provider] = []
+                    self._current_index[provider] = 0
+
+                # Check if key already in pool to avoid duplicates
+                decrypted = self.decrypt_key(encrypted)
+                if decrypted in pooled.setdefault(provider, {k["key"] for k in self.keys[provider]}):
+                    continue
+                pooled[provider].add(decrypted)
+
+                # Exhaustion only counts for the day it happened on
+                last_used = self._as_datetime(self._row_value(sk, "last_used"))
+                exhausted_at = self._as_datetime(self._row_value(sk, "exhausted_at"))
+                exhausted_today = bool(
+                    self._row_value(sk, "is_exhausted")
+                    and exhausted_at
+                    and exhausted_at.date() == date.today()
+                )
+                entry = {
+                    "key": decrypted,
+                    "is_exhausted": exhausted_today,
+                    "requests_today": 0,
+                    "tokens_today": 0,
+                    "last_used": last_used.isoformat() if last_used else None,
+                    "exhausted_at": exhausted_at.isoformat() if exhausted_today else None,
+                    "is_shared": True,
+                    "db_id": self._row_value(sk, "id")
+                }
+                self._apply_restored(entry)
+                self.keys[provider].append(entry)
+                added += 1
+            except Exception as e:
+                print(f"Warning: Skipping shared key {self._row_value(sk, 'id')}: {e}")
+        return added
+
+    def refresh_shared_keys(self, rows: list | None = None) -> int:
+        """Pull active shared keys (or use the given rows) and add any new ones.
+        Blocking — call from a worker thread when on the event loop."""
+        try:
+            if rows is None:
+                from supabase_rest import sb_select
+                rows = sb_select("shared_keys", query_string="is_active=eq.true")
+            return self.add_db_keys(rows or [])
+        except Exception as e:
+            print(f"Warning: Could not refresh shared keys: {e}")
+            return 0
+
+    # ------------------------------------------------------------------
+    @staticmethod
+    def _fingerprint(value: str) -> str:
+        """Short stable hash of a secret so raw keys never touch disk."""
+        return hashlib.sha256(value.encode()).hexdigest()[:16]
+
+    def export_state(self) -> dict:
+        """Serializable snapshot of key health, keyed by key fingerprint."""
+        return {
+            "saved_at": time.time(),
+            "day": self._last_reset.isoformat(),
+            "keys": {
+                self._fingerprint(e["key"]): {
+                    "is_exhausted": e["is_exhausted"],
+                    "requests_today": e["requests_today"],
+                    "tokens_today": e.get("tokens_today", 0),
+                    "last_used": e["last_used"],
+                    "exhausted_at": e["exhausted_at"],
+                }
+                for entries in self.keys.values()
+                for e in entries
+            },
+        }
+
+    def load_state(self, state: dict) -> int:
+        """Apply a snapshot produced by export_state(). Returns how many keys were updated.
+        Snapshots older than KEY_STATE_MAX_AGE or from a previous day are ignored."""
+        try:
+            if not state:
+                return 0
+            if time.time() - float(state.get("saved_at", 0)) > KEY_STATE_MAX_AGE:
+                return 0
+            if state.get("day") != date.today().isoformat():
+                return 0
+
+            # Kept around so shared keys loaded later pick up their state too
+            self._restored = dict(state.get("keys", {}))
+            applied = 0
+            for entries in self.keys.values():
+                for entry in entries:
+                    if self._apply_restored(entry):
+                        applied += 1
+            return applied
+        except Exception:
+            return 0
+
+    def _apply_restored(self, entry: dict) -> bool:
+        """Merge saved health into a pool entry; the more pessimistic value wins."""
+        saved = self._restored.get(self._fingerprint(entry["key"]))
+        if not saved:
+            return False
+        if saved.get("is_exhausted") and not entry["is_exhausted"]:
+            entry["is_exhausted"] = True
+            entry["exhausted_at"] = saved.get("exhausted_at")
+        entry["requests_today"] = max(entry["requests_today"], int(saved.get("requests_today") or 0))
+        entry["tokens_today"] = max(entry.get("tokens_today", 0), int(saved.get("tokens_today") or 0))
+        entry["last_used"] = entry["last_used"] or saved.get("last_used")
+        return True
+
+    def restore_state(self) -> int:
+        """Rehydrate key health from the last checkpoint file, if any."""
+        try:
+            if not os.path.exists(KEY_STATE_PATH):
+                return 0
+            with open(KEY_STATE_PATH, "r", encoding="utf-8") as f:
+                return self.load_state(json.load(f))
+        except Exception as e:
+            print(f"Warning: Could not restore key state: {e}")
+            return 0
+
+    def checkpoint(self, force: bool = False) -> bool:
+        """Persist key health if it changed. Unforced calls are throttled to
+        once per KEY_STATE_CHECKPOINT_INTERVAL seconds."""
+        now = time.time()
+        if not self._dirty:
+            return False
+        if not force and now - self._last_checkpoint < KEY_STATE_CHECKPOINT_INTERVAL:
+            return False
+        self._dirty = False
+        self._last_checkpoint = now
+
+        # Snapshot now, write off the request path
+        state = self.export_state()
+        threading.Thread(target=self._write_state, args=(state,), daemon=True).start()
+
+        self._sync_shared_keys()
+        return True
+
+    def _write_state(self, state: dict):
+        """Write a snapshot to KEY_STATE_PATH; an older snapshot never replaces a newer one."""
+        with self._write_lock:
+            if state["saved_at"] < self._written_at:
+                return
+            try:
+                tmp_path = f"{KEY_STATE_PATH}.tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(state, f)
+                os.replace(tmp_path, KEY_STATE_PATH)
+                self._written_at = state["saved_at"]
+            except Exception as e:
+                print(f"Warning: Could not checkpoint key state: {e}")
+
+    def _sync_shared_keys(self):
+        """Write shared-key health back to the shared_keys table off the request path."""
+        if not self._pending_db_sync:
+            return
+        updates = [
+            (e["db_id"], {
+                "is_exhausted": e["is_exhausted"],
+                "exhausted_at": e["exhausted_at"],
+                "last_used": e["last_used"],
             })
+            for entries in self.keys.values()
+            for e in entries
+            if e.get("db_id") in self._pending_db_sync
+        ]
+        self._pending_db_sync.clear()
+
+        def _write():
+            try:
+                from supabase_rest import sb_update
+                for db_id, data in updates:
+                    sb_update("shared_keys", "id", db_id, data)
+            except Exception as e:
+                print(f"Warning: Could not sync shared key state: {e}")
+
+        threading.Thread(target=_write, daemon=True).start()
+
+    def _mark_changed(self, entry: dict | None = None):
+        """Flag state as dirty; shared keys are also queued for DB write-back."""
+        self._dirty = True
+        if entry is not None and entry.get("db_id") is not None:
+            self._pending_db_sync.add(entry["db_id"])
 
 
     # ------------------------------------------------------------------
@@ -103,8 +335,8 @@ class KeyManager:
         """Auto-reset all keys if the day has rolled over."""
         today = date.today()
         if today != self._last_reset:
-            self.reset_daily()
             self._last_reset = today
+            self.reset_daily()
 
     # ------------------------------------------------------------------
     def get_next_key(self, provider: str) -> str | None:
@@ -121,10 +353,12 @@ class KeyManager:
             for offset in range(total):
                 idx = (start + offset) % total
                 entry = entries[idx]
-                if not entry["is_exhausted"]:
+                if not entry["is_exhausted"] and not self._over_quota(provider, entry):
                     entry["requests_today"] += 1
                     entry["last_used"] = datetime.now(timezone.utc).isoformat()
                     self._current_index[provider] = (idx + 1) % total
+                    self._mark_changed()
+                    self.checkpoint()
                     return entry["key"]
             return None
         except Exception:
@@ -138,9 +372,18 @@ class KeyManager:
             if 0 <= key_index < len(entries):
                 entries[key_index]["is_exhausted"] = True
                 entries[key_index]["exhausted_at"] = datetime.now(timezone.utc).isoformat()
+                self._mark_changed(entries[key_index])
+                self.checkpoint(force=True)
         except Exception:
             pass
 
+    def get_key_index(self, provider: str, key_value: str) -> int | None:
+        """Position of a key in the provider's rotation (for usage logging)."""
+        for idx, entry in enumerate(self.keys.get(provider, [])):
+            if entry["key"] == key_value:
+                return idx
+        return None
+
     def mark_exhausted_by_value(self, provider: str, key_value: str):
         """Mark a key as exhausted by its actual string value."""
         try:
@@ -148,6 +391,8 @@ class KeyManager:
                 if entry["key"] == key_value:
                     entry["is_exhausted"] = True
                     entry["exhausted_at"] = datetime.now(timezone.utc).isoformat()
+                    self._mark_changed(entry)
+                    self.checkpoint(force=True)
                     break
         except Exception:
             pass
@@ -159,7 +404,11 @@ class KeyManager:
             for entry in provider_entries:
                 entry["is_exhausted"] = False
                 entry["requests_today"] = 0
+                entry["tokens_today"] = 0
                 entry["exhausted_at"] = None
+                self._mark_changed(entry)
+        self._restored = {}
+        self.checkpoint(force=True)
 
     # ------------------------------------------------------------------
     def get_key_stats(self) -> dict:
@@ -170,10 +419,13 @@ class KeyManager:
                 "total_keys": len(entries),
                 "active_keys": sum(1 for e in entries if not e["is_exhausted"]),
                 "total_requests_today": sum(e["requests_today"] for e in entries),
+                "total_tokens_today": sum(e.get("tokens_today", 0) for e in entries),
+                "token_quota_per_key": PROVIDER_TOKEN_QUOTA.get(provider),
                 "keys": [
                     {
                         "index": i,
                         "requests_today": e["requests_today"],
+                        "tokens_today": e.get("tokens_today", 0),
                         "is_exhausted": e["is_exhausted"],
                         "last_used": e["last_used"],
                     }
@@ -183,6 +435,40 @@ class KeyManager:
         return stats
 
     # ------------------------------------------------------------------
+    def _over_quota(self, provider: str, entry: dict) -> bool:
+        quota = PROVIDER_TOKEN_QUOTA.get(provider)
+        return quota is not None and entry.get("tokens_today", 0) >= quota
+
+    def record_tokens(self, provider: str, key_value: str, tokens: int):
+        """Add tokens spent on a key to its daily total (counts toward PROVIDER_TOKEN_QUOTA)."""
+        if not tokens:
+            return
+        for entry in self.keys.get(provider, []):
+            if entry["key"] == key_value:
+                entry["tokens_today"] = entry.get("tokens_today", 0) + int(tokens)
+                self._mark_changed()
+                self.checkpoint()
+                return
+
+    def remaining_token_share(self, provider: str) -> float | None:
+        """Fraction of the provider's daily token quota left across its usable
+        keys, or None when the provider has no quota configured."""
+        quota = PROVIDER_TOKEN_QUOTA.get(provider)
+        entries = [e for e in self.keys.get(provider, []) if not e["is_exhausted"]]
+        if not quota or not entries:
+            return None
+        left = sum(max(0, quota - e.get("tokens_today", 0)) for e in entries)
+        return left / (quota * len(entries))
+
+    def peek_key(self, provider: str) -> str | None:
+        """A usable key for *provider* without advancing the rotation or
+        counting a request (for health probes)."""
+        self._maybe_reset()
+        for entry in self.keys.get(provider, []):
+            if not entry["is_exhausted"]:
+                return entry["key"]
+        return None
+
     def get_active_key_count(self, provider: str) -> int:
         """How many non-exhausted keys remain for a provider."""
         try:
@@ -77,7 +77,8 @@ class LearningService:
                     '{"topic": "Machine Learning", "tags": ["gradient descent", "math"]}'
                     f"\nNOTE: {n.content}"
                 )
-                resp = await llm_router.route([{"role": "user", "content": prompt}])
+                resp = await llm_router.route([{"role": "user", "content": prompt}],
+                                              task="classify", feature="learning_service.create_note")
                 text_resp = resp.get("text", "")
                 try:
                     start = text_resp.find("{")
@@ -158,7 +159,8 @@ class LearningService:
                 f"\n\nNOTES:\n{content}"
             )
             
-            resp = await llm_router.route([{"role": "user", "content": prompt}], cache_ttl=86400)
+            resp = await llm_router.route([{"role": "user", "content": prompt}],
+                                          cache_ttl=86400, feature="learning_service.generate_quiz")
             text_resp = resp.get("text", "")
             start = text_resp.find("[")
             end = text_resp.rfind("}") + 1
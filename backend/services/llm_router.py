@@ -4,23 +4,36 @@ Routes AI requests to the best available provider with automatic fallback,
 key rotation, caching, response-time tracking, and per-provider scoring.
 """
 
+import asyncio
+import hashlib
+import json
 import time
+from collections import deque
 from datetime import datetime, timezone
 
+from config import (
+    SHARED_KEY_POLL_INTERVAL, PROVIDER_CONCURRENCY, PROVIDER_CONCURRENCY_DEFAULT,
+    PROVIDER_PROBE_INTERVAL,
+)
+from services.admission_control import ProviderGate, PRIORITIES
 from services.key_manager import KeyManager
 from services.cache_service import ResponseCache
+from services.telemetry_service import UsageTelemetry
+from services.prompt_builder import estimate_tokens
 from models.api_usage import APIUsage
 
-# Provider imports — each exposes an async chat(messages, model) method
-from providers.groq_provider import GroqProvider
-from providers.gemini_provider import GeminiProvider
-from providers.cohere_provider import CohereProvider
-from providers.openrouter_provider import OpenRouterProvider
-from providers.huggingface_provider import HuggingFaceProvider
-from providers.cloudflare_provider import CloudflareProvider
-from providers.nvidia_provider import NVIDIAProvider
-from providers.sambanova_provider import SambaNovaProvider
-from providers.cerebras_provider import CerebrasProvider
+# Provider imports — each exposes an async chat(messages, model, timeout) method
+from providers.base import DEFAULT_TIMEOUT
+from providers.groq_provider import GroqProvider, GROQ_MODELS
+from providers.gemini_provider import GeminiProvider, GEMINI_MODELS
+from providers.cohere_provider import CohereProvider, COHERE_MODELS
+from providers.openrouter_provider import OpenRouterProvider, OPENROUTER_MODELS
+from providers.huggingface_provider import HuggingFaceProvider, HF_MODELS
+from providers.cloudflare_provider import CloudflareProvider, CF_MODELS
+from providers.nvidia_provider import NVIDIAProvider, NVIDIA_MODELS
+from providers.sambanova_provider import SambaNovaProvider, SAMBANOVA_MODELS
+from providers.cerebras_provider import CerebrasProvider, CEREBRAS_MODELS
+from providers.mock_provider import MockProvider, MOCK_MODELS
 
 
 # Default priority order (lower = tried first)
@@ -34,8 +47,92 @@ _DEFAULT_PROVIDERS = [
     {"name": "cohere",      "provider_class": CohereProvider,      "priority": 7},
     {"name": "openrouter",  "provider_class": OpenRouterProvider,  "priority": 8},
     {"name": "huggingface", "provider_class": HuggingFaceProvider, "priority": 9},
+    {"name": "mock",        "provider_class": MockProvider,        "priority": 10},  # only with MOCK_API_KEYS
 ]
 
+# Model each provider uses when none is requested
+_DEFAULT_MODELS = {
+    "groq":        GROQ_MODELS[0],
+    "cerebras":    CEREBRAS_MODELS[0],
+    "sambanova":   SAMBANOVA_MODELS[0],
+    "gemini":      GEMINI_MODELS[0],
+    "nvidia":      NVIDIA_MODELS[0],
+    "cloudflare":  CF_MODELS[0],
+    "cohere":      COHERE_MODELS[0],
+    "openrouter":  OPENROUTER_MODELS[0],
+    "huggingface": HF_MODELS["mistral"],
+    "mock":        MOCK_MODELS[0],
+}
+
+# Smallest model per provider that still follows JSON/label instructions reliably
+_SMALL_MODELS = {
+    "groq":        "llama-3.1-8b-instant",
+    "cerebras":    "llama3.1-8b",
+    "sambanova":   "Meta-Llama-3.1-8B-Instruct",
+    "gemini":      "gemini-1.5-flash",
+    "nvidia":      "meta/llama-3.1-8b-instruct",
+    "cloudflare":  "@cf/meta/llama-3.1-8b-instruct",
+    "cohere":      "command-r",
+    "openrouter":  "mistralai/mistral-small-3.1-24b-instruct:free",
+    "huggingface": "phi",
+    "mock":        "mock-small",
+}
+
+# Task classes declared by call sites. "models" maps provider → model (missing
+# → provider default); "order", when set, replaces provider priority so the
+# fastest hosts of small models are tried first; "priority" is the default
+# admission priority when providers are saturated.
+TASK_POLICIES = {
+    "extract": {
+        "models": _SMALL_MODELS,
+        "order": ["cerebras", "groq", "sambanova", "gemini", "nvidia", "cloudflare", "cohere", "openrouter", "huggingface", "mock"],
+        "priority": "background",
+    },
+    "classify": {
+        "models": _SMALL_MODELS,
+        "order": ["cerebras", "groq", "sambanova", "gemini", "nvidia", "cloudflare", "cohere", "openrouter", "huggingface", "mock"],
+        "priority": "background",
+    },
+    "chat": {"models": {}, "order": None, "priority": "interactive"},
+    "long_form": {
+        "models": {
+            "groq":      "llama-3.3-70b-versatile",
+            "cerebras":  "llama3.1-70b",
+            "sambanova": "Meta-Llama-3.1-70B-Instruct",
+        },
+        "order": None,
+        "priority": "normal",
+    },
+}
+
+DEFAULT_TASK = "chat"
+
+# Longest a request may sit in a provider queue before it is shed, by priority
+_MAX_QUEUE_WAIT = {"interactive": 15.0, "normal": 30.0, "background": 60.0}
+
+# Adaptive per-attempt timeouts: p95 of recent latencies × factor, clamped.
+# Latencies are kept per (provider, model) so fast 8B extraction calls don't
+# shorten the timeout of 70B chat calls on the same provider.
+_LATENCY_WINDOW = 50
+_MIN_LATENCY_SAMPLES = 5
+_TIMEOUT_FACTOR = 1.5
+_MIN_ATTEMPT_TIMEOUT = 3.0
+
+# Background probe results (services/provider_prober.py) count for a few intervals
+_PROBE_FRESHNESS = 3 * PROVIDER_PROBE_INTERVAL
+_PROBE_DOWN_PENALTY = 10
+
+# Score added as a provider's daily token quota (PROVIDER_TOKEN_QUOTA) runs out
+_QUOTA_PENALTY = 5
+
+
+def _estimate_usage(messages: list, text: str | None) -> dict:
+    """Token counts for providers that don't report usage."""
+    prompt = sum(estimate_tokens(m.get("content")) + 4 for m in messages)
+    completion = estimate_tokens(text)
+    return {"prompt_tokens": prompt, "completion_tokens": completion,
+            "total_tokens": prompt + completion, "estimated": True}
+
 
 class LLMRouter:
     """Route AI requests to the best available LLM provider."""
@@ -43,6 +140,7 @@ class LLMRouter:
     def __init__(self, db_session=None):
         self.key_manager = key_manager # reference to the global singleton
         self.cache = ResponseCache()
+        self.telemetry = UsageTelemetry()
         self.db_session = db_session
 
         # Try to load existing keys from the database on startup
@@ -57,50 +155,152 @@ class LLMRouter:
 
         # Build mutable provider registry
         self.providers: list[dict] = []
+        self.sync_providers()
+
+        # Shared-key polling; 0 → the first route() call triggers a refresh
+        self._last_key_refresh: float = 0.0
+        self._key_refresh_task: asyncio.Task | None = None
+
+        # Request hash → task of the identical request currently in flight
+        self._inflight: dict[str, asyncio.Future] = {}
+        self._coalesced: int = 0
+
+    # ------------------------------------------------------------------
+    def sync_providers(self) -> list[str]:
+        """Register every provider that has gained keys since the last sync.
+        Existing entries (and their runtime stats) are left untouched."""
+        known = {entry["name"] for entry in self.providers}
+        added = []
         for p in _DEFAULT_PROVIDERS:
             # Only include providers that have at least one key configured
-            if self.key_manager.keys.get(p["name"]):
-                self.providers.append({
-                    "name": p["name"],
-                    "provider_class": p["provider_class"],
-                    "priority": p["priority"],
-                    "failure_count": 0,
-                    "avg_response_time": 0.0,
-                    "total_calls": 0,
-                    "last_used": None,
-                })
+            if p["name"] in known or not self.key_manager.keys.get(p["name"]):
+                continue
+            self.providers.append({
+                "name": p["name"],
+                "provider_class": p["provider_class"],
+                "priority": p["priority"],
+                "failure_count": 0,
+                "avg_response_time": 0.0,
+                "total_calls": 0,
+                "last_used": None,
+                "last_ok": None,      # monotonic time of the last successful call
+                "probe": None,        # latest background probe, see services/provider_prober.py
+                "latencies": {},      # model → deque of recent successful call times
+                "gate": ProviderGate(
+                    p["name"], PROVIDER_CONCURRENCY.get(p["name"], PROVIDER_CONCURRENCY_DEFAULT)
+                ),
+            })
+            added.append(p["name"])
+        return added
+
+    def refresh_keys(self, shared_rows: list | None = None) -> int:
+        """Merge shared keys into the live pool and enable any newly keyed providers.
+        With shared_rows=None the shared_keys table is polled (blocking)."""
+        added = self.key_manager.refresh_shared_keys(rows=shared_rows)
+        if shared_rows is None:
+            self._last_key_refresh = time.time()
+        self.sync_providers()
+        return added
+
+    def _maybe_refresh_keys(self):
+        """Kick off a background shared-key poll once per SHARED_KEY_POLL_INTERVAL."""
+        if time.time() - self._last_key_refresh < SHARED_KEY_POLL_INTERVAL:
+            return
+        if self._key_refresh_task is not None and not self._key_refresh_task.done():
+            return
+        self._last_key_refresh = time.time()
+        try:
+            self._key_refresh_task = asyncio.create_task(asyncio.to_thread(self.refresh_keys))
+        except RuntimeError:
+            pass  # no running loop
 
     # ------------------------------------------------------------------
-    def _score(self, entry: dict) -> float:
-        """Score a provider — lower is better."""
+    def _score(self, entry: dict, task: str = DEFAULT_TASK) -> float:
+        """Score a provider for a task class — lower is better."""
+        priority = entry["priority"]
+        order = TASK_POLICIES[task]["order"]
+        if order:
+            priority = order.index(entry["name"]) + 1 if entry["name"] in order else len(order) + priority
         return (
-            entry["priority"]
+            priority
             + (entry["failure_count"] * 5)
             + (entry["avg_response_time"] * 0.1)
+            + self._probe_penalty(entry)
+            + self._quota_penalty(entry)
         )
 
-    # ------------------------------------------------------------------
-    def _log_usage(self, provider: str, model: str | None, response_time: float,
-                   success: bool, error: str | None = None):
-        """Persist an API call record to the database."""
-        try:
-            if self.db_session is None:
-                return
-            record = APIUsage(
-                provider=provider,
-                model=model,
-                response_time=response_time,
-                success=success,
-                error=error,
-                created_at=datetime.now(timezone.utc),
-            )
-            self.db_session.add(record)
-            self.db_session.commit()
-        except Exception:
-            try:
-                self.db_session.rollback()
-            except Exception:
-                pass
+    def _quota_penalty(self, entry: dict) -> float:
+        """Steer traffic away from providers whose daily token quota is nearly spent."""
+        share = self.key_manager.remaining_token_share(entry["name"])
+        return 0.0 if share is None else (1.0 - share) * _QUOTA_PENALTY
+
+    @staticmethod
+    def _probe_penalty(entry: dict) -> float:
+        """Recent background probe: a failed one pushes the provider down the
+        order; a successful one stands in for latency until real calls exist."""
+        probe = entry.get("probe")
+        if not probe or time.monotonic() - probe["at"] > _PROBE_FRESHNESS:
+            return 0.0
+        if not probe["ok"]:
+            return _PROBE_DOWN_PENALTY
+        return 0.0 if entry["total_calls"] else probe["latency"] * 0.1
+
+    @staticmethod
+    def _model_for(provider_name: str, task: str, model: str | None) -> str | None:
+        """Explicit model wins; otherwise the task policy's pick (None → provider default)."""
+        return model or TASK_POLICIES[task]["models"].get(provider_name)
+
+    def expected_model(self, task: str = DEFAULT_TASK, preferred_provider: str | None = None,
+                       model: str | None = None) -> str | None:
+        """Model the first candidate provider would be called with, so prompts
+        can be sized for it before routing."""
+        if task not in TASK_POLICIES:
+            task = DEFAULT_TASK
+        ordered = self._ordered_providers(task, preferred_provider)
+        if not ordered:
+            return model
+        name = ordered[0]["name"]
+        return self._model_for(name, task, model) or _DEFAULT_MODELS.get(name)
+
+    @staticmethod
+    def _latency_key(provider_name: str, provider_model: str | None) -> str:
+        return provider_model or _DEFAULT_MODELS.get(provider_name) or ""
+
+    def _latency_percentile(self, entry: dict, provider_model: str | None, pct: float) -> float | None:
+        window = entry["latencies"].get(self._latency_key(entry["name"], provider_model))
+        samples = sorted(window or ())
+        if len(samples) < _MIN_LATENCY_SAMPLES:
+            return None
+        return samples[min(len(samples) - 1, int(pct * len(samples)))]
+
+    def _attempt_timeout(self, entry: dict, provider_model: str | None, remaining: float | None,
+                         last_candidate: bool) -> float:
+        """Per-attempt timeout from the model's observed latency, capped by this
+        attempt's share of the remaining deadline (the last candidate gets all of it)."""
+        p95 = self._latency_percentile(entry, provider_model, 0.95)
+        timeout = DEFAULT_TIMEOUT if p95 is None else min(
+            DEFAULT_TIMEOUT, max(_MIN_ATTEMPT_TIMEOUT, p95 * _TIMEOUT_FACTOR + 1.0)
+        )
+        if remaining is None:
+            return timeout
+        share = remaining if last_candidate else max(remaining * 0.6, _MIN_ATTEMPT_TIMEOUT)
+        return max(0.0, min(timeout, share, remaining))
+
+    def _can_answer_in(self, entry: dict, provider_model: str | None, remaining: float | None) -> bool:
+        """False when the model's median latency on this provider already exceeds what's left."""
+        if remaining is None:
+            return True
+        p50 = self._latency_percentile(entry, provider_model, 0.5)
+        return remaining > (p50 if p50 is not None else 1.0)
+
+    def _ordered_providers(self, task: str, preferred_provider: str | None = None) -> list[dict]:
+        """Providers sorted by score for the task, with the preferred one first."""
+        ordered = sorted(self.providers, key=lambda e: self._score(e, task))
+        if preferred_provider:
+            preferred = [p for p in ordered if p["name"] == preferred_provider]
+            others = [p for p in ordered if p["name"] != preferred_provider]
+            ordered = preferred + others
+        return ordered
 
     # ------------------------------------------------------------------
     async def route(
@@ -109,6 +309,11 @@ class LLMRouter:
         preferred_provider: str | None = None,
         model: str | None = None,
         cache_ttl: int = 0,
+        task: str = DEFAULT_TASK,
+        priority: str | None = None,
+        deadline: float | None = None,
+        user_id: int | None = None,
+        feature: str | None = None,
     ) -> dict:
         """Route a chat request through available providers with fallback.
 
@@ -122,11 +327,43 @@ class LLMRouter:
             Model override passed to the provider.
         cache_ttl : int
             Seconds to cache the response (0 = no cache).
+        task : str
+            Task class of the call site — "extract", "classify", "chat" or
+            "long_form". Selects the model tier and provider order.
+        priority : str, optional
+            Admission priority ("interactive", "normal", "background");
+            defaults to the task class's priority.
+        deadline : float, optional
+            Total seconds the caller will wait. Split across provider attempts;
+            when no remaining provider can plausibly answer in time the result
+            has status "error" and error "Deadline exceeded".
+        user_id : int, optional
+            User the tokens are attributed to (None → "system").
+        feature : str, optional
+            Feature label for token accounting (e.g. "task_service.ai_create");
+            defaults to the task name.
 
         Returns
         -------
-        dict  with keys: text, provider, model, status, error, response_time, cached
+        dict  with keys: text, provider, model, status, error, response_time, cached,
+              usage ({prompt_tokens, completion_tokens, total_tokens}, estimated=True
+              when the provider didn't report it),
+              attempts (provider calls made; 0 for a cache hit, >1 means fallback).
+              Concurrent identical requests from the same user, at the same
+              priority and cache setting, share one provider call; the callers
+              that joined an in-flight request also get coalesced=True. A caller
+              whose leader ran out of its (shorter) deadline or was shed retries
+              on its own budget.
         """
+        started = time.monotonic()
+        deadline_at = started + deadline if deadline is not None else None
+        if task not in TASK_POLICIES:
+            task = DEFAULT_TASK
+        if priority not in PRIORITIES:
+            priority = TASK_POLICIES[task]["priority"]
+        feature = feature or task
+        cache_model = f"{task}:{model or ''}"
+
         # --- 1. Cache check ----
         if cache_ttl > 0:
             system_prompt = ""
@@ -136,108 +373,316 @@ class LLMRouter:
                     system_prompt = m.get("content", "")
                 elif m.get("role") == "user":
                     user_message = m.get("content", "")
-            cached = self.cache.get(system_prompt, user_message, model or "")
+            cached = self.cache.get(system_prompt, user_message, cache_model)
             if cached is not None:
-                return {**cached, "cached": True}
+                return {**cached, "cached": True, "attempts": 0}
+
+        # --- 2. Coalesce with an identical request already in flight ---
+        request_key = self._request_key(messages, task, model, preferred_provider,
+                                        user_id, priority, cache_ttl)
+        shared = self._inflight.get(request_key)
+        if shared is None:
+            # The work runs as its own task so a caller going away doesn't cancel it for the others
+            shared = asyncio.ensure_future(self._dispatch(
+                messages, preferred_provider, model, cache_ttl, task, priority,
+                started, deadline_at, cache_model, user_id, feature,
+            ))
+            self._inflight[request_key] = shared
+            shared.add_done_callback(lambda _t: self._inflight.pop(request_key, None))
+            leader = True
+        else:
+            self._coalesced += 1
+            leader = False
 
-        # --- 2. Sort providers by score ---
-        ordered = sorted(self.providers, key=self._score)
+        try:
+            remaining = None if deadline_at is None else max(0.0, deadline_at - time.monotonic())
+            result = await asyncio.wait_for(asyncio.shield(shared), remaining)
+        except asyncio.TimeoutError:
+            return self._error_result("Deadline exceeded", 0)
+        if leader:
+            return result
+        if self._leader_ran_out(result) and (deadline_at is None or deadline_at > time.monotonic()):
+            # The leader's budget or admission failed, not the request; try on ours
+            return await self._dispatch(
+                messages, preferred_provider, model, cache_ttl, task, priority,
+                started, deadline_at, cache_model, user_id, feature,
+            )
+        return {**result, "coalesced": True}
 
-        # --- 3. Preferred provider first ---
-        if preferred_provider:
-            preferred = [p for p in ordered if p["name"] == preferred_provider]
-            others = [p for p in ordered if p["name"] != preferred_provider]
-            ordered = preferred + others
+    @staticmethod
+    def _leader_ran_out(result: dict) -> bool:
+        error = str(result.get("error") or "")
+        return result.get("status") != "success" and (
+            error == "Deadline exceeded" or "request shed" in error
+        )
 
-        # --- 4. Try each provider ---
-        last_error = "All providers failed"
-        for entry in ordered:
-            provider_name = entry["name"]
+    @staticmethod
+    def _request_key(messages: list, task: str, model: str | None, preferred_provider: str | None,
+                     user_id: int | None = None, priority: str | None = None, cache_ttl: int = 0) -> str:
+        """Canonical hash of everything that determines the upstream call and
+        who it is made (and charged) for."""
+        canonical = json.dumps(
+            [task, model or "", preferred_provider or "", user_id, priority or "", cache_ttl,
+             [[m.get("role", ""), (m.get("content") or "").strip()] for m in messages]],
+            ensure_ascii=False, separators=(",", ":"),
+        )
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
 
-            # Try every available key for this provider
-            while True:
-                api_key = self.key_manager.get_next_key(provider_name)
-                if api_key is None:
-                    break  # all keys exhausted for this provider
+    async def _dispatch(self, messages: list, preferred_provider: str | None, model: str | None,
+                        cache_ttl: int, task: str, priority: str, started: float,
+                        deadline_at: float | None, cache_model: str,
+                        user_id: int | None = None, feature: str | None = None) -> dict:
+        """Provider selection, admission and fallback for one (coalesced) request."""
+        # Pick up keys shared since the last poll (non-blocking)
+        self._maybe_refresh_keys()
 
-                try:
-                    provider_instance = entry["provider_class"](api_key=api_key)
-                    t0 = time.time()
-                    result = await provider_instance.chat(messages, model)
-                    elapsed = round(time.time() - t0, 3)
+        # --- 3. Sort providers by score, preferred provider first ---
+        ordered = self._ordered_providers(task, preferred_provider)
+
+        # --- 4. Try each provider (through its admission gate) ---
+        last_error = "All providers failed"
+        admit_by = started + _MAX_QUEUE_WAIT[priority]
+        deadline_skipped = False
+        attempts = 0
+        for position, entry in enumerate(ordered):
+            provider_name = entry["name"]
+            provider_model = self._model_for(provider_name, task, model)
+
+            remaining = deadline_at - time.monotonic() if deadline_at is not None else None
+            if not self._can_answer_in(entry, provider_model, remaining):
+                deadline_skipped = True
+                continue  # too slow for what's left; a faster provider may still fit
+
+            gate = entry["gate"]
+            gate_deadline = admit_by if deadline_at is None else min(admit_by, deadline_at)
+            if not await gate.acquire(priority, gate_deadline, entry["avg_response_time"] or 2.0):
+                last_error = f"{provider_name}: overloaded, request shed"
+                continue  # try a less busy provider
+            try:
+                result, error, tried = await self._try_provider(
+                    entry, messages, provider_model, deadline_at,
+                    last_candidate=position == len(ordered) - 1,
+                    user_id=user_id, feature=feature,
+                )
+            finally:
+                gate.release()
+            attempts += tried
+
+            if result is None:
+                last_error = error or last_error
+                continue
+
+            # Cache if requested
+            if cache_ttl > 0:
+                system_prompt = ""
+                user_message = ""
+                for m in messages:
+                    if m.get("role") == "system":
+                        system_prompt = m.get("content", "")
+                    elif m.get("role") == "user":
+                        user_message = m.get("content", "")
+                self.cache.set(
+                    system_prompt, user_message, cache_model,
+                    result, cache_ttl,
+                )
+            return {**result, "attempts": attempts}
 
-                    if result.get("status") == "success":
-                        # Update running averages
-                        entry["total_calls"] += 1
-                        entry["avg_response_time"] = round(
-                            (entry["avg_response_time"] * (entry["total_calls"] - 1) + elapsed)
-                            / entry["total_calls"],
-                            3,
-                        )
-                        entry["failure_count"] = max(0, entry["failure_count"] - 1)
-                        entry["last_used"] = datetime.now(timezone.utc).isoformat()
-
-                        self._log_usage(provider_name, result.get("model"), elapsed, True)
-
-                        # Cache if requested
-                        if cache_ttl > 0:
-                            system_prompt = ""
-                            user_message = ""
-                            for m in messages:
-                                if m.get("role") == "system":
-                                    system_prompt = m.get("content", "")
-                                elif m.get("role") == "user":
-                                    user_message = m.get("content", "")
-                            self.cache.set(
-                                system_prompt, user_message,
-                                result.get("model", model or ""),
-                                result, cache_ttl,
-                            )
-
-                        return {
-                            "text": result.get("text", ""),
-                            "provider": result.get("provider", provider_name),
-                            "model": result.get("model", model),
-                            "status": "success",
-                            "error": None,
-                            "response_time": elapsed,
-                            "cached": False,
-                        }
-
-                    # Rate-limited (429)
-                    error_msg = result.get("error", "")
-                    if "429" in str(error_msg) or "rate" in str(error_msg).lower():
-                        self.key_manager.mark_exhausted_by_value(provider_name, api_key)
-                        continue  # try next key for same provider
-
-                    # Other error — move on to next provider
-                    entry["failure_count"] += 1
-                    last_error = error_msg or f"{provider_name} returned an error"
-                    self._log_usage(provider_name, model, 0, False, last_error)
-                    break
-
-                except Exception as exc:
-                    entry["failure_count"] += 1
-                    last_error = f"{provider_name}: {exc}"
-                    self._log_usage(provider_name, model, 0, False, str(exc))
-                    break  # move to next provider
+        if deadline_at is not None and (deadline_skipped or time.monotonic() >= deadline_at):
+            last_error = "Deadline exceeded"
+        return self._error_result(last_error, attempts)
 
+    @staticmethod
+    def _error_result(error: str, attempts: int) -> dict:
         return {
-            "text": f"I'm sorry, I couldn't process that right now. {last_error}",
+            "text": f"I'm sorry, I couldn't process that right now. {error}",
             "provider": None,
             "model": None,
             "status": "error",
-            "error": last_error,
+            "error": error,
             "response_time": 0,
             "cached": False,
+            "attempts": attempts,
         }
 
+    # ------------------------------------------------------------------
+    async def _try_provider(self, entry: dict, messages: list, provider_model: str | None,
+                            deadline_at: float | None = None,
+                            last_candidate: bool = False, user_id: int | None = None,
+                            feature: str | None = None) -> tuple[dict | None, str | None, int]:
+        """Try every available key of one provider within the deadline.
+        Returns (result, None, attempts) on success or (None, last_error, attempts)."""
+        provider_name = entry["name"]
+        last_error = None
+        attempts = 0
+        while True:
+            remaining = deadline_at - time.monotonic() if deadline_at is not None else None
+            if not self._can_answer_in(entry, provider_model, remaining):
+                return None, "Deadline exceeded", attempts
+
+            api_key = self.key_manager.get_next_key(provider_name)
+            if api_key is None:
+                return None, last_error, attempts  # all keys exhausted for this provider
+
+            attempts += 1
+
+            key_index = self.key_manager.get_key_index(provider_name, api_key)
+            attempt_timeout = self._attempt_timeout(entry, provider_model, remaining, last_candidate)
+            t0 = time.time()
+            try:
+                provider_instance = entry["provider_class"](api_key=api_key)
+                # Providers enforce the timeout themselves; wait_for is the backstop
+                result = await asyncio.wait_for(
+                    provider_instance.chat(messages, provider_model, timeout=attempt_timeout),
+                    attempt_timeout + 0.5,
+                )
+                elapsed = round(time.time() - t0, 3)
+
+                if result.get("status") == "success":
+                    usage = result.get("usage") or _estimate_usage(messages, result.get("text"))
+                    self._record_success(entry, provider_model, elapsed)
+                    self.key_manager.record_tokens(provider_name, api_key, usage["total_tokens"])
+                    self.telemetry.record(provider_name, result.get("model"), elapsed, True,
+                                          key_index=key_index, usage=usage,
+                                          user_id=user_id, feature=feature)
+                    return {
+                        "text": result.get("text", ""),
+                        "provider": result.get("provider", provider_name),
+                        "model": result.get("model", provider_model),
+                        "status": "success",
+                        "error": None,
+                        "response_time": elapsed,
+                        "cached": False,
+                        "usage": usage,
+                    }, None, attempts
+
+                # Rate-limited (429)
+                error_msg = result.get("error", "")
+                self.telemetry.record(provider_name, result.get("model", provider_model), elapsed, False,
+                                      key_index=key_index,
+                                      error=error_msg or f"{provider_name} returned an error")
+                if "429" in str(error_msg) or "rate" in str(error_msg).lower():
+                    self.key_manager.mark_exhausted_by_value(provider_name, api_key)
+                    last_error = f"{provider_name}: rate limited"
+                    continue  # try next key for same provider
+
+                # Other error — move on to next provider
+                entry["failure_count"] += 1
+                return None, error_msg or f"{provider_name} returned an error", attempts
+
+            except Exception as exc:
+                entry["failure_count"] += 1
+                self.telemetry.record(provider_name, provider_model, round(time.time() - t0, 3), False,
+                                      key_index=key_index, error=exc)
+                reason = "Timeout" if isinstance(exc, asyncio.TimeoutError) else exc
+                return None, f"{provider_name}: {reason}", attempts  # move to next provider
+
+    def _record_success(self, entry: dict, provider_model: str | None, elapsed: float):
+        """Update a provider's running averages after a successful call."""
+        entry["total_calls"] += 1
+        entry["avg_response_time"] = round(
+            (entry["avg_response_time"] * (entry["total_calls"] - 1) + elapsed)
+            / entry["total_calls"],
+            3,
+        )
+        entry["failure_count"] = max(0, entry["failure_count"] - 1)
+        entry["last_used"] = datetime.now(timezone.utc).isoformat()
+        entry["last_ok"] = time.monotonic()
+        key = self._latency_key(entry["name"], provider_model)
+        entry["latencies"].setdefault(key, deque(maxlen=_LATENCY_WINDOW)).append(elapsed)
+
+    # ------------------------------------------------------------------
+    async def stream(
+        self,
+        messages: list,
+        preferred_provider: str | None = None,
+        model: str | None = None,
+        task: str = DEFAULT_TASK,
+        priority: str | None = None,
+        user_id: int | None = None,
+        feature: str | None = None,
+    ):
+        """Yield reply text chunks from the first provider that starts answering.
+
+        Providers with a native stream() are streamed; others yield their whole
+        reply as one chunk. Fallback to the next provider/key only happens
+        before the first chunk is sent — a failure mid-stream is raised.
+        Streamed token usage is estimated from the text.
+        """
+        if task not in TASK_POLICIES:
+            task = DEFAULT_TASK
+        if priority not in PRIORITIES:
+            priority = TASK_POLICIES[task]["priority"]
+        feature = feature or task
+        self._maybe_refresh_keys()
+
+        last_error = "All providers failed"
+        admit_by = time.monotonic() + _MAX_QUEUE_WAIT[priority]
+        for entry in self._ordered_providers(task, preferred_provider):
+            provider_name = entry["name"]
+            provider_model = self._model_for(provider_name, task, model)
+            gate = entry["gate"]
+            if not await gate.acquire(priority, admit_by, entry["avg_response_time"] or 2.0):
+                last_error = f"{provider_name}: overloaded, request shed"
+                continue
+            try:
+                if not hasattr(entry["provider_class"], "stream"):
+                    result, error, _ = await self._try_provider(entry, messages, provider_model,
+                                                                user_id=user_id, feature=feature)
+                    if result is None:
+                        last_error = error or last_error
+                        continue
+                    yield result["text"]
+                    return
+
+                while True:
+                    api_key = self.key_manager.get_next_key(provider_name)
+                    if api_key is None:
+                        break  # all keys exhausted for this provider
+                    key_index = self.key_manager.get_key_index(provider_name, api_key)
+                    provider_instance = entry["provider_class"](api_key=api_key)
+                    t0 = time.time()
+                    sent = []
+                    try:
+                        async for chunk in provider_instance.stream(
+                            messages, provider_model, timeout=self._attempt_timeout(entry, provider_model, None, False)
+                        ):
+                            sent.append(chunk)
+                            yield chunk
+                    except Exception as exc:
+                        if sent:
+                            raise
+                        elapsed = round(time.time() - t0, 3)
+                        self.telemetry.record(provider_name, provider_model, elapsed, False,
+                                              key_index=key_index, error=exc)
+                        if "429" in str(exc) or "rate" in str(exc).lower():
+                            self.key_manager.mark_exhausted_by_value(provider_name, api_key)
+                            last_error = f"{provider_name}: rate limited"
+                            continue  # next key, same provider
+                        entry["failure_count"] += 1
+                        reason = "Timeout" if isinstance(exc, asyncio.TimeoutError) else exc
+                        last_error = f"{provider_name}: {reason}"
+                        break  # next provider
+
+                    elapsed = round(time.time() - t0, 3)
+                    usage = _estimate_usage(messages, "".join(sent))
+                    self._record_success(entry, provider_model, elapsed)
+                    self.key_manager.record_tokens(provider_name, api_key, usage["total_tokens"])
+                    self.telemetry.record(provider_name, provider_model, elapsed, True,
+                                          key_index=key_index, usage=usage,
+                                          user_id=user_id, feature=feature)
+                    return
+            finally:
+                gate.release()
+
+        raise RuntimeError(last_error)
+
     # ------------------------------------------------------------------
     def get_stats(self) -> dict:
-        """Aggregate API usage stats from the database."""
+        """Aggregate API usage stats from the database, or from in-process
+        telemetry when no SQLAlchemy session is attached."""
         try:
             if self.db_session is None:
-                return {}
+                return self.telemetry.get_summary()["providers"]
             from sqlalchemy import func
             rows = (
                 self.db_session.query(
@@ -263,6 +708,11 @@ class LLMRouter:
         except Exception:
             return {}
 
+    # ------------------------------------------------------------------
+    def get_token_usage(self, by: str = "feature", limit: int | None = None) -> list[dict]:
+        """Token totals since process start grouped by user, provider, key or feature."""
+        return self.telemetry.get_token_usage(by=by, limit=limit)
+
     # ------------------------------------------------------------------
     def get_provider_status(self) -> list:
         """Return current runtime status of every provider."""
@@ -275,6 +725,8 @@ class LLMRouter:
                 "avg_response_time": entry["avg_response_time"],
                 "last_used": entry["last_used"],
                 "priority": entry["priority"],
+                "admission": entry["gate"].get_stats(),
+                "probe": entry.get("probe"),
             })
         return result
 
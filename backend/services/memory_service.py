@@ -2,15 +2,179 @@
 memory_service.py — AI Memory & Context Builder
 Manages Conversation history, MemoryFacts extraction, and constructs context payloads
 for LLM prompts using Supabase REST API instead of SQLAlchemy.
+Facts (per user) and recent history (per session) are cached in-process and
+kept current by this service's own writes, so a steady-state chat turn reads
+nothing from Supabase. Each cached user also has a BM25 fact index, so only
+the facts relevant to the current message are put in the prompt. Exchanges
+from earlier sessions are recalled through a per-user vector index.
 """
 
+import asyncio
 import json
-from datetime import datetime, timezone
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
 
-from supabase_rest import sb_select, sb_insert, sb_update, sb_count
+from config import CONTEXT_CACHE_TTL, CONTEXT_CACHE_MAX_SESSIONS, CONTEXT_CACHE_MAX_USERS, FACT_TOP_K, FACT_PINNED_KEYS
+from config import RECALL_ENABLED, RECALL_TOP_K
+from supabase_rest import sb_select, sb_insert, sb_update, sb_count, sb_upsert_many
+from services.structured_output import get_structured_batcher
+from services.conversation_writer import get_conversation_writer
+from services.fact_index import FactIndex, is_hidden_fact
+from services.conversation_recall import get_conversation_recall
+
+HISTORY_LIMIT = 20  # messages of history put in the prompt context
+
+
+_EXTRACT_FACTS_INSTRUCTION = (
+    "Extract personal facts about the user from these messages as key/value pairs "
+    "(e.g. name: Alex, age: 22). Only extract clear facts; return [] if none."
+)
+_EXTRACT_FACTS_SCHEMA = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {"key": {"type": "string"}, "value": {"type": "string"}},
+        "required": ["key", "value"],
+    },
+    "drop_invalid_items": True,
+}
+
+
+class ContextCache:
+    """LRU caches of facts by user and recent messages by (user, session).
+
+    Writes made through MemoryService update entries in place; anything else
+    that writes the tables should call invalidate_*(). Entries also expire
+    after CONTEXT_CACHE_TTL as a bound on staleness from other processes.
+    A fill is dropped if a write to the same key happened while it was
+    being fetched, so a slow read can never overwrite newer data.
+    Thread-safe: build_context_async reads from worker threads.
+    """
+
+    def __init__(self, ttl: float = CONTEXT_CACHE_TTL, max_sessions: int = CONTEXT_CACHE_MAX_SESSIONS,
+                 max_users: int = CONTEXT_CACHE_MAX_USERS):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.max_users = max_users
+        self._facts: OrderedDict = OrderedDict()     # user_id → {"value": {key: value}, "at", "index"}
+        self._sessions: OrderedDict = OrderedDict()  # (user_id, session_id) → {"value": [messages], "at"}
+        self._versions: dict = {}                    # key → write counter, for fill races
+        self._lock = threading.Lock()
+
+        # Metrics
+        self.hits = 0
+        self.misses = 0
+
+    # ------------------------------------------------------------------
+    def _get(self, store: OrderedDict, key):
+        with self._lock:
+            entry = store.get(key)
+            if entry is None or time.monotonic() - entry["at"] > self.ttl:
+                store.pop(key, None)
+                self.misses += 1
+                return None
+            store.move_to_end(key)
+            self.hits += 1
+            return entry["value"]
+
+    def version(self, key) -> int:
+        with self._lock:
+            return self._versions.get(key, 0)
+
+    def _fill(self, store: OrderedDict, key, value, version: int, limit: int):
+        with self._lock:
+            if self._versions.get(key, 0) != version:
+                return
+            store[key] = {"value": value, "at": time.monotonic()}
+            store.move_to_end(key)
+            while len(store) > limit:
+                store.popitem(last=False)
+
+    def _bump(self, key):
+        if len(self._versions) > 4 * (self.max_sessions + self.max_users):
+            self._versions.clear()
+        self._versions[key] = self._versions.get(key, 0) + 1
+
+    # ------------------------------------------------------------------
+    def get_facts(self, user_id: int) -> dict | None:
+        facts = self._get(self._facts, ("facts", user_id))
+        return dict(facts) if facts is not None else None
+
+    def fill_facts(self, user_id: int, facts: dict, version: int):
+        self._fill(self._facts, ("facts", user_id), dict(facts), version, self.max_users)
+
+    def set_fact(self, user_id: int, key: str, value: str):
+        with self._lock:
+            self._bump(("facts", user_id))
+            entry = self._facts.get(("facts", user_id))
+            if entry is not None:
+                entry["value"][key] = value
+                if entry.get("index") is not None:
+                    entry["index"].upsert(key, value)
+
+    def search_facts(self, user_id: int, query: str, k: int) -> list | None:
+        """Top-k (key, value, score) from the user's fact index, built on first
+        use and kept in step by set_fact(). None if the facts aren't cached."""
+        with self._lock:
+            entry = self._facts.get(("facts", user_id))
+            if entry is None or time.monotonic() - entry["at"] > self.ttl:
+                return None
+            if entry.get("index") is None:
+                entry["index"] = FactIndex(entry["value"])
+            return entry["index"].search(query, k)
+
+    def invalidate_facts(self, user_id: int):
+        with self._lock:
+            self._bump(("facts", user_id))
+            self._facts.pop(("facts", user_id), None)
+
+    # ------------------------------------------------------------------
+    def get_messages(self, user_id: int, session_id: str) -> list | None:
+        messages = self._get(self._sessions, (user_id, session_id))
+        return list(messages) if messages is not None else None
+
+    def fill_messages(self, user_id: int, session_id: str, messages: list, version: int):
+        self._fill(self._sessions, (user_id, session_id), list(messages[-HISTORY_LIMIT:]),
+                   version, self.max_sessions)
+
+    def append_message(self, user_id: int, session_id: str, message: dict):
+        with self._lock:
+            self._bump((user_id, session_id))
+            entry = self._sessions.get((user_id, session_id))
+            if entry is not None:
+                entry["value"].append(message)
+                del entry["value"][:-HISTORY_LIMIT]
+
+    def invalidate_session(self, user_id: int, session_id: str):
+        with self._lock:
+            self._bump((user_id, session_id))
+            self._sessions.pop((user_id, session_id), None)
+
+    # ------------------------------------------------------------------
+    def get_stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "users": len(self._facts),
+            "sessions": len(self._sessions),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+_context_cache = ContextCache()
+
+
+def get_context_cache() -> ContextCache:
+    return _context_cache
 
 
 class MemoryService:
+    _recall_tasks: set = set()  # strong refs to in-flight recall updates (instances are per request)
+    _bulk_facts = True          # cleared when Supabase rejects the bulk upsert outright
+
     def __init__(self, db=None):
         # We accept db for legacy compatibility with routes injects, but ignore it.
         pass
@@ -31,11 +195,54 @@ class MemoryService:
                     "value": value,
                     "auto_extracted": auto_extracted
                 })
+            _context_cache.set_fact(user_id, key, value)
         except Exception as e:
+            _context_cache.invalidate_facts(user_id)
             print(f"Error saving fact: {e}")
 
+    def save_facts(self, user_id: int, facts: list[dict], auto_extracted: bool = False) -> int:
+        """Upsert many facts in one request. Keys are normalized and de-duplicated
+        (last wins); facts the cache already holds unchanged are skipped.
+        Returns how many were written."""
+        latest = {}
+        for f in facts:
+            key = str(f.get("key") or "").strip().lower().replace(" ", "_")[:200]
+            value = str(f.get("value") or "").strip()
+            if key and value:
+                latest[key] = value
+        cached = _context_cache.get_facts(user_id)
+        if cached is not None:
+            latest = {k: v for k, v in latest.items() if cached.get(k) != v}
+        if not latest:
+            return 0
+
+        now = datetime.now(timezone.utc).isoformat()
+        rows = [
+            {"user_id": user_id, "key": k, "value": v, "auto_extracted": auto_extracted, "updated_at": now}
+            for k, v in latest.items()
+        ]
+        if MemoryService._bulk_facts:
+            try:
+                sb_upsert_many("memory_facts", rows, on_conflict="user_id,key")
+                for k, v in latest.items():
+                    _context_cache.set_fact(user_id, k, v)
+                return len(latest)
+            except Exception as e:
+                status = getattr(getattr(e, "response", None), "status_code", 0)
+                if 400 <= status < 500:
+                    # e.g. no unique constraint on (user_id, key) (setup_supabase.sql step 11);
+                    # retrying would fail the same way, so stop paying for the extra request
+                    MemoryService._bulk_facts = False
+                print(f"Warning: bulk fact upsert failed, saving one by one: {e}")
+        for k, v in latest.items():
+            self.save_fact(user_id, k, v, auto_extracted=auto_extracted)
+        return len(latest)
+
     def get_fact(self, user_id: int, key: str) -> str | None:
         """Get single fact value."""
+        cached = _context_cache.get_facts(user_id)
+        if cached is not None:
+            return cached.get(key)
         try:
             facts = sb_select("memory_facts", query_string=f"user_id=eq.{user_id}&key=eq.{key}")
             return facts[0]["value"] if facts else None
@@ -44,85 +251,190 @@ class MemoryService:
 
     def get_all_facts(self, user_id: int) -> dict:
         """Return all facts as {key: value} map."""
+        cached = _context_cache.get_facts(user_id)
+        if cached is not None:
+            return cached
         try:
+            version = _context_cache.version(("facts", user_id))
             facts = sb_select("memory_facts", filters={"user_id": user_id})
-            return {f["key"]: f["value"] for f in facts}
+            result = {f["key"]: f["value"] for f in facts}
+            _context_cache.fill_facts(user_id, result, version)
+            return result
         except Exception as e:
             print(f"Error getting facts: {e}")
             return {}
 
     def delete_fact(self, user_id: int, key: str):
         """Remove a fact. (Not implemented purely via REST since we don't have delete, ignore for now)"""
-        pass
+        _context_cache.invalidate_facts(user_id)
+
+    @staticmethod
+    def _message_row(user_id: int, session_id: str, role: str, content: str, created_at: datetime,
+                     provider: str = None, model: str = None, response_time: float = None) -> dict:
+        return {
+            "user_id": user_id,
+            "session_id": session_id,
+            "role": role,
+            "content": content,
+            "provider": provider,
+            "model": model,
+            "response_time": response_time,
+            "created_at": created_at.isoformat()
+        }
+
+    def _queue_rows(self, user_id: int, session_id: str, rows: list[dict]):
+        """Hand rows to the write-behind queue and update the session cache now;
+        the writer retries and spills to disk, so the rows are not lost."""
+        try:
+            get_conversation_writer().enqueue(rows)
+            for row in rows:
+                _context_cache.append_message(user_id, session_id, {"role": row["role"], "content": row["content"]})
+        except Exception as e:
+            _context_cache.invalidate_session(user_id, session_id)
+            print(f"Failed to save message: {e}")
+        if RECALL_ENABLED:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                self._recall_rows(user_id, rows)
+                return
+            # Loading and appending the index file is disk I/O; keep it off the loop
+            task = loop.create_task(asyncio.to_thread(self._recall_rows, user_id, rows))
+            self._recall_tasks.add(task)
+            task.add_done_callback(self._recall_tasks.discard)
+
+    @staticmethod
+    def _recall_rows(user_id: int, rows: list[dict]):
+        """Best-effort: a recall failure must not fail the turn."""
+        try:
+            get_conversation_recall().add_rows(user_id, rows)
+        except Exception as e:
+            print(f"Warning: Could not index messages for recall: {e}")
 
     def save_message(
         self, user_id: int, session_id: str, role: str, content: str,
         provider: str = None, model: str = None, response_time: float = None
     ):
-        """Save a message to Conversation history."""
-        try:
-            from datetime import datetime, timezone
-            sb_insert("conversations", {
-                "user_id": user_id,
-                "session_id": session_id,
-                "role": role,
-                "content": content,
-                "provider": provider,
-                "model": model,
-                "response_time": response_time,
-                "created_at": datetime.now(timezone.utc).isoformat()
-            })
-        except Exception as e:
-            print(f"Failed to save message: {e}")
+        """Save a message to Conversation history (queued, written in the background)."""
+        row = self._message_row(user_id, session_id, role, content, datetime.now(timezone.utc),
+                                provider, model, response_time)
+        self._queue_rows(user_id, session_id, [row])
+
+    def save_turn(
+        self, user_id: int, session_id: str, user_content: str, assistant_content: str,
+        provider: str = None, model: str = None, response_time: float = None
+    ):
+        """Save a user message and the assistant's reply as one bulk insert."""
+        now = datetime.now(timezone.utc)
+        # Distinct timestamps keep the pair ordered when read back by created_at
+        asked_at = now - timedelta(seconds=response_time) if response_time else now - timedelta(milliseconds=1)
+        self._queue_rows(user_id, session_id, [
+            self._message_row(user_id, session_id, "user", user_content, asked_at),
+            self._message_row(user_id, session_id, "assistant", assistant_content, now,
+                              provider, model, response_time),
+        ])
 
     def get_conversation(self, user_id: int, session_id: str, limit: int = 20) -> list:
         """Get last N messages for a session, ordered oldest to newest."""
+        if limit <= HISTORY_LIMIT:
+            cached = _context_cache.get_messages(user_id, session_id)
+            if cached is not None:
+                return cached[-limit:] if limit > 0 else []
         try:
+            version = _context_cache.version((user_id, session_id))
+            fetch = max(limit, HISTORY_LIMIT)
             messages = sb_select("conversations", 
-                                 query_string=f"user_id=eq.{user_id}&session_id=eq.{session_id}&order=created_at.desc&limit={limit}")
-            return [{"role": m["role"], "content": m["content"]} for m in reversed(messages)]
+                                 query_string=f"user_id=eq.{user_id}&session_id=eq.{session_id}&order=created_at.desc&limit={fetch}")
+            result = [{"role": m["role"], "content": m["content"]} for m in reversed(messages)]
+            _context_cache.fill_messages(user_id, session_id, result, version)
+            return result[-limit:] if limit > 0 else []
         except Exception as e:
             print(f"Failed to get conversation: {e}")
             return []
 
     def clear_conversation(self, user_id: int, session_id: str):
         """Delete all messages for a session. Ignore for now since delete is missing in supabase_rest."""
-        pass
+        _context_cache.invalidate_session(user_id, session_id)
 
     async def auto_extract_facts(self, user_id: int, text: str) -> list:
         """Uses LLM to extract {key, value} facts from user text and saves them."""
         try:
-            prompt = (
-                "Extract personal facts from this text. Return ONLY a valid JSON array of {key, value} pairs. "
-                "Examples: [{'key': 'name', 'value': 'Alex'}, {'key': 'age', 'value': '22'}]. "
-                "Only extract clear facts. Return empty array '[]' if none found. Text: " + text
-            )
-            from services.llm_router import get_llm_router
-            llm_router = get_llm_router()
-            resp = await llm_router.route([{"role": "user", "content": prompt}])
-            
-            # Extract JSON from response
-            text_resp = resp.get("text", "")
-            start = text_resp.find("[")
-            end = text_resp.rfind("]") + 1
-            if start == -1 or end == 0:
-                return []
-            
-            facts = json.loads(text_resp[start:end])
-            for f in facts:
-                if "key" in f and "value" in f:
-                    self.save_fact(user_id, str(f["key"]), str(f["value"]), auto_extracted=True)
+            facts = await get_structured_batcher().submit(
+                _EXTRACT_FACTS_INSTRUCTION, text, _EXTRACT_FACTS_SCHEMA, task="extract",
+                feature="memory_service.auto_extract_facts", user_id=user_id,
+            ) or []
+            await asyncio.to_thread(self.save_facts, user_id, facts, True)
             return facts
         except Exception:
             return []
 
-    def build_context(self, user_id: int, session_id: str) -> dict:
-        """Gather ALL context for AI prompt injection."""
+    def relevant_facts(self, user_id: int, facts: dict, query: str | None, k: int = FACT_TOP_K) -> list:
+        """(key, value) pairs for the prompt: pinned facts, then the top-k by
+        relevance to `query` (all user facts when there is no query).
+        Admin inbox items stored as facts are never included."""
+        visible = {key: value for key, value in facts.items() if not is_hidden_fact(key)}
+        if query is None:
+            return list(visible.items())
+        hits = _context_cache.search_facts(user_id, query, k)
+        if hits is None:
+            hits = FactIndex(visible).search(query, k)
+        chosen = {key: visible[key] for key in FACT_PINNED_KEYS if key in visible}
+        for key, value, _ in hits:
+            if len(chosen) >= max(k, len(FACT_PINNED_KEYS)):
+                break
+            if key in visible:
+                chosen.setdefault(key, value)
+        return list(chosen.items())
+
+    def recall(self, user_id: int, session_id: str, query: str | None, k: int = RECALL_TOP_K) -> list:
+        """Prompt lines for the past exchanges (other sessions) most relevant to `query`."""
+        if not RECALL_ENABLED or not query:
+            return []
+        lines = []
+        for hit in get_conversation_recall().search(user_id, query, k, exclude_session=session_id):
+            day = hit["created_at"][:10]
+            lines.append(f"- [{day}] User: {hit['user']} | You: {hit['assistant']}")
+        return lines
+
+    def build_context(self, user_id: int, session_id: str, query: str | None = None) -> dict:
+        """Gather context for AI prompt injection. With `query` (the new
+        message) only the relevant facts are included, plus recalled
+        exchanges from earlier sessions."""
+        context = self._assemble_context(
+            user_id,
+            self.get_all_facts(user_id),
+            self.get_conversation(user_id, session_id, limit=HISTORY_LIMIT),
+            query,
+        )
+        context["recall"] = self.recall(user_id, session_id, query)
+        return context
+
+    async def build_context_async(self, user_id: int, session_id: str, query: str | None = None) -> dict:
+        """build_context() with the fact and conversation reads running
+        concurrently in worker threads, off the event loop. Fully cached
+        contexts are assembled inline without touching the thread pool."""
+        facts = _context_cache.get_facts(user_id)
+        messages = _context_cache.get_messages(user_id, session_id)
+        recall_inline = not RECALL_ENABLED or not query or get_conversation_recall().is_loaded(user_id)
+        if facts is not None and messages is not None and recall_inline:
+            context = self._assemble_context(user_id, facts, messages, query)
+            context["recall"] = self.recall(user_id, session_id, query)
+            return context
+        # Loading a recall index from disk is blocking, so it joins the reads
+        facts, messages, recalled = await asyncio.gather(
+            asyncio.to_thread(self.get_all_facts, user_id),
+            asyncio.to_thread(self.get_conversation, user_id, session_id, HISTORY_LIMIT),
+            asyncio.to_thread(self.recall, user_id, session_id, query),
+        )
+        context = self._assemble_context(user_id, facts, messages, query)
+        context["recall"] = recalled
+        return context
+
+    def _assemble_context(self, user_id: int, facts: dict, messages: list, query: str | None = None) -> dict:
         try:
             context = {}
-            # 1. Facts
-            facts = self.get_all_facts(user_id)
-            context["facts"] = "\n".join(f"- {k}: {v}" for k, v in facts.items())
+            # 1. Facts (most relevant first)
+            context["facts"] = "\n".join(f"- {k}: {v}" for k, v in self.relevant_facts(user_id, facts, query))
             
             # 2. Today's Date/Time
             now = datetime.now(timezone.utc)
@@ -136,8 +448,8 @@ class MemoryService:
             # 4. Habits
             context["habits_summary"] = ""
 
-            # 5. Conversations
-            context["recent_messages"] = self.get_conversation(user_id, session_id, limit=20)
+            # 5. Conversations (oldest → newest; routes pass this to PromptBuilder)
+            context["history"] = messages
             
             return context
         except Exception as e:
@@ -1,9 +1,10 @@
 """
 planner_service.py — Interactive Briefing and Schedules
 Builds generative Morning/Evening narratives leveraging tools API context,
-task queue prioritization, and schedules LLM optimized timetable generation.
+task queue prioritization, and deterministic local timetable generation.
 """
 
+import asyncio
 import json
 from datetime import datetime, timezone
 
@@ -13,69 +14,101 @@ from models.habit import Habit
 
 from services.tools_service import ToolsService
 from services.analytics_service import AnalyticsService
+from services.schedule_solver import build_schedule
+from supabase_rest import sb_select
 
 
 class PlannerService:
     @staticmethod
-    async def morning_briefing(db: Session, user_id: int, llm_router) -> dict:
+    async def _life_score(db: Session | None, user_id: int) -> dict:
+        """SQLAlchemy score when a session is given, else the Supabase one (off the event loop)."""
+        if db is not None:
+            return AnalyticsService.calculate_life_score(db, user_id)
+        return await asyncio.to_thread(AnalyticsService.calculate_life_score_rest, user_id)
+
+    @staticmethod
+    async def morning_briefing(db: Session | None, user_id: int, llm_router, priority: str | None = None) -> dict:
         """Gathers runtime states + Weather/News, builds morning AI summary."""
         try:
-            weather = ToolsService.get_weather()
-            db_score = AnalyticsService.calculate_life_score(db, user_id)
+            weather = await ToolsService.get_weather()
+            db_score = await PlannerService._life_score(db, user_id)
             
             prompt = (
                 f"Give me a highly motivational morning briefing. Include today's weather context if present: "
                 f"Weather: {json.dumps(weather)}. Yesterday's score was {db_score['total']}. Tell me to crush it."
             )
-            resp = await llm_router.route([{"role": "user", "content": prompt}], cache_ttl=1800)
+            resp = await llm_router.route([{"role": "user", "content": prompt}], cache_ttl=1800,
+                                          priority=priority, user_id=user_id,
+                                          feature="planner_service.morning_briefing")
             
+            ok = resp.get("status") == "success"
             return {
                 "weather": weather,
-                "motivational_message": resp.get("text", "Good morning! Time to be productive."),
-                "yesterday_score": db_score['total']
+                "motivational_message": resp.get("text") if ok else "Good morning! Time to be productive.",
+                "yesterday_score": db_score['total'],
+                "status": "success" if ok else "error",
             }
         except Exception:
-            return {"motivational_message": "Good morning!"}
+            return {"motivational_message": "Good morning!", "status": "error"}
 
     @staticmethod
-    async def evening_review(db: Session, user_id: int, llm_router) -> dict:
+    async def evening_review(db: Session | None, user_id: int, llm_router, priority: str | None = None) -> dict:
         """Night time wrapup summarizing the day."""
         try:
-            score = AnalyticsService.calculate_life_score(db, user_id)
+            score = await PlannerService._life_score(db, user_id)
             prompt = (
                 f"Give me a brief, reflective evening wind-down summary. "
                 f"Today's total life score was {score['total']}/100. "
                 "Keep it soothing, maximum 3 sentences."
             )
-            resp = await llm_router.route([{"role": "user", "content": prompt}], cache_ttl=1800)
+            resp = await llm_router.route([{"role": "user", "content": prompt}], cache_ttl=1800,
+                                          priority=priority, user_id=user_id,
+                                          feature="planner_service.evening_review")
             
+            ok = resp.get("status") == "success"
             return {
-                "ai_summary": resp.get("text", "You did well today. Rest up."),
-                "today_score": score['total']
+                "ai_summary": resp.get("text") if ok else "You did well today. Rest up.",
+                "today_score": score['total'],
+                "status": "success" if ok else "error",
             }
         except Exception:
-            return {"ai_summary": "Rest well tonight."}
+            return {"ai_summary": "Rest well tonight.", "status": "error"}
 
     @staticmethod
-    async def generate_schedule(db: Session, user_id: int, available_hours: int, llm_router) -> list:
-        """Generates hourly blocks (time-boxing) prioritizing pending tasks."""
+    async def generate_schedule(db: Session | None, user_id: int, available_hours: int, llm_router=None,
+                                start: str = "09:00") -> list:
+        """Time-boxes pending tasks into hourly blocks with breaks. Deterministic
+        and local (schedule_solver); the LLM is not involved."""
         try:
-            tasks = db.query(Task).filter_by(user_id=user_id, status="pending").order_by(Task.priority).limit(5).all()
-            titles = [t.title for t in tasks]
-            
-            prompt = (
-                f"I have {available_hours} hours available. Schedule these tasks: {', '.join(titles)}. "
-                "Include breaks. Return ONLY a valid JSON array of objects: "
-                '[{"time": "09:00", "activity": "...", "duration": 60, "type": "task/break"}]'
-            )
-            resp = await llm_router.route([{"role": "user", "content": prompt}], cache_ttl=0)
-            text_resp = resp.get("text", "")
-            start = text_resp.find("[")
-            end = text_resp.rfind("]") + 1
-            return json.loads(text_resp[start:end])
+            if db is not None:
+                tasks = db.query(Task).filter_by(user_id=user_id, status="pending").all()
+            else:
+                tasks = await asyncio.to_thread(
+                    sb_select, "tasks", {"user_id": user_id, "status": "pending"},
+                    "id,title,priority,estimated_time,due_date",
+                )
+            return build_schedule(tasks, available_hours, start=start)
         except Exception:
             return []
 
+    @staticmethod
+    async def describe_schedule(schedule: list, llm_router) -> str:
+        """Optional friendly wording for a schedule; the timetable itself is never changed."""
+        if not schedule:
+            return "Nothing to schedule right now."
+        lines = "\n".join(f"{b['time']} {b['activity']} ({b['duration']} min)" for b in schedule)
+        try:
+            resp = await llm_router.route(
+                [{"role": "user", "content": (
+                    "In 2-3 encouraging sentences, introduce this plan for my day. "
+                    f"Do not change or reorder it.\n{lines}"
+                )}],
+                cache_ttl=1800, task="chat", feature="planner_service.describe_schedule",
+            )
+            return resp.get("text") or lines
+        except Exception:
+            return lines
+
     @staticmethod
     def start_focus(db: Session, user_id: int, task_id: int, duration: int) -> dict:
         """Commence Pomodoro/Focus timer."""
@@ -192,7 +192,8 @@ class ProjectService:
                 f"Completed Features: {', '.join(done_titles)}\n"
                 "Include Sections: Title, Description, Features, Tech Stack, Installation. Format strictly in Markdown."
             )
-            resp = await llm_router.route([{"role": "user", "content": prompt}], cache_ttl=0)
+            resp = await llm_router.route([{"role": "user", "content": prompt}],
+                                          cache_ttl=0, task="long_form", feature="project_service.generate_readme")
             return resp.get("text", "# Project README\nError generating.")
         except Exception:
             return "Generation failed."
@@ -207,7 +208,8 @@ class ProjectService:
                 "Return ONLY a JSON object: "
                 '{"title": "...", "description": "...", "features": ["..."], "tech_stack": ["..."], "highlights": ["..."]}'
             )
-            resp = await llm_router.route([{"role": "user", "content": prompt}], cache_ttl=0)
+            resp = await llm_router.route([{"role": "user", "content": prompt}],
+                                          cache_ttl=0, feature="project_service.generate_portfolio_entry")
             text_resp = resp.get("text", "")
             try:
                 start = text_resp.find("{")
@@ -0,0 +1,246 @@
+"""
+prompt_builder.py — Token-Budgeted Prompt Assembly
+Builds chat message lists that fit a per-model token budget. Content is
+admitted by priority (system prompt, latest turns, user facts, recalled past
+exchanges, older turns);
+turns that no longer fit are replaced with a cached rolling summary that is
+refreshed in the background.
+"""
+
+import asyncio
+import hashlib
+import re
+from collections import OrderedDict
+
+from config import PROMPT_MAX_TOKENS
+
+
+# Context windows by model-name fragment (first match wins)
+_MODEL_CONTEXT = [
+    ("phi-3-mini", 4096),
+    ("8b", 8192),
+    ("7b", 8192),
+    ("gemma", 8192),
+    ("mixtral", 32768),
+    ("70b", 32768),
+    ("405b", 32768),
+    ("24b", 32768),
+    ("gemini", 32768),
+    ("command", 32768),
+]
+DEFAULT_CONTEXT = 8192       # smallest window among the default provider models
+RESPONSE_RESERVE = 1024      # providers request max_tokens=1024
+MESSAGE_OVERHEAD = 4         # role/separator tokens per chat message
+MIN_RECENT_MESSAGES = 6      # newest turns admitted before facts
+SUMMARY_MAX_TOKENS = 300
+
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+
+
+def estimate_tokens(text: str | None) -> int:
+    """Fast BPE-style estimate: ~1.3 tokens per word, one per punctuation mark,
+    never less than chars/4 (which dominates for code and URLs)."""
+    if not text:
+        return 0
+    words = punct = 0
+    for piece in _TOKEN_RE.findall(text):
+        if piece[0].isalnum() or piece[0] == "_":
+            words += 1
+        else:
+            punct += 1
+    return max(int(words * 1.3 + punct), len(text) // 4) + 1
+
+
+def context_window(model: str | None) -> int:
+    if not model:
+        return DEFAULT_CONTEXT
+    lower = model.lower()
+    for fragment, size in _MODEL_CONTEXT:
+        if fragment in lower:
+            return size
+    return DEFAULT_CONTEXT
+
+
+def token_budget(model: str | None) -> int:
+    """Prompt tokens available for a model after reserving room for the reply."""
+    return min(context_window(model) - RESPONSE_RESERVE, PROMPT_MAX_TOKENS)
+
+
+def _message_hash(msg: dict) -> str:
+    raw = f"{msg.get('role')}||{msg.get('content')}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
+
+def _truncate(text: str, max_tokens: int) -> str:
+    """Cut text to roughly max_tokens (by the chars/4 rule) on a word boundary."""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    cut = text[: max(0, max_tokens * 4)]
+    return cut.rsplit(" ", 1)[0] + "…"
+
+
+class PromptBuilder:
+    """Assemble token-budgeted prompts with rolling per-session summaries."""
+
+    def __init__(self, llm_router=None, max_sessions: int = 500):
+        self.llm_router = llm_router
+        # (user_id, session_id) → {"text": summary, "upto": hash of last summarized message}.
+        # Session ids come from the client, so the owner is part of the key.
+        self._summaries: OrderedDict[tuple, dict] = OrderedDict()
+        self._max_sessions = max_sessions
+        self._pending: dict[tuple, asyncio.Task] = {}  # strong refs to summary jobs
+
+    # ------------------------------------------------------------------
+    def build(
+        self,
+        system_prompt: str,
+        user_message: str,
+        history: list | None = None,
+        facts: list | None = None,
+        model: str | None = None,
+        session_id: str | None = None,
+        recall: list | None = None,
+        user_id: int | None = None,
+    ) -> list:
+        """Return [system, *history, user] fitted to the model's token budget.
+
+        history is oldest → newest; facts and recall (lines about exchanges from
+        earlier sessions) are in relevance order (most relevant first).
+        """
+        history = [m for m in (history or []) if m.get("content")]
+        facts = [f for f in (facts or []) if f]
+        recall = [r for r in (recall or []) if r]
+        budget = token_budget(model)
+
+        # 1. Mandatory: system prompt + the new user message
+        used = estimate_tokens(system_prompt) + estimate_tokens(user_message) + 2 * MESSAGE_OVERHEAD
+
+        # 2. Newest turns, newest first
+        kept_from = len(history)  # history[kept_from:] is included
+        def take_turns(limit_index: int) -> None:
+            nonlocal kept_from, used
+            while kept_from > limit_index:
+                cost = estimate_tokens(history[kept_from - 1]["content"]) + MESSAGE_OVERHEAD
+                if used + cost > budget:
+                    return
+                used += cost
+                kept_from -= 1
+
+        take_turns(max(0, len(history) - MIN_RECENT_MESSAGES))
+
+        # 3. Facts, most relevant first
+        kept_facts = []
+        if facts:
+            used += estimate_tokens("User facts:")
+            for fact in facts:
+                cost = estimate_tokens(fact)
+                if used + cost > budget:
+                    break
+                kept_facts.append(fact)
+                used += cost
+
+        # 3b. Recalled exchanges from earlier sessions, most relevant first
+        kept_recall = []
+        if recall:
+            used += estimate_tokens("Relevant earlier conversations:")
+            for line in recall:
+                cost = estimate_tokens(line)
+                if used + cost > budget:
+                    break
+                kept_recall.append(line)
+                used += cost
+
+        # 4. Summary of whatever will be dropped gets a reserved slice, then older turns
+        summary_reserve = SUMMARY_MAX_TOKENS if kept_from > 0 else 0
+        used += summary_reserve
+        take_turns(0)
+        used -= summary_reserve
+
+        key = (user_id, session_id) if session_id else None
+        summary = self._summary_for(key, user_id, history, kept_from) if kept_from > 0 else ""
+        summary = _truncate(summary, min(SUMMARY_MAX_TOKENS, max(0, budget - used)))
+
+        # Assemble
+        system_parts = [system_prompt]
+        if kept_facts:
+            system_parts.append("User facts:\n" + "\n".join(kept_facts))
+        if kept_recall:
+            system_parts.append("Relevant earlier conversations:\n" + "\n".join(kept_recall))
+        if summary:
+            system_parts.append(f"Summary of earlier conversation: {summary}")
+
+        messages = [{"role": "system", "content": "\n".join(system_parts)}]
+        messages.extend({"role": m["role"], "content": m["content"]} for m in history[kept_from:])
+        messages.append({"role": "user", "content": user_message})
+        return messages
+
+    # ------------------------------------------------------------------
+    def _summary_for(self, key: tuple | None, user_id: int | None, history: list, kept_from: int) -> str:
+        """Cached rolling summary covering history[:kept_from], topped up with an
+        extractive digest of turns the cache hasn't absorbed yet (those are folded
+        into the cached summary in the background)."""
+        dropped = history[:kept_from]
+        cached = self._summaries.get(key) if key else None
+        gap = dropped
+        if cached:
+            self._summaries.move_to_end(key)
+            hashes = [_message_hash(m) for m in history]
+            if cached["upto"] in hashes:
+                # Anything after the marker that is being dropped is still unsummarized
+                gap = dropped[hashes.index(cached["upto"]) + 1:]
+            # else: the marker scrolled out of the window, so every dropped turn is newer
+
+        if gap and key:
+            self._schedule_summary(key, user_id, cached["text"] if cached else "", gap)
+
+        parts = [cached["text"]] if cached and cached.get("text") else []
+        parts.extend(f"{m['role']}: {_truncate(m['content'], 30)}" for m in gap[-6:])
+        return " | ".join(parts)
+
+    def _schedule_summary(self, key: tuple, user_id: int | None, previous: str, gap: list):
+        if self.llm_router is None or key in self._pending:
+            return
+        try:
+            task = asyncio.get_running_loop().create_task(
+                self._summarize(key, user_id, previous, gap)
+            )
+        except RuntimeError:
+            return  # no running loop
+        self._pending[key] = task
+        task.add_done_callback(lambda _t: self._pending.pop(key, None))
+
+    async def _summarize(self, key: tuple, user_id: int | None, previous: str, gap: list):
+        """Fold newly dropped turns into the session's running summary."""
+        try:
+            transcript = "\n".join(f"{m['role']}: {m['content']}" for m in gap)
+            prompt = (
+                "Update the running summary of a conversation between a user and their assistant. "
+                "Keep names, decisions, open questions and user preferences. Maximum 120 words. "
+                "Return ONLY the summary text.\n\n"
+                f"Current summary: {previous or '(none)'}\n\nNew turns:\n{transcript}"
+            )
+            resp = await self.llm_router.route([{"role": "user", "content": prompt}], task="extract",
+                                               user_id=user_id, feature="chat_summary")
+            if resp.get("status") != "success" or not resp.get("text"):
+                return
+            self._summaries[key] = {
+                "text": _truncate(resp["text"].strip(), SUMMARY_MAX_TOKENS),
+                "upto": _message_hash(gap[-1]),
+            }
+            self._summaries.move_to_end(key)
+            while len(self._summaries) > self._max_sessions:
+                self._summaries.popitem(last=False)
+        except Exception:
+            pass
+
+
+_builder_instance = None
+
+
+def get_prompt_builder(llm_router=None) -> PromptBuilder:
+    global _builder_instance
+    if _builder_instance is None:
+        _builder_instance = PromptBuilder(llm_router=llm_router)
+    elif llm_router is not None and _builder_instance.llm_router is None:
+        _builder_instance.llm_router = llm_router
+    return _builder_instance
@@ -0,0 +1,107 @@
+"""
+provider_prober.py — Background Provider Health Probes
+Periodically sends each configured LLM provider a token-free request
+(usually a models-list call) on the same pooled connection chat uses. This
+keeps connections warm across idle periods and records live availability
+and latency on the router entry, which LLMRouter scoring reads. Providers
+that served real traffic within the interval are skipped.
+"""
+
+import asyncio
+import time
+
+from config import PROVIDER_PROBE_INTERVAL, PROVIDER_PROBE_TIMEOUT
+
+
+class ProviderProber:
+    """Probe loop over the router's provider registry."""
+
+    def __init__(self, llm_router, interval: float = PROVIDER_PROBE_INTERVAL,
+                 timeout: float = PROVIDER_PROBE_TIMEOUT):
+        self.llm_router = llm_router
+        self.interval = interval
+        self.timeout = timeout
+        self._task: asyncio.Task | None = None
+
+        # Metrics
+        self.probes = 0
+        self.failures = 0
+
+    # ------------------------------------------------------------------
+    def start(self):
+        """Start the loop on the running event loop (no-op if already running)."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._task = None
+
+    async def _run(self):
+        # Wake often enough that each provider is probed roughly once per interval
+        tick = max(5.0, self.interval / 4)
+        while True:
+            try:
+                await self.probe_all()
+            except Exception as e:
+                print(f"Warning: provider probe pass failed: {e}")
+            await asyncio.sleep(tick)
+
+    # ------------------------------------------------------------------
+    def _is_due(self, entry: dict, now: float) -> bool:
+        last_probe = (entry.get("probe") or {}).get("at")
+        if last_probe is not None and now - last_probe < self.interval:
+            return False
+        # Real traffic already proves liveness and keeps the pool warm
+        last_ok = entry.get("last_ok")
+        return last_ok is None or now - last_ok >= self.interval
+
+    async def probe_all(self, force: bool = False) -> dict:
+        """Probe every due provider concurrently. Returns name → probe result."""
+        now = time.monotonic()
+        due = [e for e in self.llm_router.providers if force or self._is_due(e, now)]
+        results = await asyncio.gather(*(self._probe(e) for e in due), return_exceptions=True)
+        return {
+            e["name"]: r for e, r in zip(due, results)
+            if isinstance(r, dict)
+        }
+
+    async def _probe(self, entry: dict) -> dict | None:
+        api_key = self.llm_router.key_manager.peek_key(entry["name"])
+        if api_key is None:
+            return None  # every key exhausted; nothing to route to anyway
+        result = await entry["provider_class"](api_key=api_key).probe(timeout=self.timeout)
+        if result.get("ok") is None:
+            return None  # provider has no token-free endpoint
+        self.probes += 1
+        if not result["ok"]:
+            self.failures += 1
+        entry["probe"] = {**result, "at": time.monotonic()}
+        return result
+
+    # ------------------------------------------------------------------
+    def get_stats(self) -> dict:
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "interval": self.interval,
+            "probes": self.probes,
+            "failures": self.failures,
+        }
+
+
+_prober_instance = None
+
+
+def get_provider_prober(llm_router=None) -> ProviderProber:
+    global _prober_instance
+    if _prober_instance is None:
+        if llm_router is None:
+            from services.llm_router import get_llm_router
+            llm_router = get_llm_router()
+        _prober_instance = ProviderProber(llm_router)
+    return _prober_instance
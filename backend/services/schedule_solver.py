@@ -0,0 +1,144 @@
+"""
+schedule_solver.py — Deterministic Time-Boxing
+Packs pending tasks into the available hours without an LLM: tasks are ranked
+by deadline pressure, priority and length, long tasks are split into focus
+blocks, and breaks are inserted after sustained work. Runs in O(n log n), so
+hundreds of tasks schedule in milliseconds and the same input always yields
+the same timetable.
+"""
+
+from datetime import datetime, timedelta, timezone
+
+PRIORITY_WEIGHT = {"urgent": 4, "high": 3, "medium": 2, "low": 1}
+DEFAULT_TASK_MINUTES = 30   # tasks without estimated_time
+MAX_FOCUS_BLOCK = 90        # longer tasks are split into parts of at most this
+MIN_BLOCK = 15              # don't schedule slivers shorter than this
+BREAK_AFTER = 90            # most minutes of continuous work between breaks
+BREAK_MINUTES = 15
+SOON_DAYS = 3               # due within this many days ranks above undated work
+
+
+def _field(task, name: str):
+    return task.get(name) if isinstance(task, dict) else getattr(task, name, None)
+
+
+def _parse_due(value) -> datetime | None:
+    if value is None or value == "":
+        return None
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    if isinstance(value, datetime) and value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value if isinstance(value, datetime) else None
+
+
+def _rank(task: dict, now: datetime, horizon_end: datetime) -> tuple:
+    """Sort key: overdue/due-today first, then due soon, then the rest;
+    within a bucket higher priority, earlier deadline, shorter task."""
+    due = task["due"]
+    if due is not None and due <= horizon_end:
+        bucket = 0
+    elif due is not None and due <= now + timedelta(days=SOON_DAYS):
+        bucket = 1
+    else:
+        bucket = 2
+    return (
+        bucket,
+        -task["weight"],
+        due.timestamp() if due is not None else float("inf"),
+        task["minutes"],
+        task["order"],
+    )
+
+
+def build_schedule(tasks: list, available_hours: float, start: str = "09:00",
+                   now: datetime | None = None) -> list[dict]:
+    """Time-box `tasks` (dicts or ORM rows with title, priority, estimated_time,
+    due_date, id) into `available_hours` starting at `start` ("HH:MM", in the
+    timezone of `now`; the next day if today's window has already passed).
+
+    Returns [{"time", "activity", "duration", "type": "task"|"break", ...}];
+    task blocks also carry task_id, priority and, for split tasks, part/parts.
+    """
+    now = now or datetime.now(timezone.utc)
+    capacity = max(0, int(round(float(available_hours) * 60)))
+    try:
+        hour, minute = (int(x) for x in start.split(":", 1))
+    except (ValueError, AttributeError):
+        hour, minute = 9, 0
+    clock = hour * 60 + minute
+    # Deadlines are weighed against the window being packed, which starts at
+    # `start` today, or tomorrow once today's window is already over
+    start_at = now.replace(hour=hour % 24, minute=minute % 60, second=0, microsecond=0)
+    if start_at + timedelta(minutes=capacity) <= now:
+        start_at += timedelta(days=1)
+    horizon_end = start_at + timedelta(minutes=capacity)
+
+    items = []
+    for order, t in enumerate(tasks):
+        title = _field(t, "title")
+        if not title:
+            continue
+        try:
+            minutes = int(_field(t, "estimated_time") or DEFAULT_TASK_MINUTES)
+        except (TypeError, ValueError):
+            minutes = DEFAULT_TASK_MINUTES
+        priority = str(_field(t, "priority") or "medium").lower()
+        items.append({
+            "id": _field(t, "id"),
+            "title": title,
+            "priority": priority,
+            "weight": PRIORITY_WEIGHT.get(priority, PRIORITY_WEIGHT["medium"]),
+            "minutes": max(MIN_BLOCK, minutes),
+            "due": _parse_due(_field(t, "due_date")),
+            "order": order,
+        })
+    items.sort(key=lambda it: _rank(it, now, horizon_end))
+
+    schedule = []
+    used = 0        # minutes of the capacity consumed (work + breaks)
+    streak = 0      # minutes worked since the last break
+
+    def emit(activity: str, duration: int, kind: str, **extra):
+        nonlocal used, clock
+        schedule.append({
+            "time": f"{(clock // 60) % 24:02d}:{clock % 60:02d}",
+            "activity": activity,
+            "duration": duration,
+            "type": kind,
+            **extra,
+        })
+        used += duration
+        clock += duration
+
+    for item in items:
+        if capacity - used < MIN_BLOCK:
+            break
+        # Long tasks become focus blocks; as many blocks as fit are scheduled.
+        # A task that isn't split is skipped when it doesn't fit, so shorter
+        # lower-ranked tasks can still use the time (first-fit).
+        parts = -(-item["minutes"] // MAX_FOCUS_BLOCK)
+        block = -(-item["minutes"] // parts)
+        left = item["minutes"]
+        for part in range(1, parts + 1):
+            duration = min(block, left)
+            needs_break = streak > 0 and streak + duration > BREAK_AFTER
+            free = capacity - used - (BREAK_MINUTES if needs_break else 0)
+            if duration > free:
+                if parts == 1 or free < MIN_BLOCK:
+                    break
+                duration = free
+            if needs_break:
+                emit("Break", BREAK_MINUTES, "break")
+                streak = 0
+            extra = {"task_id": item["id"], "priority": item["priority"]}
+            if parts > 1:
+                extra.update(part=part, parts=parts)
+            emit(item["title"] if parts == 1 else f"{item['title']} (part {part}/{parts})",
+                 duration, "task", **extra)
+            streak += duration
+            left -= duration
+    return schedule
@@ -0,0 +1,345 @@
+"""
+structured_output.py — Structured LLM Output
+One tolerant JSON extractor plus a small JSON-Schema-subset validator for
+LLM replies, and a micro-batcher that packs small structured-extraction
+requests arriving within a short window into a single provider call and
+hands each caller back its own validated result.
+"""
+
+import ast
+import asyncio
+import json
+import re
+
+from config import STRUCTURED_BATCH_WINDOW, STRUCTURED_BATCH_MAX_ITEMS, STRUCTURED_BATCH_MAX_CHARS
+
+
+_FENCE_RE = re.compile(r"```(?:json|JSON)?\s*(.*?)```", re.DOTALL)
+_TRAILING_COMMA_RE = re.compile(r",\s*([}\]])")
+_JSON_LITERALS = {"null": "None", "true": "True", "false": "False"}
+_JSON_LITERAL_RE = re.compile(r"\b(null|true|false)\b")
+
+
+# ------------------------------------------------------------------
+# Parsing
+# ------------------------------------------------------------------
+def _loads_lenient(fragment: str):
+    """json.loads, then common LLM slips: trailing commas, Python-style quotes/literals."""
+    try:
+        return json.loads(fragment)
+    except ValueError:
+        pass
+    cleaned = _TRAILING_COMMA_RE.sub(r"\1", fragment)
+    try:
+        return json.loads(cleaned)
+    except ValueError:
+        pass
+    try:
+        value = ast.literal_eval(_JSON_LITERAL_RE.sub(lambda m: _JSON_LITERALS[m.group(1)], cleaned))
+    except (ValueError, SyntaxError, MemoryError, RecursionError):
+        return None
+    return value if isinstance(value, (dict, list)) else None
+
+
+def _balanced_end(text: str, start: int) -> int:
+    """Index just past the bracket that closes text[start], honouring strings."""
+    stack = []
+    quote = None
+    escaped = False
+    for i in range(start, len(text)):
+        ch = text[i]
+        if quote:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == quote:
+                quote = None
+        elif ch in "\"'":
+            quote = ch
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+        elif ch in "}]":
+            if not stack or stack.pop() != ch:
+                return -1
+            if not stack:
+                return i + 1
+    return -1
+
+
+def extract_json(text: str | None, expect: str | None = None):
+    """First JSON object/array in an LLM reply, or None.
+
+    Handles code fences, prose around the JSON, trailing commas and
+    single-quoted Python-style literals. `expect` ("object" or "array")
+    skips values of the other kind.
+    """
+    if not text:
+        return None
+    wanted = {"object": dict, "array": list}.get(expect, (dict, list))
+
+    candidates = [m.group(1) for m in _FENCE_RE.finditer(text)] + [text]
+    for chunk in candidates:
+        chunk = chunk.strip()
+        value = _loads_lenient(chunk)
+        if isinstance(value, wanted):
+            return value
+        for start, ch in enumerate(chunk):
+            if ch not in "{[":
+                continue
+            if expect == "object" and ch != "{" or expect == "array" and ch != "[":
+                continue
+            end = _balanced_end(chunk, start)
+            if end == -1:
+                continue
+            value = _loads_lenient(chunk[start:end])
+            if isinstance(value, wanted):
+                return value
+    return None
+
+
+# ------------------------------------------------------------------
+# Validation (subset of JSON Schema: type, properties, required, items, enum,
+# default — plus drop_invalid_items, which filters bad array items instead of failing)
+# ------------------------------------------------------------------
+_TYPES = {
+    "object": dict, "array": list, "string": str, "boolean": bool,
+    "integer": int, "number": (int, float), "null": type(None),
+}
+
+
+def _coerce(value, type_name: str):
+    """Best-effort conversion of a near-miss value to type_name, or raise ValueError."""
+    if type_name == "string" and isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    if type_name in ("integer", "number") and isinstance(value, str):
+        number = float(value.strip().replace(",", ""))
+        return int(number) if type_name == "integer" else number
+    if type_name == "integer" and isinstance(value, float) and value.is_integer():
+        return int(value)
+    if type_name == "null" and isinstance(value, str) and value.strip().lower() in ("", "null", "none"):
+        return None
+    raise ValueError
+
+
+def validate(value, schema: dict, path: str = "$"):
+    """Return (coerced_value, errors). Invalid optional object properties are
+    dropped (or replaced by their default) rather than failing the whole value."""
+    types = schema.get("type")
+    if types is not None:
+        types = types if isinstance(types, list) else [types]
+        if not any(isinstance(value, _TYPES[t]) and not (t in ("integer", "number") and isinstance(value, bool))
+                   for t in types):
+            for t in types:
+                try:
+                    value = _coerce(value, t)
+                    break
+                except (ValueError, TypeError):
+                    continue
+            else:
+                return value, [f"{path}: expected {'/'.join(types)}, got {type(value).__name__}"]
+
+    if "enum" in schema and value is not None:
+        if value not in schema["enum"]:
+            folded = {str(e).lower(): e for e in schema["enum"]}
+            if str(value).strip().lower() not in folded:
+                return value, [f"{path}: {value!r} not in {schema['enum']}"]
+            value = folded[str(value).strip().lower()]
+
+    errors = []
+    if isinstance(value, dict) and "properties" in schema:
+        result = dict(value)
+        for name, sub in schema["properties"].items():
+            if name not in value:
+                if name in schema.get("required", []):
+                    errors.append(f"{path}.{name}: missing")
+                elif "default" in sub:
+                    result[name] = sub["default"]
+                continue
+            coerced, sub_errors = validate(value[name], sub, f"{path}.{name}")
+            if not sub_errors:
+                result[name] = coerced
+            elif name in schema.get("required", []):
+                errors.extend(sub_errors)
+            elif "default" in sub:
+                result[name] = sub["default"]
+            else:
+                result.pop(name, None)
+        value = result
+    elif isinstance(value, list) and "items" in schema:
+        items = []
+        for i, item in enumerate(value):
+            coerced, sub_errors = validate(item, schema["items"], f"{path}[{i}]")
+            if sub_errors:
+                errors.extend(sub_errors)
+            else:
+                items.append(coerced)
+        if schema.get("drop_invalid_items"):
+            errors = []
+        value = items
+    return value, errors
+
+
+def parse_structured(text: str | None, schema: dict):
+    """Extract and validate a structured reply. Returns the value or None."""
+    expect = schema.get("type") if schema.get("type") in ("object", "array") else None
+    value = extract_json(text, expect)
+    if value is None:
+        return None
+    value, errors = validate(value, schema)
+    return None if errors else value
+
+
+def schema_hint(schema: dict) -> str:
+    """Compact example of the expected shape, for prompts."""
+    def sketch(s: dict):
+        t = s.get("type")
+        t = next((x for x in t if x != "null"), "string") if isinstance(t, list) else t
+        if "enum" in s:
+            return "/".join(str(e) for e in s["enum"])
+        if t == "object":
+            return {k: sketch(v) for k, v in s.get("properties", {}).items()}
+        if t == "array":
+            return [sketch(s.get("items", {}))]
+        return {"integer": 0, "number": 0.0, "boolean": False}.get(t, "...")
+    return json.dumps(sketch(schema), ensure_ascii=False)
+
+
+# ------------------------------------------------------------------
+# Micro-batching
+# ------------------------------------------------------------------
+class StructuredBatcher:
+    """Collects structured-extraction requests from one user that share an
+    instruction and schema, and answers up to STRUCTURED_BATCH_MAX_ITEMS of them
+    per provider call. Items the batched reply misses or gets wrong are retried
+    singly. Different users' texts never share a prompt."""
+
+    def __init__(self, llm_router=None, window: float = STRUCTURED_BATCH_WINDOW,
+                 max_items: int = STRUCTURED_BATCH_MAX_ITEMS, max_chars: int = STRUCTURED_BATCH_MAX_CHARS):
+        self.llm_router = llm_router
+        self.window = window
+        self.max_items = max_items
+        self.max_chars = max_chars
+        # batch key → {"instruction", "schema", "task", "feature", "user_id", "items": [(text, future)], "chars", "timer"}
+        self._open: dict[str, dict] = {}
+        self._flushing: set[asyncio.Task] = set()  # strong refs to in-progress flushes
+
+        # Metrics
+        self.calls = 0
+        self.items = 0
+        self.fallbacks = 0
+
+    # ------------------------------------------------------------------
+    async def submit(self, instruction: str, text: str, schema: dict, task: str = "extract",
+                     feature: str | None = None, user_id: int | None = None):
+        """Queue one item and wait for its validated result (None on failure).
+        Items are only batched with the same user's; `user_id` and `feature`
+        attribute the batch's token usage (see LLMRouter.route)."""
+        key = f"{user_id}\x00{task}\x00{feature}\x00{instruction}\x00{json.dumps(schema, sort_keys=True)}"
+        batch = self._open.get(key)
+        if batch is not None and batch["chars"] + len(text) > self.max_chars:
+            self._close(key)
+            batch = None
+        if batch is None:
+            batch = {"instruction": instruction, "schema": schema, "task": task,
+                     "feature": feature or f"structured_{task}", "user_id": user_id,
+                     "items": [], "chars": 0, "timer": None}
+            self._open[key] = batch
+            batch["timer"] = asyncio.get_running_loop().call_later(self.window, self._close, key)
+
+        future = asyncio.get_running_loop().create_future()
+        batch["items"].append((text, future))
+        batch["chars"] += len(text)
+        self.items += 1
+        if len(batch["items"]) >= self.max_items:
+            self._close(key)
+        return await future
+
+    def _close(self, key: str):
+        """Stop collecting for `key` and send what we have."""
+        batch = self._open.pop(key, None)
+        if batch is None:
+            return
+        batch["timer"].cancel()
+        task = asyncio.get_running_loop().create_task(self._flush(batch))
+        self._flushing.add(task)
+        task.add_done_callback(self._flushing.discard)
+
+    # ------------------------------------------------------------------
+    async def _flush(self, batch: dict):
+        items = [(text, fut) for text, fut in batch["items"] if not fut.done()]
+        try:
+            if len(items) == 1:
+                results = [await self._single(batch, items[0][0])]
+            else:
+                results = await self._batched(batch, [text for text, _ in items])
+                for i, (text, _) in enumerate(items):
+                    if results[i] is None:
+                        self.fallbacks += 1
+                        results[i] = await self._single(batch, text)
+        except Exception as e:
+            print(f"Warning: structured batch failed: {e}")
+            results = [None] * len(items)
+        for (_, fut), result in zip(items, results):
+            if not fut.done():
+                fut.set_result(result)
+
+    async def _single(self, batch: dict, text: str):
+        prompt = (
+            f"{batch['instruction']} Return ONLY valid JSON in this shape: "
+            f"{schema_hint(batch['schema'])}. Text: {text}"
+        )
+        self.calls += 1
+        resp = await self.llm_router.route([{"role": "user", "content": prompt}], task=batch["task"],
+                                           feature=batch["feature"], user_id=batch["user_id"])
+        return parse_structured(resp.get("text"), batch["schema"])
+
+    async def _batched(self, batch: dict, texts: list[str]) -> list:
+        numbered = "\n".join(f"[{i + 1}] {json.dumps(t, ensure_ascii=False)}" for i, t in enumerate(texts))
+        prompt = (
+            f"{batch['instruction']} Apply this to each of the {len(texts)} numbered texts below "
+            "independently. Return ONLY valid JSON: "
+            f'{{"results": [{{"id": 1, "result": {schema_hint(batch["schema"])}}}, ...]}} '
+            f"with exactly one entry per text.\n\nTexts:\n{numbered}"
+        )
+        self.calls += 1
+        resp = await self.llm_router.route([{"role": "user", "content": prompt}], task=batch["task"],
+                                           feature=batch["feature"], user_id=batch["user_id"])
+        envelope = extract_json(resp.get("text"), "object") or {}
+
+        results = [None] * len(texts)
+        entries = envelope.get("results") if isinstance(envelope.get("results"), list) else []
+        for entry in entries:
+            if not isinstance(entry, dict):
+                continue
+            try:
+                idx = int(entry.get("id")) - 1
+            except (TypeError, ValueError):
+                continue
+            if 0 <= idx < len(texts) and results[idx] is None:
+                value, errors = validate(entry.get("result"), batch["schema"])
+                if not errors:
+                    results[idx] = value
+        return results
+
+    # ------------------------------------------------------------------
+    def get_stats(self) -> dict:
+        return {
+            "items": self.items,
+            "provider_calls": self.calls,
+            "single_retries": self.fallbacks,
+            "open_batches": len(self._open),
+        }
+
+
+_batcher_instance = None
+
+
+def get_structured_batcher(llm_router=None) -> StructuredBatcher:
+    global _batcher_instance
+    if _batcher_instance is None:
+        if llm_router is None:
+            from services.llm_router import get_llm_router
+            llm_router = get_llm_router()
+        _batcher_instance = StructuredBatcher(llm_router=llm_router)
+    return _batcher_instance
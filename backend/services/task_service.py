@@ -10,6 +10,25 @@ from sqlalchemy.orm import Session
 from sqlalchemy import or_, desc, asc
 
 from models.task import Task
+from services.structured_output import get_structured_batcher
+
+
+_AI_CREATE_INSTRUCTION = (
+    "Parse this natural-language request into a task. "
+    "due_date is YYYY-MM-DDTHH:MM:SSZ or null; estimated_time is minutes."
+)
+_AI_CREATE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "title": {"type": "string"},
+        "description": {"type": ["string", "null"], "default": ""},
+        "priority": {"type": "string", "enum": ["high", "medium", "low"], "default": "medium"},
+        "due_date": {"type": ["string", "null"], "default": None},  # YYYY-MM-DDTHH:MM:SSZ
+        "category": {"type": ["string", "null"], "default": ""},
+        "estimated_time": {"type": ["integer", "null"], "default": None},  # minutes
+    },
+    "required": ["title"],
+}
 
 
 class TaskService:
@@ -126,19 +145,10 @@ class TaskService:
     async def ai_create(db: Session, user_id: int, natural_text: str, llm_router) -> dict | None:
         """Parse natural language into a Task object via LLM."""
         try:
-            prompt = (
-                "Parse this into a task. Return ONLY valid JSON: "
-                '{"title": "", "description": "", "priority": "high/medium/low", '
-                '"due_date": "YYYY-MM-DDTHH:MM:SSZ or null", "category": "", "estimated_time": int_minutes}. Text: '
-                + natural_text
+            return await get_structured_batcher(llm_router).submit(
+                _AI_CREATE_INSTRUCTION, natural_text, _AI_CREATE_SCHEMA, task="extract",
+                feature="task_service.ai_create", user_id=user_id,
             )
-            resp = await llm_router.route([{"role": "user", "content": prompt}], cache_ttl=0)
-            text_resp = resp.get("text", "")
-            start = text_resp.find("{")
-            end = text_resp.rfind("}") + 1
-            if start == -1 or end == 0:
-                return None
-            return json.loads(text_resp[start:end])
         except Exception:
             return None
 
@@ -150,7 +160,8 @@ class TaskService:
                 "Break this task into actionable subtasks. Return ONLY a valid JSON array of objects: "
                 '[{"title": "...", "estimated_minutes": 15}]. Task: ' + task_description
             )
-            resp = await llm_router.route([{"role": "user", "content": prompt}], cache_ttl=0)
+            resp = await llm_router.route([{"role": "user", "content": prompt}],
+                                          cache_ttl=0, feature="task_service.ai_breakdown")
             text_resp = resp.get("text", "")
             start = text_resp.find("[")
             end = text_resp.rfind("]") + 1
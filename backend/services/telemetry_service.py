@@ -0,0 +1,182 @@
+"""
+telemetry_service.py — Async Batched API Usage Telemetry
+Buffers one record per provider attempt in memory and bulk-flushes them to
+the api_usage table from a background task, so observability never adds
+latency to a chat response. Token usage is also aggregated in-process by
+user, provider, key and feature.
+"""
+
+import asyncio
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+
+def classify_error(error) -> str | None:
+    """Bucket an exception or provider error string into a coarse error class."""
+    if error is None:
+        return None
+    if isinstance(error, BaseException):
+        if isinstance(error, asyncio.TimeoutError):
+            return "timeout"
+        return type(error).__name__
+    text = str(error).lower()
+    if "429" in text or "rate" in text:
+        return "rate_limit"
+    if "timeout" in text or "deadline" in text:
+        return "timeout"
+    if any(code in text for code in ("401", "403")):
+        return "auth"
+    if any(code in text for code in ("500", "502", "503", "504")):
+        return "server_error"
+    return "provider_error"
+
+
+def _default_writer(rows: list[dict]) -> int:
+    from supabase_rest import sb_insert_many
+    return sb_insert_many("api_usage", rows)
+
+
+class UsageTelemetry:
+    """In-memory attempt buffer with a background bulk writer."""
+
+    def __init__(self, writer=None, batch_size: int = 50,
+                 flush_interval: float = 10.0, max_buffer: int = 2000):
+        self._writer = writer or _default_writer  # blocking; runs in a worker thread
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._buffer: deque = deque(maxlen=max_buffer)
+        self._wake = asyncio.Event()
+        self._flush_task: asyncio.Task | None = None
+
+        # Cumulative in-process counters (survive flushes)
+        self._totals: dict[str, dict] = {}
+        self._tokens: dict[str, dict[str, dict]] = {"user": {}, "provider": {}, "key": {}, "feature": {}}
+        self._dropped = 0
+        self._flushed = 0
+        self._failed_flushes = 0
+
+    # ------------------------------------------------------------------
+    def record(self, provider: str, model: str | None, response_time: float,
+               success: bool, key_index: int | None = None,
+               tokens_used: int | None = None, error=None,
+               usage: dict | None = None, user_id=None, feature: str | None = None):
+        """Queue one attempt record. Never blocks and never raises.
+        `usage` is a normalized {prompt_tokens, completion_tokens, total_tokens} block."""
+        try:
+            if usage and tokens_used is None:
+                tokens_used = usage.get("total_tokens")
+            if usage:
+                self._record_tokens(usage, provider, key_index, user_id, feature)
+            error_class = classify_error(error) if not success else None
+            if len(self._buffer) == self._buffer.maxlen:
+                self._dropped += 1  # deque evicts the oldest record
+            self._buffer.append({
+                "provider": provider,
+                "model": model,
+                "key_index": key_index if key_index is not None else 0,
+                "response_time": round(float(response_time or 0), 3),
+                "tokens_used": tokens_used,
+                "success": bool(success),
+                "error_message": f"{error_class}: {error}"[:1000] if error_class else None,
+                "timestamp": datetime.now(timezone.utc).isoformat(),
+            })
+
+            totals = self._totals.setdefault(provider, {
+                "attempts": 0, "successes": 0, "total_time": 0.0, "tokens": 0, "errors": {},
+            })
+            totals["attempts"] += 1
+            totals["total_time"] += float(response_time or 0)
+            totals["tokens"] += tokens_used or 0
+            if success:
+                totals["successes"] += 1
+            else:
+                totals["errors"][error_class] = totals["errors"].get(error_class, 0) + 1
+
+            self._ensure_flusher()
+            if len(self._buffer) >= self.batch_size:
+                self._wake.set()
+        except Exception:
+            pass
+
+    def _record_tokens(self, usage: dict, provider: str, key_index, user_id, feature):
+        dims = {
+            "user": str(user_id) if user_id is not None else "system",
+            "provider": provider,
+            "key": f"{provider}#{key_index if key_index is not None else 0}",
+            "feature": feature or "unknown",
+        }
+        for dim, label in dims.items():
+            t = self._tokens[dim].setdefault(label, {
+                "calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0, "estimated_calls": 0,
+            })
+            t["calls"] += 1
+            t["prompt_tokens"] += usage.get("prompt_tokens") or 0
+            t["completion_tokens"] += usage.get("completion_tokens") or 0
+            t["total_tokens"] += usage.get("total_tokens") or 0
+            if usage.get("estimated"):
+                t["estimated_calls"] += 1
+
+    def get_token_usage(self, by: str = "feature", limit: int | None = None) -> list[dict]:
+        """Token totals grouped by "user", "provider", "key" or "feature", largest first."""
+        rows = [{by: label, **t} for label, t in self._tokens.get(by, {}).items()]
+        rows.sort(key=lambda r: r["total_tokens"], reverse=True)
+        return rows[:limit] if limit else rows
+
+    # ------------------------------------------------------------------
+    def _ensure_flusher(self):
+        """Start the background flush loop on the running event loop, once."""
+        if self._flush_task is not None and not self._flush_task.done():
+            return
+        try:
+            self._flush_task = asyncio.get_running_loop().create_task(self._run())
+        except RuntimeError:
+            pass  # no running loop; records are flushed on the next async call
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+
+    async def flush(self) -> int:
+        """Write buffered records in batches. Failed batches are re-queued."""
+        written = 0
+        while self._buffer:
+            batch = [self._buffer.popleft() for _ in range(min(self.batch_size, len(self._buffer)))]
+            try:
+                await asyncio.to_thread(self._writer, batch)
+                written += len(batch)
+                self._flushed += len(batch)
+            except Exception as e:
+                self._failed_flushes += 1
+                # Put the batch back in order; maxlen trims the oldest if we're over
+                self._buffer.extendleft(reversed(batch))
+                print(f"Warning: API usage flush failed, {len(self._buffer)} records buffered: {e}")
+                break
+        return written
+
+    # ------------------------------------------------------------------
+    def get_summary(self) -> dict:
+        """Per-provider aggregates since process start, plus buffer health."""
+        providers = {}
+        for name, t in self._totals.items():
+            attempts = t["attempts"] or 1
+            providers[name] = {
+                "total_calls": t["attempts"],
+                "avg_response_time": round(t["total_time"] / attempts, 3),
+                "success_rate": round(t["successes"] / attempts, 4),
+                "tokens_used": t["tokens"],
+                "errors": dict(t["errors"]),
+            }
+        return {
+            "providers": providers,
+            "buffered": len(self._buffer),
+            "flushed": self._flushed,
+            "dropped": self._dropped,
+            "failed_flushes": self._failed_flushes,
+            "as_of": time.time(),
+        }
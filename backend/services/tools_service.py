@@ -2,12 +2,26 @@
 tools_service.py — External Web APIs & Caching
 Static stateless wrappers connecting to public, non-authenticated tools 
 utilized by morning briefings and chat prompts dynamically.
+All fetches are async on one pooled keep-alive client, so they never block
+the event loop and can run concurrently with each other. Responses go through
+a bounded AsyncTTLCache: expired values are served stale (for a window
+proportional to each endpoint's ttl) while one refresh runs in the
+background, and failures are cached briefly so a dead API does not cost a
+timeout on every chat. When the BriefingPrefetcher runs, weather, news and
+quotes for its configured cities/topics are read from its snapshot.
 """
 
-import urllib.request
+import asyncio
+import random
 import urllib.parse
-import json
-import time
+
+import httpx
+
+from config import (
+    TOOL_CACHE_MAX_ENTRIES, TOOL_CACHE_STALE_TTL, TOOL_CACHE_STALE_FACTOR, TOOL_CACHE_NEGATIVE_TTL,
+)
+from providers.base import get_http_client
+from services.cache_service import AsyncTTLCache
 
 try:
     import feedparser
@@ -17,32 +31,67 @@ except ImportError:
 
 class ToolsService:
     
-    _cache = {} # memory mapped rudimentary cache format: URL -> (time, json)
-    
+    _cache = AsyncTTLCache(
+        max_entries=TOOL_CACHE_MAX_ENTRIES,
+        stale_ttl=TOOL_CACHE_STALE_TTL,
+        negative_ttl=TOOL_CACHE_NEGATIVE_TTL,
+    )
+    TIMEOUT = 5.0
+
+    @staticmethod
+    def _client() -> httpx.AsyncClient:
+        return get_http_client("tools", headers={"User-Agent": "JEXI-Terminal/1.0"})
+
     @staticmethod
-    def _fetch(url: str, ttl: int = 3600) -> dict | None:
-        """Generic cached getter mapping to JSON."""
-        now = time.time()
-        if url in ToolsService._cache:
-            stamp, data = ToolsService._cache[url]
-            if now - stamp < ttl:
-                return data
+    async def _fetch(url: str, ttl: int = 3600, as_text: bool = False,
+                     stale_ttl: float | None = None, fresh: bool = False) -> dict | str | None:
+        """Generic cached getter mapping to JSON (or raw text). None on failure.
+        Expired values are served for `stale_ttl` more seconds while refreshing
+        (default: ttl × TOOL_CACHE_STALE_FACTOR, at most TOOL_CACHE_STALE_TTL).
+        fresh=True skips the cached value (the result is still cached)."""
+        if stale_ttl is None:
+            stale_ttl = min(ttl * TOOL_CACHE_STALE_FACTOR, TOOL_CACHE_STALE_TTL)
+        async def load():
+            try:
+                response = await ToolsService._client().get(url, timeout=ToolsService.TIMEOUT, follow_redirects=True)
+                response.raise_for_status()
+                return response.text if as_text else response.json()
+            except Exception:
+                return None
+
+        key = f"{'text' if as_text else 'json'}:{url}"
+        if fresh:
+            return await ToolsService._cache.refresh(key, load, ttl, stale_ttl)
+        return await ToolsService._cache.get(key, load, ttl, stale_ttl)
 
+    @staticmethod
+    def get_cache_stats() -> dict:
+        return ToolsService._cache.get_stats()
+
+    @staticmethod
+    def _prefetched(kind: str, name: str):
+        """Pre-warmed data from the briefing prefetcher, or None."""
         try:
-            req = urllib.request.Request(url, headers={'User-Agent': 'JEXI-Terminal/1.0'})
-            with urllib.request.urlopen(req, timeout=5) as response:
-                result = json.loads(response.read().decode())
-                ToolsService._cache[url] = (now, result)
-                return result
-        except Exception as e:
+            from services.briefing_prefetcher import prefetched
+            return prefetched(kind, name)
+        except Exception:
             return None
 
     @staticmethod
-    def get_weather(city: str = "London") -> dict | None:
+    async def get_weather(city: str = "London") -> dict | None:
         """Returns minimal JSON structure of current weather using WTTR."""
+        snapshot = ToolsService._prefetched("weather", city)
+        if snapshot is not None:
+            return snapshot
+        return await ToolsService.load_weather(city)
+
+    @staticmethod
+    async def load_weather(city: str, fresh: bool = False) -> dict | None:
+        """get_weather() without the prefetch snapshot (fresh=True: without the cache either)."""
         try:
             # wttr format j1 exposes current_condition block
-            raw = ToolsService._fetch(f"https://wttr.in/{urllib.parse.quote(city)}?format=j1", ttl=3600)
+            raw = await ToolsService._fetch(f"https://wttr.in/{urllib.parse.quote(city)}?format=j1", ttl=3600,
+                                            fresh=fresh)
             if not raw or "current_condition" not in raw: return None
             
             cond = raw["current_condition"][0]
@@ -57,12 +106,27 @@ class ToolsService:
             return None
 
     @staticmethod
-    def get_news(topic: str = "technology", count: int = 5) -> list:
+    async def get_news(topic: str = "technology", count: int = 5) -> list:
         """RSS scrape of google news parsing feed headers."""
+        snapshot = ToolsService._prefetched("news", topic)
+        if snapshot:
+            return snapshot[:count]
+        return await ToolsService.load_news(topic, count)
+
+    @staticmethod
+    async def load_news(topic: str, count: int = 5, fresh: bool = False) -> list:
+        """get_news() without the prefetch snapshot (fresh=True: without the cache either)."""
         try:
             if "feedparser" not in globals():
                 return [] # Module missing fallback
-            d = feedparser.parse(f"https://news.google.com/rss/search?q={urllib.parse.quote(topic)}")
+            # Fetch on the pooled client; feedparser only parses (its own fetch is blocking)
+            rss = await ToolsService._fetch(
+                f"https://news.google.com/rss/search?q={urllib.parse.quote(topic)}", ttl=900, as_text=True,
+                fresh=fresh,
+            )
+            if not rss: return []
+            # Parsing a full feed is CPU-bound; keep it off the event loop
+            d = await asyncio.to_thread(feedparser.parse, rss)
             results = []
             for entry in d.entries[:count]:
                 results.append({
@@ -75,10 +139,10 @@ class ToolsService:
             return []
 
     @staticmethod
-    def get_wiki(query: str) -> dict | None:
+    async def get_wiki(query: str) -> dict | None:
         """Query standard wikipedia rest v1 summary API."""
         try:
-            raw = ToolsService._fetch(f"https://en.wikipedia.org/api/rest_v1/page/summary/{urllib.parse.quote(query)}", ttl=86400)
+            raw = await ToolsService._fetch(f"https://en.wikipedia.org/api/rest_v1/page/summary/{urllib.parse.quote(query)}", ttl=86400)
             if not raw: return None
             return {
                 "title": raw.get("title", ""),
@@ -89,28 +153,42 @@ class ToolsService:
             return None
 
     @staticmethod
-    def get_quote() -> str | None:
+    async def get_quote() -> str | None:
+        pool = ToolsService._prefetched("quotes", "random")
+        if pool:
+            return random.choice(pool)
         try:
-            raw = ToolsService._fetch("https://api.quotable.io/random", ttl=60)
+            raw = await ToolsService._fetch("https://api.quotable.io/random", ttl=60, stale_ttl=0)
             if not raw: return None
             return f'"{raw.get("content", "")}" - {raw.get("author", "Unknown")}'
         except:
             return None
 
     @staticmethod
-    def get_joke() -> str | None:
+    async def load_quotes(limit: int = 10, fresh: bool = False) -> list:
+        """A batch of random quotes in get_quote() format, for the prefetch pool."""
+        try:
+            raw = await ToolsService._fetch(f"https://api.quotable.io/quotes/random?limit={limit}", ttl=60, stale_ttl=0,
+                                            fresh=fresh)
+            if not isinstance(raw, list): return []
+            return [f'"{q.get("content", "")}" - {q.get("author", "Unknown")}' for q in raw if q.get("content")]
+        except:
+            return []
+
+    @staticmethod
+    async def get_joke() -> str | None:
         try:
-            raw = ToolsService._fetch("https://official-joke-api.appspot.com/random_joke", ttl=60)
+            raw = await ToolsService._fetch("https://official-joke-api.appspot.com/random_joke", ttl=60, stale_ttl=0)
             if not raw: return None
             return f'{raw.get("setup", "")} ... {raw.get("punchline", "")}'
         except:
             return None
 
     @staticmethod
-    def search(query: str) -> dict | None:
+    async def search(query: str) -> dict | None:
         """DuckDuckGo basic snippet summary lookup."""
         try:
-            raw = ToolsService._fetch(f"https://api.duckduckgo.com/?q={urllib.parse.quote(query)}&format=json", ttl=3600)
+            raw = await ToolsService._fetch(f"https://api.duckduckgo.com/?q={urllib.parse.quote(query)}&format=json", ttl=3600)
             if not raw: return None
             return {
                 "abstract": raw.get("AbstractText", ""),
@@ -82,6 +82,21 @@ GRANT USAGE ON SCHEMA public TO anon, authenticated;
 GRANT ALL ON public.profiles TO authenticated;
 GRANT ALL ON public.tasks TO authenticated;
 
+-- 11. One row per (user_id, key) in memory_facts, as models/memory_fact.py declares:
+--     saving facts bulk-upserts with on_conflict=user_id,key, which needs this
+--     constraint. Older duplicates are removed first (the newest row is kept).
+DO $$
+BEGIN
+    IF to_regclass('public.memory_facts') IS NOT NULL
+       AND NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'uq_memory_user_key') THEN
+        DELETE FROM public.memory_facts a
+            USING public.memory_facts b
+            WHERE a.user_id = b.user_id AND a.key = b.key AND a.id < b.id;
+        ALTER TABLE public.memory_facts
+            ADD CONSTRAINT uq_memory_user_key UNIQUE (user_id, key);
+    END IF;
+END $$;
+
 -- Success message
 DO $$
 BEGIN
@@ -46,6 +46,31 @@ def sb_insert(table: str, data: dict) -> dict:
         return result[0] if isinstance(result, list) and result else {}
 
 
+def sb_insert_many(table: str, rows: list[dict]) -> int:
+    """Bulk insert in a single request. Returns the number of rows sent."""
+    if not rows:
+        return 0
+    url = f"{SUPABASE_URL}/rest/v1/{table}"
+    headers = {**_headers(), "Prefer": "return=minimal"}
+    with httpx.Client(timeout=10) as client:
+        resp = client.post(url, json=rows, headers=headers)
+        resp.raise_for_status()
+        return len(rows)
+
+
+def sb_upsert_many(table: str, rows: list[dict], on_conflict: str) -> int:
+    """Bulk insert-or-update in a single request, matching on the `on_conflict`
+    columns (which need a unique constraint). Returns the number of rows sent."""
+    if not rows:
+        return 0
+    url = f"{SUPABASE_URL}/rest/v1/{table}?on_conflict={on_conflict}"
+    headers = {**_headers(), "Prefer": "resolution=merge-duplicates,return=minimal"}
+    with httpx.Client(timeout=10) as client:
+        resp = client.post(url, json=rows, headers=headers)
+        resp.raise_for_status()
+        return len(rows)
+
+
 def sb_update(table: str, filter_col: str, filter_val, data: dict) -> dict:
     """Update rows where filter_col = filter_val."""
     url = f"{SUPABASE_URL}/rest/v1/{table}?{filter_col}=eq.{quote(str(filter_val))}"
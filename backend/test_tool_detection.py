@@ -0,0 +1,32 @@
+"""Regression cases for the chat tool-intent matcher (routes.ai_routes.detect_tool)."""
+
+from routes.ai_routes import detect_tool
+
+CASES = [
+    ("What is the weather in Paris?", "weather"),
+    ("will it rain tomorrow", "weather"),
+    ("what is the news today", "news"),
+    ("What is the latest news", "news"),
+    ("what are the headlines", "news"),
+    ("what time is it", "time"),
+    ("what is the date", "time"),
+    ("give me a motivational quote", "quote"),
+    ("tell me a joke", "joke"),
+    ("who is Ada Lovelace", "wiki"),
+    ("what is photosynthesis", "wiki"),
+    ("search wikipedia for black holes", "wiki"),
+    ("what is my name", None),
+    ("who are you", None),
+    ("what is the best way to learn piano", None),
+    ("help me plan my week", None),
+]
+
+
+def test_detect_tool():
+    for message, expected in CASES:
+        assert detect_tool(message) == expected, message
+
+
+if __name__ == "__main__":
+    test_detect_tool()
+    print(f"{len(CASES)} cases passed")
@@ -85,13 +85,16 @@ def ask_jexi_ai(message_text, chat_id, token):
         }
         # Use stable session ID so AI backend always uses the SAME history
         session_id = get_session_id(chat_id)
-        payload = {"message": message_text, "session_id": session_id}
+        # Ask the backend to give up before our own HTTP timeout does
+        payload = {"message": message_text, "session_id": session_id, "deadline": 40}
 
         response = httpx.post(f"{JEXI_BASE_URL}/ai/chat", json=payload, headers=headers, timeout=45.0)
 
         if response.status_code == 401:
             if chat_id in user_tokens: del user_tokens[chat_id]
             return "⏳ Your secure session expired. Please send your `/login <username> <password>` command again."
+        if response.status_code == 504:
+            return "I'm thinking too hard! (The request timed out)"
 
         response.raise_for_status()
         data = response.json()